@@ -12,14 +12,19 @@
 # COMMAND ----------
 
 import os
+import shutil
 import pandas as pd
 import configparser
 from pathlib import Path
 from datetime import datetime, timedelta
 # Import the in-house libraries
-from modules.file_reader import MktpPricesFileReader, OnlineFileReader
+from modules.file_reader import MktpPricesFileReader, read_files, dataframe_to_table, MKTP_PRICES_SCHEMA
 from modules.sku_matcher import get_confidence
 from modules.normalize_text import normalize_text
+from modules.spark_udfs import normalize_text_pandas_udf, best_matches_stage, arrow_to_spark, \
+     scoring_accumulators, normalize_column, spark_normalization_cache, \
+     normalization_accumulators, count_rows
+from modules.metrics import PipelineMetrics
 
 import pyspark.sql.functions as F
 from pyspark.sql import SparkSession, Window
@@ -36,6 +41,10 @@ MAIN_PATH = '/dbfs/mnt/webscraping'
 MKPT_PRICE_PATH        = f'{MAIN_PATH}/marketplace_prices/'
 WEBSCRAPING_INPUT_PATH = f'{MAIN_PATH}/webscraping_files/'
 MATCHING_OUPUT_PATH    = './data/matched_parquets/'
+# Names normalized by previous runs (SQLite needs a local disk: the
+# cache is copied from the mount and back once updated)
+NORM_CACHE_PATH        = f'{MAIN_PATH}/cache/normalized_names.db'
+LOCAL_NORM_CACHE_PATH  = '/tmp/normalized_names.db'
 # Timezone CDMX (UTC - 6 hours)
 date_today = (datetime.utcnow() - timedelta(hours=6, minutes=0)).strftime('%d-%m-%y')
 
@@ -101,8 +110,15 @@ mkp_delta_name = 'mktp_prices_catalog'
 date_YDM_formated = datetime.strptime(date_sf, "%d-%m-%y").strftime("%Y-%d-%m")
 mktp_prices_path = Path(f'{MKPT_PRICE_PATH}/{country}/{country}-{date_YDM_formated}.parquet')
 
+# Metrics of the run, emitted once the matches are saved. Spark is
+# lazy: most of the normalization and matching time is spent in the
+# `output` stage (the write action)
+metrics = PipelineMetrics(country = country)
+
 # Read the parquet file using the `MktpPricesFileReader` class
-df_mkpt_prices = MktpPricesFileReader(mktp_prices_path).read_file()
+with metrics.stage('read_catalog') as stage:
+    df_mkpt_prices = MktpPricesFileReader(mktp_prices_path).read_file()
+    stage['rows_out'] = 0 if df_mkpt_prices is None else len(df_mkpt_prices)
 
 # Check that the given `date` is correct and unique
 # if not, raise an error and interrupt the process
@@ -116,9 +132,7 @@ except AssertionError as e:
     print(f'Process interrupted: The `date` column has an incorrect format.')
 else:
     # Convert to pyspark dataframe
-    df_mkpt_prices.iteritems = df_mkpt_prices.items
-    df_mkpt_prices = spark.createDataFrame(df_mkpt_prices)
-    df_mkpt_prices = df_mkpt_prices.withColumn("date", F.col("date").cast(DateType()))
+    df_mkpt_prices = arrow_to_spark(spark, dataframe_to_table(df_mkpt_prices, MKTP_PRICES_SCHEMA))
     # display(df_mkpt_prices.show(3))
     continue_falg = True
 
@@ -161,16 +175,17 @@ where pc.date >= dateadd(day, -15, getdate())
 df_mktp_cat = spark.sql(mktp_cat_query)\
                    .dropDuplicates(['country', 'sku'])
 
-# Decorate the 'normalize_text' function
-@F.udf(StringType())
-def normalize_text_udf(text):
-    return normalize_text(text, encode='ascii')
-
 # Cleaning phase
-# Lowercase string fields
-df_mktp_cat = df_mktp_cat.withColumn(
-                        'mkp_sku_name_clean', 
-                        normalize_text_udf(df_mktp_cat['sku_name']))
+# Vectorized `normalize_text` (Arrow batches, deduplicated names), only
+# for the names missing from the normalization cache
+if os.path.exists(NORM_CACHE_PATH):
+    shutil.copy(NORM_CACHE_PATH, LOCAL_NORM_CACHE_PATH)
+norm_cache  = spark_normalization_cache(LOCAL_NORM_CACHE_PATH)
+# Rows and distinct names normalized (no extra `count()`)
+catalog_norm_acc = normalization_accumulators(spark)
+with metrics.stage('normalize'):
+    df_mktp_cat = normalize_column(df_mktp_cat, 'sku_name', 'mkp_sku_name_clean',
+                                   cache = norm_cache, accumulators = catalog_norm_acc)
 df_mktp_cat.cache()#.count()
 
 # COMMAND ----------
@@ -237,41 +252,34 @@ scraping_files
 
 # COMMAND ----------
 
-# Use the `OnlineFileReader` to load and clean the .txt files
-try:
-  df_scrap = pd.concat([OnlineFileReader(f).read_file() for f in scraping_files])\
-                .reset_index(drop = True)
-except ValueError as e:
+# Load and clean the .txt files concurrently (`OnlineFileReader` per file)
+with metrics.stage('read_scraping'):
+    df_scrap, read_report = read_files(scraping_files, as_table = True)
+display(read_report)
+if df_scrap is None:
   raise Exception(f'No webscraping data to process for {date_sf} date.')
 
 # Reset index index for future analaysis
 # df_scrap = df_scrap.reset_index(names = 'scrap_id')
 print('DataFrame dims.:', df_scrap.shape)
 
-# Convert to SparkDF
-# TODO: Move inside the `file_reader.py` module
-df_scrap.iteritems = df_scrap.items
-schema = StructType([ \
-    StructField("type",     StringType(), False), \
-    StructField("country",  StringType(), False), \
-    StructField("locality", StringType(), False), \
-    StructField("date",     DateType(),   False), \
-    StructField("competitor_name",     StringType(), True), \
-    StructField("competitor_sku_name", StringType(), True), \
-    StructField("competitor_price",    DoubleType(), True), \
-    StructField("special_price",       DoubleType(), True), \
-    StructField("competitor_url",      StringType(), True), \
-    StructField("gift_or_extra_prod",  StringType(), True)
-  ])
-df_scrap = spark.createDataFrame(df_scrap, schema=schema)
+# Convert to SparkDF (Arrow record batches, `SCRAP_SCHEMA`)
+df_scrap = arrow_to_spark(spark, df_scrap)
 
 # TODO: Check how to manage multiple countries
 # por ahora mantengo sólo lo de MX
 df_scrap = df_scrap.filter(df_scrap.country == country)
 
 # Text cleaning phase
-df_scrap = df_scrap.withColumn('comp_sku_name_clean', 
-            normalize_text_udf(df_scrap['competitor_sku_name']))
+scrap_norm_acc = normalization_accumulators(spark)
+with metrics.stage('normalize'):
+    df_scrap = normalize_column(df_scrap, 'competitor_sku_name', 'comp_sku_name_clean',
+                                cache = norm_cache, accumulators = scrap_norm_acc)
+# Store the names added to the cache
+norm_cache.close()
+metrics.add('normalize', cache_hits = norm_cache.hits, cache_misses = norm_cache.misses)
+os.makedirs(os.path.dirname(NORM_CACHE_PATH), exist_ok = True)
+shutil.copy(LOCAL_NORM_CACHE_PATH, NORM_CACHE_PATH)
             
 df_scrap.cache()#.groupby('competitor_name').count().show()
 
@@ -314,41 +322,21 @@ df_comp_names.cache()#.show(3)
 # COMMAND ----------
 
 # MAGIC %md
-# MAGIC Define a function to perform the matching phase and keep the best match between a given pair of competitor and marketplace skus.
+# MAGIC Score each partition of competitor names against the broadcast catalog and keep only the best match per name (ties: lowest `sku`).
 
 # COMMAND ----------
 
-# Define the UDF for confidence matching 
-@F.udf(DoubleType())
-def get_confidence_udf(mktp_sku_clean_name, comp_sku_clean_name):
-    # Replace 'get_confidence'
-    conf = get_confidence(mktp_sku_clean_name, comp_sku_clean_name)
-    return conf
-
-# COMMAND ----------
-
-# Perform a cross join to obtain all pair combinations of mkp and comp products
-# Broadcast the smallest table to enhance performance. 
-# Keep only relevant columns to avoid memory overload
-cj_df = F.broadcast(df_mktp_cat.select(["sku", "mkp_sku_name_clean"]))\
-        .crossJoin(df_comp_names.select(["comp_sku_name_clean"]))
-
-# Perform the pair-wise evaluation using the 'get_confidence' function
-cj_df = cj_df.withColumn("confidence", 
-                 get_confidence_udf(F.col('mkp_sku_name_clean'), 
-                                    F.col('comp_sku_name_clean')))
-
-# Now get the best mktp match for each competitor sku
+# Each task scores its competitor names against the broadcast catalog
+# and emits only the best sku per name, avoiding the (mkp x comp) cross
+# join and the Window shuffle.
 # Returns the following structure:
-# sku|mkp_sku_name_clean|scrap_id|comp_sku_name_clean|confidence|
-w = Window.partitionBy('comp_sku_name_clean')
-match_df = cj_df\
-        .withColumn('best_conf', F.max('confidence').over(w))\
-        .where(F.col('confidence') == F.col('best_conf'))\
-        .drop('best_conf')\
-        .dropDuplicates(['comp_sku_name_clean']) # Keep only one occurrence 
-# Keep only relevant columns
-match_df = match_df.select(['comp_sku_name_clean', 'sku', 'confidence'])
+# comp_sku_name_clean|sku|confidence|
+# The tasks count the names, pairs and confidences scored (no extra `count()`)
+scoring_acc = scoring_accumulators(spark)
+with metrics.stage('matching'):
+    match_df = best_matches_stage(df_comp_names.select(["comp_sku_name_clean"]),
+                                  df_mktp_cat.select(["sku", "mkp_sku_name_clean"]),
+                                  accumulators = scoring_acc)
 match_df.cache()#.show(3)
 
 # COMMAND ----------
@@ -370,14 +358,29 @@ df_matched = df_scrap.join(match_df, ['comp_sku_name_clean'], "left")\
                      .filter(F.col('confidence') >= conf_thr)\
                      .drop('comp_sku_name_clean')\
                      .orderBy(F.col('confidence').desc())
+# Rows saved, counted by the write action
+output_acc = spark.sparkContext.accumulator(0)
+df_matched = count_rows(df_matched, output_acc, 'confidence')
 
 # Save to cache
-df_matched.cache()
-df_matched.write.format("delta")\
-          .mode(save_mode)\
-          .saveAsTable(f"{database}.matched_skus_webscraping")
+with metrics.stage('output'):
+    df_matched.cache()
+    df_matched.write.format("delta")\
+              .mode(save_mode)\
+              .saveAsTable(f"{database}.matched_skus_webscraping")
 # option("overwriteSchema", "true") -- activate when "overwrite" mode
 
+# Metrics of the run, one JSON record per (country, date). The
+# accumulators are filled once the write action has run
+metrics.date = date_YMD_formated
+metrics.add_read_report('read_scraping', read_report)
+metrics.add_accumulators('normalize', scrap_norm_acc)
+metrics.add('normalize', catalog_rows = catalog_norm_acc['rows'].value,
+            distinct_catalog_names = catalog_norm_acc['distinct_names'].value)
+metrics.add_accumulators('matching', scoring_acc)
+metrics.add('output', rows_out = output_acc.value)
+metrics.emit(f'{MAIN_PATH}/metrics/matching_metrics.jsonl')
+
 # COMMAND ----------
 
 #print(df_matched.count())
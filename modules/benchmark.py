@@ -0,0 +1,273 @@
+"""
+    Performance benchmarks on seeded synthetic data: `normalize_text`
+    strings/sec, `get_confidence` pairs/sec, `OnlineFileReader` MB/sec
+    and end-to-end matching at several (mkp x comp) sizes.
+
+    Usage:
+        python -m modules.benchmark --output benchmark.json \
+            [--baseline baseline.json] [--tolerance 0.2] [--quick]
+"""
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from modules.file_reader import OnlineFileReader
+from modules.normalize_text import NORM_BRANDS, normalize_text
+from modules.sku_matcher import get_confidence, best_matches
+
+# Raw spellings of the `NORM_BRANDS`, the ones without spelling use the brand itself
+BRAND_SPELLINGS = {
+    'caribecooler':   ['Caribe Cooler', 'CARIBE COOLER', 'caribe cooler'],
+    'velrosita':      ['Vel Rosita', 'VEL ROSITA'],
+    'grancentenario': ['Gran Centenario', 'GRAN CENTENARIO', 'gran centenaro'],
+    'campoazul':      ['Campo Azul', 'CAMPO AZUL'],
+    'aztecaoro':      ['Azteca Oro', 'Bry Azteca Oro'],
+    'donjulio':       ['Don Julio', 'DON JULIO', 'don julio'],
+    'npv':            ['Nestle Pureza Vital', 'Nestle PV', 'NESTLE PUREZA VITAL'],
+    'johnniewalker':  ['Johnnie Walker', 'JOHNNIE WALKER', 'Johnie Walker'],
+    'cuervo':         ['Jose Cuervo', 'JOSE CUERVO', 'Cuervo'],
+    'sauzahacienda':  ['Sauza Hacienda', 'SAUZA HACIENDA'],
+    'redbull':        ['Red Bull', 'RED BULL', 'RB'],
+    'santamaria':     ['Santa Maria', 'Agua Santa Maria', 'SANTA MARIA'],
+    'loltun':         ['Lol Tun', 'LOLTUN', 'Loltun'],
+    'nescafe':        ['Nescafé', 'NESCAFE', 'Nescafe'],
+    'antioqueno':     ['Antioqueño', 'ANTIOQUENO'],
+    'medellin':       ['Medellín', 'MEDELLIN'],
+    'bacardi':        ['Bacardí', 'BACARDI', 'Bacardi'],
+}
+PRODUCTS = ['agua natural', 'leche light', 'leche entera', 'tequila reposado',
+            'tequila blanco', 'vodka', 'whisky 12 años', 'ron añejo', 'brandy',
+            'mezcal joven', 'jugo de mango', 'néctar de piña', 'bebida energética',
+            'suero oral fresa', 'café soluble', 'refresco cola', 'galletas de animalitos',
+            'salsa habanero', 'crema dental', 'veladora', 'vino tinto', 'leche en polvo',
+            'cerveza clara', 'té verde', 'jalapeños en rajas', 'azúcar morena']
+FLAVORS  = ['', '', '', 'fresa', 'mango', 'limón', 'uva', 'natural', 'light', 'original']
+# Equivalent spellings of each package size
+SIZES = [
+    ['600 ml', '600ml', '600 ML', '0.6 lt'],
+    ['1 litro', '1 L', '1lt', '1000 ml', '1 Lt'],
+    ['355 ml', '355ml', '355 Ml'],
+    ['750 ml', '750ml', '750 ML', '0.75 l'],
+    ['250 ml', '250ml', '250 mililitros'],
+    ['2 litros', '2 L', '2lt', '2000 ml'],
+    ['500 g', '500g', '500 gr', '0.5 kg'],
+    ['1 kg', '1kg', '1000 g', '1 kilo'],
+    ['150 g', '150g', '150 GR'],
+    ['8 oz', '8oz'],
+]
+PACKS = [
+    ['', '1 pz', '1 pieza'],
+    ['6 pz', '6pz', '6 piezas', 'Caja 6 Artículo(s)'],
+    ['12pz', '12 pz', '12 piezas', 'Presentación: Caja 12 Artículo(s)', '12 PZS'],
+    ['24pz', '24 pz', '24 piezas', '24 PZS'],
+]
+GIFTS = ['vaso gratis', 'vaso', 'hielera', 'combo', 'regalo sorpresa', 'botana']
+
+
+def synthetic_products(n: int, seed: int = 0) -> list:
+    '''Distinct random products as `(brand, product, flavor, size, pack)`
+    tuples, the last two being indices of `SIZES` and `PACKS`'''
+    rng = random.Random(seed)
+    products = {}
+    while len(products) < n:
+        product = (rng.choice(NORM_BRANDS), rng.choice(PRODUCTS), rng.choice(FLAVORS),
+                   rng.randrange(len(SIZES)), rng.randrange(len(PACKS)))
+        products.setdefault(product, None)
+    return list(products)
+
+
+def _add_noise(name: str, rng: random.Random) -> str:
+    '''Typo (dropped or swapped character), case changes and separators'''
+    chars = list(name)
+    if len(chars) > 4 and rng.random() < 0.3:
+        i = rng.randrange(1, len(chars) - 1)
+        if rng.random() < 0.5:
+            del chars[i]
+        else:
+            chars[i], chars[i + 1] = chars[i + 1], chars[i]
+    name = ''.join(chars)
+    name = rng.choice([name, name.upper(), name.lower(), name.title()])
+    return name.replace(' ', rng.choice([' ', ' ', '  ', ' - ']), 1)
+
+
+def render_name(product: tuple, rng: random.Random, noise: bool = False) -> str:
+    """
+        Writes a product as a raw sku name. The canonical (marketplace)
+        form uses the first spelling of the brand, size and pack; with
+        `noise` (competitor names), any spelling, order, typos and
+        combos (' + ') are used.
+    """
+    brand, product_name, flavor, size, pack = product
+    spellings = BRAND_SPELLINGS.get(brand, [brand])
+    if not noise:
+        parts = [product_name.capitalize(), spellings[0], flavor, SIZES[size][0], PACKS[pack][0]]
+        return ' '.join(p for p in parts if p)
+    parts = [rng.choice(spellings), product_name, flavor]
+    rng.shuffle(parts)
+    parts += [rng.choice(SIZES[size]), rng.choice(PACKS[pack])]
+    name = _add_noise(' '.join(p for p in parts if p), rng)
+    if rng.random() < 0.1:
+        name += ' + ' + rng.choice(GIFTS)
+    return name
+
+
+def synthetic_names(m: int, n: int, seed: int = 0, match_share: float = 0.7) -> tuple:
+    """
+        Seeded marketplace catalog of `m` products and `n` competitor
+        names. A `match_share` of the competitor names are noisy
+        versions of catalog products, the rest are other products.
+        Returns `(mkp_skus, mkp_names, comp_names)`.
+    """
+    rng = random.Random(seed)
+    products   = synthetic_products(m + n, seed = seed)
+    catalog    = products[:m]
+    mkp_skus   = [f'{100000 + i}' for i in range(m)]
+    mkp_names  = [render_name(p, rng) for p in catalog]
+    comp_names = [render_name(rng.choice(catalog) if catalog and rng.random() < match_share
+                              else products[m + i], rng, noise = True)
+                  for i in range(n)]
+    return mkp_skus, mkp_names, comp_names
+
+
+def write_scrape_file(path: Path, comp_names: list, seed: int = 0,
+                      company: str = 'compA', date: str = '10-11-23') -> Path:
+    '''Writes the competitor names as a `<s>` web scraping file, with
+    prices, urls and quantities in the formats found in the dumps'''
+    rng = random.Random(seed)
+    prices = ['"${:,.2f}"', '$ {:.2f}', '{:.2f}', '{:.3f}', 'Agotado']
+    lines  = ['type<s>country<s>zone<s>date<s>company<s>name<s>price<s>url<s>quantity<s>specialPrice']
+    for i, name in enumerate(comp_names):
+        price = rng.choice(prices).format(rng.uniform(5, 2500))
+        special = rng.choice(['', 'NA', f'{rng.uniform(5, 2500):.2f}'])
+        url = rng.choice([f'https://www.{company}.com/p/{i}', f'www.{company}.com/p/{i}', ''])
+        zone = rng.choice(['unique', 'unique', 'norte', 'sur'])
+        quantity = rng.choice(['', '', '1 pz', '6 pz', '12 pz'])
+        lines.append(f'online<s>MX<s>{zone}<s>{date}<s>{company}<s>{name}<s>{price}'
+                     f'<s>{url}<s>{quantity}<s>{special}')
+    Path(path).write_text('\n'.join(lines), encoding = 'utf-8')
+    return Path(path)
+
+
+def _best_time(func, repeat: int) -> float:
+    '''Minimum wall time (seconds) of `repeat` calls of `func`'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_normalize_text(n: int = 20_000, seed: int = 0, repeat: int = 3) -> dict:
+    _, _, names = synthetic_names(0, n, seed = seed, match_share = 0)
+    seconds = _best_time(lambda: [normalize_text(name) for name in names], repeat)
+    return {'normalize_text.strings_per_sec': n / seconds}
+
+
+def bench_get_confidence(n: int = 20_000, seed: int = 0, repeat: int = 3) -> dict:
+    mkp_skus, mkp_names, comp_names = synthetic_names(n, n, seed = seed)
+    pairs = [(normalize_text(a), normalize_text(b)) for a, b in zip(mkp_names, comp_names)]
+    seconds = _best_time(lambda: [get_confidence(a, b) for a, b in pairs], repeat)
+    return {'get_confidence.pairs_per_sec': n / seconds}
+
+
+def bench_file_reader(n_rows: int = 100_000, seed: int = 0, repeat: int = 3) -> dict:
+    _, _, comp_names = synthetic_names(2_000, n_rows, seed = seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = write_scrape_file(Path(tmp_dir) / '10-11-23-compA.txt', comp_names, seed = seed)
+        megabytes = path.stat().st_size / 1e6
+        seconds = _best_time(lambda: OnlineFileReader(path, verbose = False).read_file(), repeat)
+    return {'file_reader.mb_per_sec': megabytes / seconds}
+
+
+def bench_matching(sizes: list = ((500, 2_000), (2_000, 5_000)), seed: int = 0,
+                   repeat: int = 1) -> dict:
+    '''End to end: normalizes both sides and keeps the best match of each name'''
+    results = {}
+    for m, n in sizes:
+        mkp_skus, mkp_names, comp_names = synthetic_names(m, n, seed = seed)
+        def run():
+            mkp_clean  = [normalize_text(name) for name in mkp_names]
+            comp_clean = list(dict.fromkeys(normalize_text(name) for name in comp_names))
+            best_matches(mkp_skus, mkp_clean, comp_clean, workers = 1)
+        seconds = _best_time(run, repeat)
+        results[f'matching.{m}x{n}.pairs_per_sec'] = m * n / seconds
+    return results
+
+
+def run_benchmarks(quick: bool = False, seed: int = 0) -> dict:
+    """
+        Runs every benchmark and returns the results with the machine
+        they ran on. All the metrics are throughputs (higher is better).
+        `quick` uses small sizes, e.g. for a smoke test.
+    """
+    if quick:
+        metrics = {**bench_normalize_text(1_000, seed = seed, repeat = 1),
+                   **bench_get_confidence(1_000, seed = seed, repeat = 1),
+                   **bench_file_reader(2_000, seed = seed, repeat = 1),
+                   **bench_matching([(50, 200)], seed = seed)}
+    else:
+        metrics = {**bench_normalize_text(seed = seed),
+                   **bench_get_confidence(seed = seed),
+                   **bench_file_reader(seed = seed),
+                   **bench_matching(seed = seed)}
+    return {'machine': {'python':    platform.python_version(),
+                        'platform':  platform.platform(),
+                        'processor': platform.processor(),
+                        'date':      datetime.now().isoformat(timespec = 'seconds'),
+                        'quick':     quick,
+                        'seed':      seed},
+            'metrics': metrics}
+
+
+def compare_results(results: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+        Returns the metrics that are more than `tolerance` (share)
+        slower than the baseline, as `(metric, baseline, value)`.
+        Metrics missing in either side are not compared.
+    """
+    regressions = []
+    for metric, expected in baseline['metrics'].items():
+        value = results['metrics'].get(metric)
+        if value is not None and value < expected * (1 - tolerance):
+            regressions.append((metric, expected, value))
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog = 'python -m modules.benchmark',
+        description = 'Benchmarks the reading, cleaning and matching stages.')
+    parser.add_argument('-o', '--output', type = Path, default = Path('benchmark.json'),
+                        help = 'output `.json` file (default: benchmark.json)')
+    parser.add_argument('--baseline', type = Path, default = None,
+                        help = '`.json` results to compare against')
+    parser.add_argument('--tolerance', type = float, default = 0.2,
+                        help = 'allowed slowdown against the baseline (default: 0.2)')
+    parser.add_argument('--quick', action = 'store_true',
+                        help = 'small sizes, only as a smoke test')
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(quick = args.quick, seed = args.seed)
+    args.output.write_text(json.dumps(results, indent = 2))
+    for metric, value in results['metrics'].items():
+        print(f'{metric:>40}: {value:,.1f}')
+    if args.baseline is None:
+        return 0
+    if not args.baseline.exists():
+        print(f'The baseline {args.baseline} does not exist.')
+        return 1
+    regressions = compare_results(results, json.loads(args.baseline.read_text()),
+                                  tolerance = args.tolerance)
+    for metric, expected, value in regressions:
+        print(f'Regression in {metric}: {value:,.1f} vs {expected:,.1f} (baseline)')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,413 @@
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from pathlib import Path
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+from modules.normalize_text import BRAND_TOKENS_SPLIT
+from modules.sku_matcher import SkuFeatures, build_features, score_matrix, best_matches
+
+
+def tokenize(name: str) -> list:
+    '''Tokens of a normalized name, split as `extract_brand` does: the
+    weighted brand is not glued to the following token'''
+    return [token for token in BRAND_TOKENS_SPLIT.split(name) if token]
+
+
+class CatalogIndex:
+    """
+        Inverted index from the tokens of the cleaned catalog names to
+        their rows, used to generate the candidates of each competitor
+        name instead of scoring the whole (mkp x comp) cross join.
+
+        Tokens present in more than `max_df` (share) of the catalog are
+        skipped, as stopwords would be. The candidates of a name are the
+        `max_candidates` catalog names with the largest idf weight of
+        shared tokens, ties by the lowest `sku`.
+    """
+    def __init__(self, mkp_skus: Iterable, mkp_names: Iterable,
+                 max_df: float = 0.1, max_candidates: int = 100) -> None:
+        self._set_catalog(mkp_skus, mkp_names, max_candidates)
+        postings = {}
+        for row, f in enumerate(self.features):
+            for token in set(tokenize(f.name)):
+                postings.setdefault(token, []).append(row)
+        max_count = max(1, int(max_df * len(self.features)))
+        self.stop_tokens = frozenset(token for token, rows in postings.items()
+                                     if len(rows) > max_count)
+        self.postings = {token: np.array(rows, dtype = np.int64)
+                         for token, rows in postings.items()
+                         if token not in self.stop_tokens}
+        self.idf = {token: np.log(len(self.features) / len(rows))
+                    for token, rows in self.postings.items()}
+
+    def _set_catalog(self, mkp_skus: Iterable, mkp_names: Iterable,
+                     max_candidates: int, sort: bool = True) -> None:
+        catalog = pd.DataFrame({'sku': list(mkp_skus), 'name': list(mkp_names)})
+        if sort:
+            catalog = catalog.sort_values('sku', kind = 'stable', ignore_index = True)
+        self.skus     = catalog['sku'].to_numpy()
+        self.names    = catalog['name'].tolist()
+        self.features = [name if isinstance(name, SkuFeatures) else SkuFeatures(name)
+                         for name in self.names]
+        self.max_candidates = max_candidates
+        # Pairs scored by the last `best_matches` call
+        self.n_pairs = 0
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def candidates(self, comp_name: str) -> np.ndarray:
+        """
+            Returns the (sorted) catalog rows sharing at least one
+            indexed token with `comp_name`, `max_candidates` at most.
+        """
+        tokens = [t for t in set(tokenize(comp_name)) if t in self.postings]
+        if not tokens:
+            return np.array([], dtype = np.int64)
+        rows   = np.concatenate([self.postings[t] for t in tokens])
+        # Weights are never 0, so the smallest idf still counts
+        weight = np.concatenate([np.full(len(self.postings[t]), self.idf[t] + 1e-9)
+                                 for t in tokens])
+        score  = np.bincount(rows, weights = weight, minlength = len(self))
+        rows   = np.flatnonzero(score)
+        if len(rows) > self.max_candidates:
+            top  = np.argsort(-score[rows], kind = 'stable')[:self.max_candidates]
+            rows = np.sort(rows[top])
+        return rows
+
+    def candidates_batch(self, comp_names: Iterable) -> list:
+        '''The `candidates` of each competitor name'''
+        return [self.candidates(name) for name in comp_names]
+
+    def best_matches(self, comp_names: Iterable) -> pd.DataFrame:
+        """
+            Scores each competitor name against its candidates only and
+            keeps the best sku (ties: lowest `sku`). Names without any
+            candidate get no `sku` and a NaN `confidence`.
+            Returns the same columns as `sku_matcher.best_matches`.
+        """
+        comp_names = list(comp_names)
+        skus  = np.full(len(comp_names), None, dtype = object)
+        confs = np.full(len(comp_names), np.nan, dtype = np.float64)
+        self.n_pairs = 0
+        comp_features = build_features(comp_names)
+        candidates    = self.candidates_batch([f.name for f in comp_features])
+        for i, (f, rows) in enumerate(zip(comp_features, candidates)):
+            if len(rows) == 0:
+                continue
+            conf = score_matrix([self.features[r] for r in rows], [f], workers = 1)[:, 0]
+            best = conf.argmax()
+            skus[i], confs[i] = self.skus[rows[best]], conf[best]
+            self.n_pairs += len(rows)
+        return pd.DataFrame({
+            'comp_sku_name_clean': pd.Series(comp_names, dtype = object),
+            'sku':        pd.Series(skus, dtype = object),
+            'confidence': confs})
+
+    def recall_audit(self, comp_names: Iterable, sample_size: int = 200,
+                     conf_thr: float = 0.4, seed: int = 0) -> dict:
+        """
+            Compares the index with the brute force `best_matches` on a
+            random sample of the competitor names. The recall is the share
+            of the names whose brute force match (confidence >= `conf_thr`)
+            is also found by the index with the same confidence.
+        """
+        comp_names = pd.Series(list(dict.fromkeys(comp_names)), dtype = object)
+        sample = comp_names.sample(n = min(sample_size, len(comp_names)),
+                                   random_state = seed).tolist()
+        expected = best_matches(self.skus, self.features, sample)
+        matches  = self.best_matches(sample)
+        relevant = expected['confidence'] >= conf_thr
+        found    = relevant & (matches['sku'] == expected['sku']) \
+                            & (matches['confidence'] == expected['confidence'])
+        n_relevant = int(relevant.sum())
+        return {
+            'sample':     len(sample),
+            'relevant':   n_relevant,
+            'found':      int(found.sum()),
+            'recall':     found.sum() / n_relevant if n_relevant else 1.0,
+            'pairs':      self.n_pairs,
+            'full_pairs': len(self) * len(sample),
+            'missed':     expected[relevant & ~found].reset_index(drop = True)}
+
+
+class NgramIndex(CatalogIndex):
+    """
+        Candidates by the cosine similarity of the character `n`-gram
+        TF-IDF vectors of the names. Unlike the token index, typos and
+        merged tokens (`cocacola` against `coca cola`) still share most
+        of their n-grams.
+
+        N-grams present in more than `max_df` (share) of the catalog
+        (` ml`, `00m`...) are skipped, as the stop tokens of the token
+        index: they would make the products nearly dense.
+
+        The competitor names are multiplied against the catalog in
+        chunks of `chunk_size` sparse rows, keeping the `max_candidates`
+        nearest catalog names of each (cosine >= `min_similarity`, ties
+        by the lowest `sku`), so the dense (comp x mkp) matrix is never
+        built. The chunks are shortened to at most `max_chunk_pairs`
+        (comp x mkp) pairs, so the memory of each product does not grow
+        with the catalog. The chunks run on `workers` threads (-1: all
+        cores), the sparse products release the GIL.
+    """
+    def __init__(self, mkp_skus: Iterable, mkp_names: Iterable, n: int = 3,
+                 max_candidates: int = 50, min_similarity: float = 0.0,
+                 max_df: float = 0.2, chunk_size: int = 1024,
+                 max_chunk_pairs: int = 2 ** 22, workers: int = -1) -> None:
+        self._set_catalog(mkp_skus, mkp_names, max_candidates)
+        self.n = n
+        self.min_similarity = min_similarity
+        self.chunk_size = max(1, min(chunk_size, max_chunk_pairs // max(1, len(self))))
+        self.workers    = os.cpu_count() if workers == -1 else max(1, workers)
+        self.vocabulary = {}
+        counts = self._ngram_counts([f.name for f in self.features], grow = True)
+        # Drops the stop n-grams from the vocabulary
+        df = np.bincount(counts.indices, minlength = len(self.vocabulary))
+        max_count = max(1, int(max_df * len(self)))
+        ngrams    = np.array(list(self.vocabulary), dtype = object)
+        self.stop_ngrams = frozenset(ngrams[df > max_count])
+        keep   = np.flatnonzero(df <= max_count)
+        counts = counts[:, keep]
+        self.vocabulary = {gram: col for col, gram in enumerate(ngrams[keep])}
+        # Smoothed idf, as `sklearn.feature_extraction.text.TfidfTransformer`
+        self.idf = np.log((1 + len(self)) / (1 + df[keep])) + 1
+        # (ngram x mkp), the right hand side of every product
+        self.matrix_t = self._tfidf(counts).T.tocsr()
+
+    def ngrams(self, name: str) -> list:
+        '''Character n-grams of the name padded with spaces, across
+        the tokens (so merged tokens keep the n-grams of both)'''
+        text = f" {' '.join(name.split())} "
+        return [text[i:i + self.n] for i in range(len(text) - self.n + 1)] if text.strip() else []
+
+    def _ngram_counts(self, names: Iterable, grow: bool = False) -> sparse.csr_matrix:
+        '''Encodes the names as sparse (name x ngram) counts. The
+        n-grams out of the vocabulary are ignored unless `grow`'''
+        indptr, indices = [0], []
+        for name in names:
+            for gram in self.ngrams(name):
+                col = self.vocabulary.get(gram)
+                if col is None and grow:
+                    col = self.vocabulary[gram] = len(self.vocabulary)
+                if col is not None:
+                    indices.append(col)
+            indptr.append(len(indices))
+        counts = sparse.csr_matrix((np.ones(len(indices), dtype = np.float64), indices, indptr),
+                                   shape = (len(indptr) - 1, len(self.vocabulary)))
+        counts.sum_duplicates()
+        return counts
+
+    def _tfidf(self, counts: sparse.csr_matrix) -> sparse.csr_matrix:
+        '''Scales the counts by the idf and L2 normalizes the rows'''
+        tfidf = counts.multiply(self.idf).tocsr()
+        norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis = 1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.diags(1 / norms) @ tfidf
+
+    def _top_k_chunk(self, comp_names: list) -> sparse.csr_matrix:
+        sim = (self._tfidf(self._ngram_counts(comp_names)) @ self.matrix_t).tocsr()
+        k = self.max_candidates
+        indptr, keep = [0], []
+        for start, end in zip(sim.indptr[:-1], sim.indptr[1:]):
+            data = sim.data[start:end]
+            idx  = np.flatnonzero(data >= self.min_similarity)
+            if len(idx) > k:
+                # Ties of the k-th similarity go to the lowest catalog row
+                kth = np.partition(data[idx], len(idx) - k)[len(idx) - k]
+                idx = idx[data[idx] >= kth]
+                idx = idx[np.lexsort((sim.indices[start + idx], -data[idx]))[:k]]
+            keep.append(start + idx)
+            indptr.append(indptr[-1] + len(idx))
+        keep = np.concatenate(keep) if keep else np.array([], dtype = np.int64)
+        top  = sparse.csr_matrix((sim.data[keep], sim.indices[keep], indptr), shape = sim.shape)
+        top.sort_indices()
+        return top
+
+    def top_k(self, comp_names: Iterable) -> sparse.csr_matrix:
+        """
+            Returns the sparse (comp x mkp) cosine similarities of the
+            `max_candidates` nearest catalog names of each competitor
+            name, the other pairs are not stored.
+        """
+        comp_names = list(comp_names)
+        chunks = [comp_names[start:start + self.chunk_size]
+                  for start in range(0, len(comp_names), self.chunk_size)]
+        if not chunks:
+            return sparse.csr_matrix((0, len(self)), dtype = np.float64)
+        if self.workers == 1 or len(chunks) == 1:
+            results = [self._top_k_chunk(chunk) for chunk in chunks]
+        else:
+            with ThreadPoolExecutor(max_workers = self.workers) as executor:
+                results = list(executor.map(self._top_k_chunk, chunks))
+        return sparse.vstack(results, format = 'csr')
+
+    def candidates(self, comp_name: str) -> np.ndarray:
+        return self.candidates_batch([comp_name])[0]
+
+    def candidates_batch(self, comp_names: Iterable) -> list:
+        sim = self.top_k(comp_names)
+        return [sim.indices[sim.indptr[i]:sim.indptr[i + 1]].astype(np.int64)
+                for i in range(sim.shape[0])]
+
+
+class MinHashIndex(CatalogIndex):
+    """
+        Locality sensitive hashing of the MinHash signatures of the token
+        shingles (`shingle_size` consecutive tokens) of the names, for
+        catalogs too large for the other indexes.
+
+        Each signature has `bands` x `rows` min hashes. A catalog name is
+        a candidate of a competitor name when all the `rows` of at least
+        one band are equal, which happens with probability
+        `1 - (1 - J ** rows) ** bands` for a Jaccard similarity `J` of
+        their shingles (1/2 at about `threshold`). Every band is a sorted
+        array of bucket keys, so a lookup is a binary search, below
+        linear in the catalog size. The candidates sharing the most bands
+        are kept, `max_candidates` at most (ties by the lowest `sku`).
+
+        The signatures only depend on the names and on (`bands`, `rows`,
+        `shingle_size`, `seed`): `save` them once per catalog snapshot
+        and `load` the index instead of hashing the catalog again.
+    """
+    # Mersenne prime of the universal hashes `(a * x + b) % PRIME`
+    PRIME = np.uint64((1 << 61) - 1)
+    EMPTY = np.uint32(np.iinfo(np.uint32).max)
+
+    def __init__(self, mkp_skus: Iterable, mkp_names: Iterable, bands: int = 32,
+                 rows: int = 4, shingle_size: int = 1, max_candidates: int = 100,
+                 seed: int = 0, chunk_size: int = 4096) -> None:
+        self._set_catalog(mkp_skus, mkp_names, max_candidates)
+        self._set_params(bands, rows, shingle_size, seed)
+        self.signatures = self.signature([f.name for f in self.features],
+                                         chunk_size = chunk_size)
+        self._build_bands()
+
+    def _set_params(self, bands: int, rows: int, shingle_size: int, seed: int) -> None:
+        self.bands, self.rows = bands, rows
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # a < 2**31 and x < 2**32 (crc32) keep `a * x + b` within 64 bits
+        self._a = rng.integers(1, 1 << 31, size = bands * rows, dtype = np.uint64)
+        self._b = rng.integers(0, 1 << 32, size = bands * rows, dtype = np.uint64)
+        # Multipliers combining the `rows` hashes of a band into a key
+        self._mix = rng.integers(1, 1 << 63, size = rows, dtype = np.uint64) | np.uint64(1)
+
+    @property
+    def threshold(self) -> float:
+        '''Jaccard similarity found with probability ~1/2'''
+        return (1 / self.bands) ** (1 / self.rows)
+
+    def shingles(self, name: str) -> set:
+        tokens = tokenize(name)
+        size   = min(self.shingle_size, len(tokens))
+        if not tokens:
+            return set()
+        return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+    def signature(self, names: Iterable, chunk_size: int = 4096) -> np.ndarray:
+        """
+            Returns the (name x `bands * rows`) uint32 MinHash signatures.
+            Names without any token get `EMPTY` hashes, that never match.
+        """
+        names = list(names)
+        signatures = np.full((len(names), self.bands * self.rows), self.EMPTY, dtype = np.uint32)
+        for start in range(0, len(names), chunk_size):
+            shingles = [self.shingles(name) for name in names[start:start + chunk_size]]
+            sizes    = np.array([len(s) for s in shingles], dtype = np.int64)
+            if not sizes.any():
+                continue
+            x = np.fromiter((zlib.crc32(s.encode('utf-8')) for sh in shingles for s in sh),
+                            dtype = np.uint64, count = int(sizes.sum()))
+            hashes  = ((x[:, None] * self._a + self._b) % self.PRIME).astype(np.uint32)
+            offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+            nonzero = np.flatnonzero(sizes)
+            signatures[start + nonzero] = np.minimum.reduceat(hashes, offsets[nonzero], axis = 0)
+        return signatures
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        '''(name x bands) uint64 keys of the bands of the signatures'''
+        bands = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        return (bands * self._mix).sum(axis = 2, dtype = np.uint64)
+
+    def _build_bands(self) -> None:
+        indexed = np.flatnonzero((self.signatures != self.EMPTY).any(axis = 1))
+        keys    = self._band_keys(self.signatures[indexed])
+        order   = np.argsort(keys, axis = 0, kind = 'stable')
+        # Sorted bucket keys of each band and their catalog rows
+        self._keys = np.take_along_axis(keys, order, axis = 0).T.copy()
+        self._rows = indexed[order].T.copy()
+
+    def candidates_batch(self, comp_names: Iterable) -> list:
+        signatures = self.signature(comp_names)
+        keys  = self._band_keys(signatures)
+        empty = (signatures == self.EMPTY).all(axis = 1)
+        # (query, catalog row) pairs colliding in any band
+        query, rows = [], []
+        for band in range(self.bands):
+            lo = np.searchsorted(self._keys[band], keys[:, band], side = 'left')
+            hi = np.searchsorted(self._keys[band], keys[:, band], side = 'right')
+            sizes = np.where(empty, 0, hi - lo)
+            total = int(sizes.sum())
+            if total == 0:
+                continue
+            starts = np.repeat(lo - np.cumsum(sizes) + sizes, sizes)
+            query.append(np.repeat(np.arange(len(keys)), sizes))
+            rows.append(self._rows[band][starts + np.arange(total)])
+        if not query:
+            return [np.array([], dtype = np.int64) for _ in range(len(keys))]
+        pairs, bands = np.unique(np.concatenate(query) * len(self) + np.concatenate(rows),
+                                 return_counts = True)
+        query, rows = pairs // len(self), pairs % len(self)
+        # By query, shared bands (descending) and catalog row (lowest sku)
+        order = np.lexsort((rows, -bands, query))
+        query, rows = query[order], rows[order]
+        starts = np.searchsorted(query, np.arange(len(keys)))
+        ends   = np.minimum(np.searchsorted(query, np.arange(len(keys)), side = 'right'),
+                            starts + self.max_candidates)
+        return [np.sort(rows[start:end]) for start, end in zip(starts, ends)]
+
+    def candidates(self, comp_name: str) -> np.ndarray:
+        return self.candidates_batch([comp_name])[0]
+
+    def query(self, comp_name: str) -> np.ndarray:
+        '''Returns the candidate skus of a competitor name'''
+        return self.skus[self.candidates(comp_name)]
+
+    def save(self, path: Path) -> Path:
+        '''Writes the catalog, in its (sorted by sku) order, and its
+        signatures as a `.npz` file. As `np.savez`, appends the `.npz`
+        suffix when missing, and returns the path written'''
+        path = Path(path)
+        if path.suffix != '.npz':
+            path = path.with_name(path.name + '.npz')
+        # Numeric skus keep their type (object arrays would need pickle)
+        skus = np.asarray(self.skus.tolist())
+        np.savez(path, skus = skus if skus.dtype.kind in 'iufU' else skus.astype(str),
+                 names = np.array([f.name for f in self.features], dtype = str),
+                 signatures = self.signatures,
+                 params = np.array([self.bands, self.rows, self.shingle_size, self.seed]))
+        return path
+
+    @classmethod
+    def load(cls, path: Path, max_candidates: int = 100):
+        '''Index of a saved catalog, without hashing it again'''
+        path = Path(path)
+        if not path.is_file():
+            print(f'File not found: {path}')
+            return None
+        with np.load(path) as data:
+            skus, names = data['skus'].astype(object), data['names'].tolist()
+            signatures  = data['signatures']
+            bands, rows, shingle_size, seed = data['params'].tolist()
+        index = cls.__new__(cls)
+        # Already sorted, as the rows of the signatures
+        index._set_catalog(skus, names, max_candidates, sort = False)
+        index._set_params(bands, rows, shingle_size, seed)
+        index.signatures = signatures
+        index._build_bands()
+        return index
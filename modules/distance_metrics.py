@@ -2,7 +2,9 @@ import re
 import numpy as np
 import functools
 import typing
+from scipy import sparse
 from scipy.spatial.distance import pdist, squareform, jaccard
+from collections import Counter
 from collections.abc import Iterable
 import textdistance
 from fuzzywuzzy import fuzz
@@ -42,12 +44,35 @@ def dice_sorensen_dist_ratio(a: str, b: str) -> float:
                 .normalized_distance(a, b)
     return dist
 
+UNITS_SUFFIX_PATTERN = re.compile(r'\d+[ml|lt|pz|g|oz|kg]+(\s|$)')
+
 def remove_units(s_clean: str) -> Iterable:
     '''Extracts the measure units from a cleaned string
     '''
-    text = re.sub(r'\d+[ml|lt|pz|g|oz|kg]+(\s|$)', '', s_clean).strip()
+    text = UNITS_SUFFIX_PATTERN.sub('', s_clean).strip()
     return text
 
+def dice_sorensen_dist_sets(a: str, b: str, 
+                            A: frozenset, B: frozenset) -> float:
+    '''Computes the Sorensen-Dice distance between strings `a` and `b`
+       from their precomputed sets of characters `A` and `B`.
+       Equivalent to `dice_sorensen_dist_ratio(a, b)`'''
+    if a == b:
+        return 0.0
+    if not a or not b:
+        return 1.0
+    return 1 - 2.0 * len(A & B) / (len(A) + len(B))
+
+def lev_dice_mean(dist_lev: float, dist_dice: float,
+                  dice_weight: float = 0.7) -> float:
+    '''Weighted average of the Levenshtein and Sorensen-Dice distances'''
+    # Avoid dividing by zero by evaluating each term
+    if dist_lev + dist_dice <= 0:
+        mean_dist = 0
+    else:
+        mean_dist =  ((dist_lev * (2 - dice_weight)) + (dist_dice * dice_weight)) / 2
+    return mean_dist
+
 
 def levenshtein_and_dice_ratio(a: str, b: str, 
                                dice_weight: float = 0.7) -> float: 
@@ -60,11 +85,14 @@ def levenshtein_and_dice_ratio(a: str, b: str,
     b = remove_units(b)
     dist_lev  = levenshtein_dist_ratio(a, b)
     dist_dice = dice_sorensen_dist_ratio(a, b)
-    # Avoid dividing by zero by evaluating each term
-    if dist_lev + dist_dice <= 0:
-        mean_dist = 0
-    else:
-        mean_dist =  ((dist_lev * (2 - dice_weight)) + (dist_dice * dice_weight)) / 2
+    mean_dist = lev_dice_mean(dist_lev, dist_dice, dice_weight)
+    return mean_dist
+
+def lev_dice_mean_array(dist_lev: np.ndarray, dist_dice: np.ndarray,
+                        dice_weight: float = 0.7) -> np.ndarray:
+    '''Vectorized `lev_dice_mean`'''
+    mean_dist = np.where(dist_lev + dist_dice <= 0, 0.0,
+                         ((dist_lev * (2 - dice_weight)) + (dist_dice * dice_weight)) / 2)
     return mean_dist
 
 def jaccard_similarity(A: Iterable, B: Iterable) -> float:
@@ -90,4 +118,123 @@ def jaccard_distance_units(a: str, b: str) -> float:
         B = re.split(r'(\d+)', B[0])
     jaccard_sim  = jaccard_similarity(A, B)
     jaccard_dist = 1 - jaccard_sim 
-    return jaccard_dist 
\ No newline at end of file
+    return jaccard_dist
+
+def jaccard_distance_unit_sets(A: frozenset, B: frozenset) -> float:
+    '''Computes the Jaccard distance between two precomputed
+    sets of units (see `jaccard_distance_units`)
+    '''
+    card_AuB = len(A | B)
+    jaccard_sim = 1
+    if card_AuB > 0:
+        jaccard_sim = len(A & B) / card_AuB
+    return 1 - jaccard_sim
+
+def unit_sets(s_clean: str) -> tuple:
+    '''Returns the set of units of a cleaned string and, if it has a
+    single unit, the set of its tokens split by digits (else `None`)
+    '''
+    units = extract_units(s_clean)
+    split_units = None
+    if len(units) == 1:
+        split_units = frozenset(re.split(r'(\d+)', units[0]))
+    return frozenset(units), split_units
+
+def incidence_matrices(sets_a: Iterable, sets_b: Iterable) -> tuple:
+    '''Encodes two lists of sets as binary sparse (set x token)
+    matrices sharing the same token vocabulary
+    '''
+    vocabulary = {}
+    matrices = []
+    for sets in (sets_a, sets_b):
+        indices, indptr = [], [0]
+        for items in sets:
+            indices.extend(vocabulary.setdefault(item, len(vocabulary))
+                           for item in items)
+            indptr.append(len(indices))
+        matrices.append((np.ones(len(indices)), indices, indptr))
+    return tuple(sparse.csr_matrix(data, shape = (len(data[2]) - 1, len(vocabulary)))
+                 for data in matrices)
+
+def char_count_matrices(a: Iterable, b: Iterable) -> tuple:
+    '''Encodes two lists of strings as sparse (string x character)
+    matrices of character counts sharing the same vocabulary
+    '''
+    vocabulary = {}
+    matrices = []
+    for strings in (a, b):
+        data, indices, indptr = [], [], [0]
+        for s in strings:
+            counts = Counter(s)
+            data.extend(counts.values())
+            indices.extend(vocabulary.setdefault(c, len(vocabulary))
+                           for c in counts)
+            indptr.append(len(indices))
+        matrices.append((np.array(data, dtype = np.float64), indices, indptr))
+    return tuple(sparse.csr_matrix(data, shape = (len(data[2]) - 1, len(vocabulary)))
+                 for data in matrices)
+
+def levenshtein_ratio_upper_bound(a: Iterable, b: Iterable) -> np.ndarray:
+    '''Upper bound of `fuzz.ratio` for every pair of strings. The longest
+    common subsequence can only use the characters present in both
+    strings, so it is bounded by the counts of the shared characters
+    '''
+    A, B = char_count_matrices(a, b)
+    lcs_ub = np.minimum((A @ (B > 0).T).toarray(), ((A > 0) @ B.T).toarray())
+    len_a = np.asarray(A.sum(axis = 1)).ravel()
+    len_b = np.asarray(B.sum(axis = 1)).ravel()
+    lensum = len_a[:, None] + len_b[None, :]
+    with np.errstate(invalid = 'ignore'):
+        sim_ub = 1 - (lensum - 2 * lcs_ub) / lensum
+    # Round half up with some slack: never below the rounded ratio
+    ratio_ub = np.floor(100 * sim_ub + 0.5 + 1e-9)
+    ratio_ub[lensum == 0] = 100
+    return ratio_ub
+
+def intersection_matrix(sets_a: Iterable, sets_b: Iterable) -> tuple:
+    '''Computes the pairwise intersection sizes of two lists of sets
+    with a single sparse product, and the size of each set
+    '''
+    A, B = incidence_matrices(sets_a, sets_b)
+    inter = (A @ B.T).toarray()
+    return inter, np.diff(A.indptr), np.diff(B.indptr)
+
+def dice_sorensen_dist_matrix(sets_a: Iterable, sets_b: Iterable) -> np.ndarray:
+    '''Computes the Sorensen-Dice distance between every pair of sets.
+    Strings are taken as sets of characters, so the result equals
+    `dice_sorensen_dist_ratio` on each pair of strings
+    '''
+    inter, size_a, size_b = intersection_matrix(map(frozenset, sets_a),
+                                                map(frozenset, sets_b))
+    count = size_a[:, None] + size_b[None, :]
+    with np.errstate(invalid = 'ignore'):
+        dist = np.where(count == 0, 0.0, 1 - 2.0 * inter / count)
+    return dist
+
+def jaccard_distance_sets_matrix(sets_a: Iterable, sets_b: Iterable) -> np.ndarray:
+    '''Computes the Jaccard distance between every pair of sets
+    (see `jaccard_distance_unit_sets`)
+    '''
+    inter, size_a, size_b = intersection_matrix(sets_a, sets_b)
+    union = size_a[:, None] + size_b[None, :] - inter
+    with np.errstate(invalid = 'ignore'):
+        jaccard_sim = np.where(union > 0, inter / union, 1)
+    return 1 - jaccard_sim
+
+def jaccard_distance_units_matrix(a: Iterable, b: Iterable) -> np.ndarray:
+    '''Computes `jaccard_distance_units` for every pair of cleaned
+    strings. Accepts the strings or their precomputed `unit_sets`
+    '''
+    a = [unit_sets(s) if isinstance(s, str) else s for s in a]
+    b = [unit_sets(s) if isinstance(s, str) else s for s in b]
+    jaccard_dist = jaccard_distance_sets_matrix([units for units, _ in a],
+                                                [units for units, _ in b])
+    # Pairs with a single unit on both sides compare the split units
+    is_single_a = np.array([split is not None for _, split in a], dtype = bool)
+    is_single_b = np.array([split is not None for _, split in b], dtype = bool)
+    if is_single_a.any() and is_single_b.any():
+        idx_a, idx_b = np.nonzero(is_single_a)[0], np.nonzero(is_single_b)[0]
+        split_dist = jaccard_distance_sets_matrix([a[i][1] for i in idx_a],
+                                                  [b[j][1] for j in idx_b])
+        jaccard_dist[np.ix_(idx_a, idx_b)] = split_dist
+    return jaccard_dist
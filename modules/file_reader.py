@@ -1,23 +1,123 @@
+import io
 import os
 import re
+import csv
+import time
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as fs
 from pathlib import Path
 from typing import Union
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+# Single character separator of the fast reader, see `OnlineFileReader`
+FAST_SEP = '\x1f'
+# Line breaks of a file opened with `newline = ''`, as the python engine does
+LINE_BREAKS = re.compile('\r\n|\r|\n')
+PRICE_CHARS_PATTERN = r'"|\$|\,|[c/u]|[/u]'
+URL_PATTERN = r'^https?://[\w.-]+'
+# Characters removed by `str.strip()` from ASCII strings
+ASCII_WHITESPACE = ' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+# Arrow schemas of the reader outputs, as the `StructType`s of the notebook
+MKTP_PRICES_SCHEMA = pa.schema([
+    pa.field("country",     pa.string()),
+    pa.field("date",        pa.date32()),
+    pa.field("region_name", pa.string()),
+    pa.field("sku",         pa.string()),
+    pa.field("sku_name",    pa.string()),
+    pa.field("price",       pa.float64())
+])
+SCRAP_SCHEMA = pa.schema([
+    pa.field("type",                pa.string(), False),
+    pa.field("country",             pa.string(), False),
+    pa.field("locality",            pa.string(), False),
+    pa.field("date",                pa.date32(), False),
+    pa.field("competitor_name",     pa.string()),
+    pa.field("competitor_sku_name", pa.string()),
+    pa.field("competitor_price",    pa.float64()),
+    pa.field("special_price",       pa.float64()),
+    pa.field("competitor_url",      pa.string()),
+    pa.field("gift_or_extra_prod",  pa.string())
+])
+# Outcomes of `OnlineFileReader.read_file`, reported by `read_directory`
+READ_STATUSES = ['ok', 'not_found', 'empty', 'missing_columns', 'invalid_date',
+                 'invalid_names', 'invalid_prices', 'error']
+
+def round_series(values: pd.Series, ndigits: int = 2) -> pd.Series:
+    '''Vectorized built-in `round(x, ndigits)`. Values next to a rounding
+    boundary, or too large to be scaled exactly, are rounded with `round`
+    to keep its exact behavior'''
+    large   = values.abs() >= 1e13
+    scaled  = values.where(~large, 0) * 10.0**ndigits
+    rounded = values.where(~large, 0).round(ndigits)
+    exact   = large | ((scaled - np.floor(scaled) - 0.5).abs() < 1e-6)
+    rounded[exact] = values[exact].map(lambda x: round(x, ndigits))
+    return rounded
+
+def dataframe_to_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    '''Builds an Arrow table with the `schema` columns of `df`, casting each
+    column to its Arrow type. Missing values (NaN, NA, NaT) become nulls.
+    Arrow does not enforce the non-nullable fields: the rows with nulls in
+    them (e.g. unparsed dates) are reported and dropped'''
+    arrays = []
+    for field in schema:
+        col = df[field.name]
+        if pa.types.is_date(field.type):
+            array = pc.cast(pa.array(pd.to_datetime(col)), field.type, safe = False)
+        elif pa.types.is_floating(field.type):
+            array = pa.array(col.astype(np.float64), type = field.type, from_pandas = True)
+        else:
+            array = pa.array(col.astype(object), type = field.type, from_pandas = True)
+        arrays.append(array)
+    table = pa.Table.from_arrays(arrays, schema = schema)
+    null_counts = {field.name: table[field.name].null_count for field in schema
+                   if not field.nullable and table[field.name].null_count}
+    if null_counts:
+        print(f'Dropping rows with nulls in non-nullable columns: {null_counts}')
+        for name in null_counts:
+            table = table.filter(pc.is_valid(table[name]))
+    table.validate(full = True)
+    return table
+
+
+def mktp_prices_files(prices_dir: Path, country: str,
+                      start_date: date, end_date: date) -> list:
+    '''Lists the `{country}-{YYYY-dd-mm}.parquet` files of `prices_dir`
+    dated between `start_date` and `end_date` (both included), by date'''
+    files = []
+    for file_path in Path(prices_dir).glob(f'{country}-*.parquet'):
+        try:
+            file_date = datetime.strptime(file_path.stem[len(country) + 1:], '%Y-%d-%m').date()
+        except ValueError:
+            continue
+        if start_date <= file_date <= end_date:
+            files.append((file_date, file_path))
+    return [file_path for _, file_path in sorted(files)]
+
 
 class MktpPricesFileReader:
     """
         A class for reading and validating `.parquet` files 
         containing the sku prices of MAZ Marketplace.
+        Only the required columns are read, and the rows of
+        `regions` (all if `None`) are filtered while scanning.
     """
     def __init__(self, file_path: Path, 
-                 country: str = None) -> None:
+                 country: str = None,
+                 regions: list = None,
+                 memory_map: bool = False) -> None:
         if not isinstance(file_path, Path):
             file_path  = Path(file_path)
         if country == None:
             country = file_path.name[:2]
         self.country      = country
         self.file_path    = file_path
+        self.regions      = regions
+        self.memory_map   = memory_map
         self.valid_colums = ['date', 'region_name', 
                              'sku', 'sku_name', 'price']
         
@@ -25,11 +125,49 @@ class MktpPricesFileReader:
         # TODO: move list of countries to a dictionary
         valid_countries = ['MX', 'CO', 'PE', 'EC', 'PA', 'SV', 'HN']
         return self.country in valid_countries
-        
-    def read_file(self) -> Union[pd.DataFrame, None]:
+
+    def _date_filter(self, date_type: pa.DataType, start_date: date,
+                     end_date: date) -> ds.Expression:
+        '''`start_date <= date <= end_date` as a scan filter. String
+        dates are parsed by Arrow as (ISO 8601) timestamps'''
+        date_col = ds.field('date')
+        if pa.types.is_date(date_type):
+            lower, upper = start_date, end_date + timedelta(days = 1)
+        else:
+            if not pa.types.is_timestamp(date_type):
+                date_type = pa.timestamp('s')
+                date_col  = date_col.cast(date_type)
+            lower = datetime.combine(start_date, datetime.min.time())
+            upper = datetime.combine(end_date + timedelta(days = 1), datetime.min.time())
+        return (date_col >= pa.scalar(lower, date_type)) & (date_col < pa.scalar(upper, date_type))
+
+    def _scan(self, file_paths: list, dates: tuple = None) -> pd.DataFrame:
+        '''Reads the required columns of the `file_paths` in a single
+        scan, pushing the `regions` filter and the (`start_date`,
+        `end_date`) window of `dates` down to the parquet reader'''
+        dataset = ds.dataset([str(f) for f in file_paths], format = 'parquet',
+                             filesystem = fs.LocalFileSystem(use_mmap = self.memory_map))
+        missing_columns = [col for col in self.valid_colums
+                           if col not in dataset.schema.names]
+        if missing_columns:
+            raise KeyError(missing_columns)
+        row_filter = ds.field('region_name').isin(self.regions) \
+                        if self.regions is not None else None
+        if dates is not None:
+            date_filter = self._date_filter(dataset.schema.field('date').type, *dates)
+            try:
+                return dataset.to_table(columns = self.valid_colums,
+                                        filter = date_filter if row_filter is None
+                                                 else row_filter & date_filter).to_pandas()
+            except pa.ArrowInvalid:
+                # Dates Arrow cannot parse: the window is applied after the scan
+                pass
+        return dataset.to_table(columns = self.valid_colums,
+                                filter = row_filter).to_pandas()
+
+    def read_file(self, file_paths: list = None, dates: tuple = None) -> Union[pd.DataFrame, None]:
         try:
-            df = pd.read_parquet(self.file_path)
-            df = df[self.valid_colums]
+            df = self._scan([self.file_path] if file_paths is None else file_paths, dates)
             # Check the column date is correct
             df['date']  = pd.to_datetime(df['date'])
             # Remove leading zeros
@@ -57,6 +195,40 @@ class MktpPricesFileReader:
             df = df.dropna()
             return df
 
+    def read_window(self, days: int = 15) -> Union[pd.DataFrame, None]:
+        """
+            Reads the prices of the `days` days up to the date of
+            `file_path` (both included, as the catalog query of the
+            notebook), from the files of the same country in its
+            directory, in one scan. The file of the last date may be
+            missing.
+        """
+        try:
+            end_date = datetime.strptime(self.file_path.stem[len(self.country) + 1:],
+                                         '%Y-%d-%m').date()
+        except ValueError:
+            print(f'The `{self.file_path.name}` file name has no `YYYY-dd-mm` date.')
+            return None
+        start_date = end_date - timedelta(days = days)
+        file_paths = mktp_prices_files(self.file_path.parent, self.country,
+                                       start_date, end_date)
+        if not file_paths:
+            print(f'There are no {self.country} price files from {start_date} '
+                  f'to {end_date} in {self.file_path.parent}.')
+            return None
+        # The rows out of the window are dropped while scanning
+        df = self.read_file(file_paths, dates = (start_date, end_date))
+        if df is None:
+            return None
+        # No-op unless Arrow could not parse the dates
+        in_window = df['date'].dt.date.between(start_date, end_date)
+        return df[in_window]
+
+    def read_table(self) -> Union[pa.Table, None]:
+        '''`read_file` as an Arrow table of `MKTP_PRICES_SCHEMA`'''
+        df = self.read_file()
+        return None if df is None else dataframe_to_table(df, MKTP_PRICES_SCHEMA)
+
 
 
 class OnlineFileReader:
@@ -67,12 +239,21 @@ class OnlineFileReader:
     def __init__(self, 
                  file_path: Path, 
                  sep: str = '<s>',
-                 only_required_cols: bool = True) -> None:
+                 only_required_cols: bool = True,
+                 fast: bool = True,
+                 verbose: bool = True) -> None:
         if not isinstance(file_path, Path):
             file_path = Path(file_path)
         self.file_path = file_path
         self.sep = sep
         self.only_required_cols = only_required_cols
+        # Vectorized parsing and cleaning, same output as the per-row path
+        self.fast = fast
+        # Outcome of the last `read_file` call, printed only if `verbose`
+        self.verbose = verbose
+        self.status  = None
+        self.message = ''
+        self.missing_columns = []
         self.req_cols = {
             'col_sku_name':   'name', 
             'col_competitor': 'company',
@@ -92,6 +273,31 @@ class OnlineFileReader:
         except ValueError as e:
             num_val = np.nan
         return num_val
+
+    def parse_price_series(self, values: pd.Series) -> pd.Series:
+        """
+            Vectorized `parse_price_col`.
+        """
+        values = values.astype(str)
+        # Arrow cleaning equals `re.sub` and `str.strip` for ASCII values
+        arr = pa.array(values.to_numpy(dtype = object), type = pa.string())
+        for char in '"$,c/u':
+            arr = pc.replace_substring(arr, char, '')
+        arr = pc.utf8_trim(arr, characters = ASCII_WHITESPACE)
+        s = pd.Series(arr.to_numpy(zero_copy_only = False), index = values.index)
+        non_ascii = ~pc.string_is_ascii(arr).to_numpy(zero_copy_only = False)
+        s[non_ascii] = values[non_ascii].str.replace(PRICE_CHARS_PATTERN, '', regex = True)\
+                                        .str.strip()
+        num_vals = pd.to_numeric(s, errors = 'coerce')
+        valid = num_vals.notna()
+        # Parse as `float` does; `to_numeric` may differ in the last bit
+        # and rejects a few forms that `float` accepts (e.g. '1_000')
+        try:
+            num_vals[valid] = s[valid].astype(np.float64)
+        except ValueError:
+            num_vals[valid] = s[valid].map(self.parse_price_col)
+        num_vals[~valid] = s[~valid].map(self.parse_price_col)
+        return round_series(num_vals.astype(np.float64), 2)
     
     def validate_url_col(self, url: str) -> str:
         """
@@ -109,6 +315,24 @@ class OnlineFileReader:
                 return 'https://' + url
         else: 
             return None
+
+    def validate_url_series(self, urls: pd.Series) -> pd.Series:
+        """
+            Vectorized `validate_url_col`.
+        """
+        valid_urls = pd.Series(np.full(len(urls), None, dtype = object), index = urls.index)
+        if urls.dtype != object:
+            return valid_urls
+        is_str = urls.map(type).eq(str)
+        valid  = is_str & (urls.where(is_str, '').str.len() > 10)
+        urls   = urls[valid]
+        arr    = pa.array(urls.to_numpy(dtype = object), type = pa.string())
+        # RE2 `\w` only covers ASCII, as does `re` for ASCII urls
+        has_scheme = pc.match_substring_regex(arr, URL_PATTERN).to_numpy(zero_copy_only = False)
+        non_ascii  = ~pc.string_is_ascii(arr).to_numpy(zero_copy_only = False)
+        has_scheme[non_ascii] = urls[non_ascii].str.match(URL_PATTERN).astype(bool)
+        valid_urls[valid] = urls.where(has_scheme, 'https://' + urls)
+        return valid_urls
         
     def extract_gift_from_sku_name(self, sku_name: str) -> str:
         """
@@ -122,6 +346,20 @@ class OnlineFileReader:
             tokens += ['None'] 
         return tokens
 
+    def extract_gift_from_sku_names(self, sku_names: pd.Series) -> pd.DataFrame:
+        """
+            Vectorized `extract_gift_from_sku_name`. Returns a DataFrame
+            with the main sku name and the gift (or 'None').
+        """
+        names  = pa.array(sku_names.astype(str).to_numpy(dtype = object), type = pa.string())
+        tokens = pc.split_pattern(names, ' + ', max_splits = 1)
+        flat   = pc.list_flatten(tokens).to_numpy(zero_copy_only = False)
+        starts = tokens.offsets.to_numpy() - tokens.offsets[0].as_py()
+        gifts  = np.full(len(names), 'None', dtype = object)
+        has_gift = np.diff(starts) == 2
+        gifts[has_gift] = flat[starts[:-1][has_gift] + 1]
+        return pd.DataFrame({0: flat[starts[:-1]], 1: gifts}, index = sku_names.index)
+
     def validate_sku_name_col(self, sku_name: str) -> str:
         """
             Validates the `sku_name` column returning `None` in case 
@@ -138,17 +376,95 @@ class OnlineFileReader:
         else:
             return pd.NA
 
-    def read_file(self) -> Union[pd.DataFrame, None]:
+    def validate_sku_name_series(self, sku_names: pd.Series) -> pd.Series:
         """
-            Validates the given file specified by file_path.
+            Vectorized `validate_sku_name_col` for a column of strings.
+            The words are capitalized with Arrow compute functions, which
+            equal `str.capitalize` and `str.lower` for ASCII names; the
+            other names use `validate_sku_name_col`.
         """
-        # Check if the file exists and it is not empty
+        names = pa.array(sku_names.to_numpy(dtype = object), type = pa.string())
+        valid = pc.and_(pc.greater_equal(pc.utf8_length(names), 10),
+                        pc.greater(pc.count_substring(names, ' '), 1))
+        words = pc.split_pattern(names, ' ')
+        flat  = pc.list_flatten(words)
+        flat  = pc.if_else(pc.greater_equal(pc.utf8_length(flat), 3),
+                           pc.ascii_capitalize(flat), pc.ascii_lower(flat))
+        capitalized = pc.binary_join(pa.ListArray.from_arrays(words.offsets, flat), ' ')
+        valid_names = pd.Series(capitalized.to_numpy(zero_copy_only = False),
+                                index = sku_names.index, dtype = object)
+        valid_names[~valid.to_numpy(zero_copy_only = False)] = pd.NA
+        non_ascii = ~pc.string_is_ascii(names).to_numpy(zero_copy_only = False)
+        valid_names[non_ascii] = sku_names[non_ascii].map(self.validate_sku_name_col)
+        return valid_names
+
+    def _set_status(self, status: str, message: str = '') -> None:
+        '''Records the outcome of `read_file` (see `READ_STATUSES`)'''
+        self.status  = status
+        self.message = message
+        if message and self.verbose:
+            print(message)
+
+    def _read_csv_fast(self) -> Union[pd.DataFrame, None]:
+        """
+            Parses the file with the C engine, translating the separator
+            into `FAST_SEP` and stripping the lines as the python engine
+            does. Returns `None` when the result could differ from the
+            python engine: lines with a different number of fields than
+            the header, a byte order mark, or `FAST_SEP` in the file.
+        """
+        text = self.file_path.read_bytes().decode('utf-8')
+        if FAST_SEP in text or text.startswith('\ufeff') or re.escape(self.sep) != self.sep:
+            return None
+        lines  = LINE_BREAKS.split(text) if '\r' in text else text.split('\n')
+        lines  = [line.strip() for line in lines]
+        n_seps = {line.count(self.sep) for line in lines if line}
+        if not lines[0] or len(n_seps) != 1:
+            return None
+        text = '\n'.join(lines).replace(self.sep, FAST_SEP)
+        return pd.read_csv(io.BytesIO(text.encode('utf-8')),
+                           sep = FAST_SEP,
+                           engine = 'c',
+                           quoting = csv.QUOTE_NONE,
+                           on_bad_lines = 'skip',
+                           encoding = 'utf-8')
+
+    def _check_file(self) -> bool:
+        '''Checks that the file exists and it is not empty'''
+        self.missing_columns = []
+        self._named_rows     = 0
         if not os.path.exists(self.file_path):
-            return None 
+            self._set_status('not_found')
+            return False
         if os.path.getsize(self.file_path) <= 300: # less than 300 bytes
-            print(f"The file {self.file_path.name} is empty or is not a valid file.")
+            self._set_status('empty', f"The file {self.file_path.name} is empty or is not a valid file.")
+            return False
+        return True
+
+    def read_file(self) -> Union[pd.DataFrame, None]:
+        """
+            Validates the given file specified by file_path.
+        """
+        if not self._check_file():
             return None
 
+        # Read the CSV file using Pandas
+        df = self._read_csv_fast() if self.fast else None
+        if df is None:
+            df = pd.read_csv(self.file_path, 
+                             sep = self.sep,
+                             engine = 'python',
+                             on_bad_lines = 'skip',
+                             encoding = 'utf-8')
+        return self._validate(df)
+
+    def _validate(self, df: pd.DataFrame,
+                  check_empty: bool = True) -> Union[pd.DataFrame, None]:
+        """
+            Validates and cleans the rows of a parsed file (or chunk of
+            it). Without `check_empty`, the file level checks (no valid
+            name or price) are left to the caller.
+        """
         # Define the required columns
         col_sku_name = self.req_cols['col_sku_name']
         col_price    = self.req_cols['col_price']
@@ -158,13 +474,6 @@ class OnlineFileReader:
         col_quantity = 'quantity'
         col_gift     = 'gift_or_extra_prod'
 
-        # Read the CSV file using Pandas
-        df = pd.read_csv(self.file_path, 
-                         sep = self.sep,
-                         engine = 'python',
-                         on_bad_lines = 'skip',
-                         encoding = 'utf-8')
-        
         # 1) Verify the required columns exists
         # 2) Check if the price, name, and url columns are correct
         # 3) Check that the company column is unique
@@ -175,7 +484,8 @@ class OnlineFileReader:
                             if col not in df.columns]
         if missing_columns:
             #TODO: Check if rise an AssertionError
-            print(f"Missing columns: {', '.join(missing_columns)}")
+            self.missing_columns = missing_columns
+            self._set_status('missing_columns', f"Missing columns: {', '.join(missing_columns)}")
             return None
         
         # Manage the `quantity` column, if exists fill with empty string
@@ -192,27 +502,34 @@ class OnlineFileReader:
             df[col_date] = pd.to_datetime(df[col_date], errors = 'coerce',
                                           format = "%d-%m-%y")
         except AssertionError as e:
-            print(f'{self.file_path.name} - ({type(e)}) Multiple dates were provided.',
-                  df[col_date].unique())
+            self._set_status('invalid_date', f'{self.file_path.name} - ({type(e)}) '
+                             f'Multiple dates were provided. {df[col_date].unique()}')
             return None
         except ValueError as e:
-            print(f'{self.file_path.name} - ({type(e)}) the `date` column is incorrect.')
+            self._set_status('invalid_date', f'{self.file_path.name} - ({type(e)}) '
+                             'the `date` column is incorrect.')
             return None
         
         # In case of combo or gifts, separate the main sku (the first occurrence)
-        df[[col_sku_name, col_gift]] = df[[col_sku_name]]\
+        if self.fast:
+            df[[col_sku_name, col_gift]] = self.extract_gift_from_sku_names(df[col_sku_name])
+        else:
+            df[[col_sku_name, col_gift]] = df[[col_sku_name]]\
                 .apply(lambda row: self.extract_gift_from_sku_name(row[col_sku_name]),
                        axis = 'columns', result_type = 'expand')
         
         # Parse numeric columns `price` 
-        df.loc[:, col_price]    = df[col_price].apply(self.parse_price_col)
+        df.loc[:, col_price]    = self.parse_price_series(df[col_price]) if self.fast \
+                                    else df[col_price].apply(self.parse_price_col)
         # Validate the `name` column
-        df.loc[:, col_sku_name] = df[col_sku_name].apply(self.validate_sku_name_col)
+        df.loc[:, col_sku_name] = self.validate_sku_name_series(df[col_sku_name]) if self.fast \
+                                    else df[col_sku_name].apply(self.validate_sku_name_col)
         df = df.dropna(subset=[col_sku_name])
         # Add `quantity` data 
         df.loc[:, col_sku_name] = df[col_sku_name].str.cat(df[col_quantity], sep = ' ')
         # Validate the `url` column
-        df.loc[:, col_url]      = df[col_url].apply(self.validate_url_col)
+        df.loc[:, col_url]      = self.validate_url_series(df[col_url]) if self.fast \
+                                    else df[col_url].apply(self.validate_url_col)
         # Replace the `zone`
         df.loc[:, 'zone']       = df['zone'].replace({
             'unique': 'Nacional'    
@@ -221,23 +538,27 @@ class OnlineFileReader:
         # Manage `specialPrice`` column
         # Check if the `SpecialPrice` exists if not, create special_price
         if 'specialPrice' in df.columns:
-            df.loc[:, 'specialPrice'] = df['specialPrice'].apply(self.parse_price_col) 
+            df.loc[:, 'specialPrice'] = self.parse_price_series(df['specialPrice']) if self.fast \
+                                            else df['specialPrice'].apply(self.parse_price_col)
         else:
             df['specialPrice'] = np.nan
 
         # Filter records where 'sku' or 'price' is null
         valid_df = df.dropna(subset=[col_sku_name])
-        if valid_df[col_sku_name].isnull().all():
+        self._named_rows += len(valid_df)
+        if check_empty and valid_df[col_sku_name].isnull().all():
             #TODO: Check if rise an AssertionError
-            print(f"{self.file_path.name} - has incorrect `name` values.")
+            self._set_status('invalid_names', f"{self.file_path.name} - has incorrect `name` values.")
             return None
         valid_df = df.dropna(subset=[col_price])
-        if valid_df[col_price].isnull().all():
+        if check_empty and valid_df[col_price].isnull().all():
             #TODO: Check if rise an AssertionError
-            print(f"{self.file_path.name} - has incorrect `price` values.")
+            self._set_status('invalid_prices', f"{self.file_path.name} - has incorrect `price` values.")
             return None
         
-        # Parse the rest of columns
+        # Parse the rest of columns. The prices are cast since `.loc`
+        # keeps the dtype `read_csv` inferred (object, int or float)
+        valid_df = valid_df.astype({col_price: np.float64, 'specialPrice': np.float64})
         valid_df.loc[:, col_comp] = valid_df[col_comp].astype('category')
         valid_df.loc[:, col_url]  = valid_df[col_url].astype('string')
         valid_df.loc[:, col_gift] = valid_df[col_gift].astype('string')
@@ -258,4 +579,158 @@ class OnlineFileReader:
                                  'competitor_sku_name', 
                                  'competitor_price', 'special_price',
                                  'competitor_url', col_gift]]
-        return valid_df
\ No newline at end of file
+        self._set_status('ok')
+        return valid_df
+
+    def read_table(self) -> Union[pa.Table, None]:
+        '''`read_file` as an Arrow table of `SCRAP_SCHEMA`'''
+        df = self.read_file()
+        return None if df is None else dataframe_to_table(df, SCRAP_SCHEMA)
+
+    def _stream_header(self) -> Union[list, None]:
+        """
+            Streaming version of the `_read_csv_fast` checks: returns
+            the header fields if every line can be parsed with the C
+            engine, else `None`. Reads one line at a time.
+        """
+        if re.escape(self.sep) != self.sep:
+            return None
+        header, n_seps = None, None
+        with open(self.file_path, 'r', encoding = 'utf-8', newline = '') as file:
+            for i, line in enumerate(file):
+                if FAST_SEP in line or (i == 0 and line.startswith('\ufeff')):
+                    return None
+                line = line.strip()
+                if i == 0:
+                    header, n_seps = line.split(self.sep), line.count(self.sep)
+                    if not line or len(set(header)) != len(header):
+                        return None
+                elif line and line.count(self.sep) != n_seps:
+                    return None
+        return header
+
+    def _stream_csv_fast(self, header: list, chunksize: int):
+        '''Parses `chunksize` lines at a time with the C engine, see `_read_csv_fast`'''
+        with open(self.file_path, 'r', encoding = 'utf-8', newline = '') as file:
+            next(file)
+            while True:
+                lines = [line.strip() for _, line in zip(range(chunksize), file)]
+                if not lines:
+                    return
+                text = '\n'.join(lines).replace(self.sep, FAST_SEP)
+                if text.strip('\n'):
+                    yield pd.read_csv(io.BytesIO(text.encode('utf-8')),
+                                      sep = FAST_SEP,
+                                      engine = 'c',
+                                      header = None,
+                                      names = header,
+                                      dtype = str,
+                                      quoting = csv.QUOTE_NONE,
+                                      on_bad_lines = 'skip',
+                                      encoding = 'utf-8')
+
+    def iter_chunks(self, chunksize: int = 100_000, as_table: bool = False):
+        """
+            Streaming version of `read_file`: parses and validates
+            `chunksize` lines at a time, so the memory is bounded by the
+            chunk size, and yields the cleaned DataFrames (or
+            `SCRAP_SCHEMA` tables with `as_table`). Chunks without valid
+            rows are not yielded.
+            The file level checks are incremental: if no chunk had a
+            valid name (or price), nothing is yielded and `status` is
+            set as `read_file` does. All the columns are parsed as text
+            (the prices are then cast to float), so every chunk has the
+            same dtypes and the values of `read_file`, except for a numeric `quantity` column: its
+            text is appended to the name as written (`read_file` appends
+            the parsed number, e.g. '12.0' for '12').
+        """
+        if not self._check_file():
+            return
+        header = self._stream_header() if self.fast else None
+        if header is not None:
+            chunks = self._stream_csv_fast(header, chunksize)
+        else:
+            chunks = pd.read_csv(self.file_path,
+                                 sep = self.sep,
+                                 engine = 'python',
+                                 on_bad_lines = 'skip',
+                                 encoding = 'utf-8',
+                                 dtype = str,
+                                 chunksize = chunksize)
+        n_rows = 0
+        for chunk in chunks:
+            df = self._validate(chunk, check_empty = False)
+            if df is None:
+                return
+            if len(df) == 0:
+                continue
+            n_rows += len(df)
+            yield dataframe_to_table(df, SCRAP_SCHEMA) if as_table else df
+        if n_rows == 0 and self._named_rows == 0:
+            self._set_status('invalid_names', f"{self.file_path.name} - has incorrect `name` values.")
+        elif n_rows == 0:
+            self._set_status('invalid_prices', f"{self.file_path.name} - has incorrect `price` values.")
+
+def _read_with_status(file_path: Path, as_table: bool = False,
+                      **reader_kwargs) -> tuple:
+    '''Reads a single file, returning the DataFrame (or table) and its status row'''
+    start  = time.perf_counter()
+    reader = OnlineFileReader(file_path, verbose = False, **reader_kwargs)
+    try:
+        df = reader.read_table() if as_table else reader.read_file()
+    except Exception as e:
+        df = None
+        reader._set_status('error', f'{reader.file_path.name} - ({type(e).__name__}) {e}')
+    if df is not None and len(df) == 0:
+        df = None
+        reader._set_status('empty', f'{reader.file_path.name} - has no valid rows.')
+    status = {'file':            reader.file_path.name,
+              'status':          reader.status,
+              'rows':            0 if df is None else len(df),
+              'missing_columns': ', '.join(reader.missing_columns),
+              'elapsed':         time.perf_counter() - start,
+              'message':         reader.message}
+    return df, status
+
+
+def read_files(file_paths: list, max_workers: int = None,
+               as_table: bool = False, **reader_kwargs) -> tuple:
+    """
+        Reads and validates the web scraping files with a thread pool,
+        so reading a file overlaps with parsing the others (the C parser
+        and the Arrow kernels release the GIL). A file that fails does
+        not stop the others.
+        Returns the concatenated DataFrame, or `SCRAP_SCHEMA` table with
+        `as_table` (`None` if no file is valid), and a report with one
+        row per file: `file`, `status` (see `READ_STATUSES`), `rows`,
+        `missing_columns`, `elapsed` (seconds) and `message`.
+    """
+    file_paths = [Path(f) for f in file_paths]
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        results = list(executor.map(
+                    lambda f: _read_with_status(f, as_table = as_table, **reader_kwargs),
+                    file_paths))
+    report = pd.DataFrame([status for _, status in results],
+                          columns = ['file', 'status', 'rows', 'missing_columns',
+                                     'elapsed', 'message'])
+    frames = [df for df, _ in results if df is not None]
+    if not frames:
+        return None, report
+    if as_table:
+        return pa.concat_tables(frames), report
+    return pd.concat(frames, ignore_index = True), report
+
+
+def read_directory(date_path: Path, max_workers: int = None,
+                   pattern: str = '*.txt', as_table: bool = False,
+                   **reader_kwargs) -> tuple:
+    """
+        Reads all the `pattern` files of a scraping date directory
+        concurrently, see `read_files`.
+    """
+    date_path = Path(date_path)
+    if not date_path.is_dir():
+        print(f'The directory {date_path} does not exist.')
+        return None, None
+    return read_files(sorted(date_path.glob(pattern)), max_workers = max_workers,
+                      as_table = as_table, **reader_kwargs)
@@ -0,0 +1,291 @@
+"""
+    Standalone (single machine) version of the sku matching pipeline.
+
+    Usage:
+        python -m modules.local_matcher MX-2023-10-11.parquet 10-11-23/ \
+            --output matched.parquet
+"""
+import argparse
+import functools
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from modules.file_reader import MktpPricesFileReader, read_directory, dataframe_to_table
+from modules.normalize_text import normalize_text_batch
+from modules.sku_matcher import best_matches, best_matches_pruned, build_features
+from modules.unit_buckets import UnitBuckets
+from modules.match_store import MatchStore, catalog_fingerprint, incremental_best_matches
+from modules.metrics import PipelineMetrics
+from modules.normalization_cache import NormalizationCache
+
+# Same schema as the `matched_skus_webscraping` delta table
+MATCHED_SCHEMA = pa.schema([
+    pa.field("type",                pa.string(), False),
+    pa.field("country",             pa.string(), False),
+    pa.field("locality",            pa.string(), False),
+    pa.field("date",                pa.date32(), False),
+    pa.field("competitor_name",     pa.string()),
+    pa.field("competitor_sku_name", pa.string()),
+    pa.field("competitor_price",    pa.float64()),
+    pa.field("special_price",       pa.float64()),
+    pa.field("competitor_url",      pa.string()),
+    pa.field("gift_or_extra_prod",  pa.string()),
+    pa.field("sku",                 pa.string()),
+    pa.field("confidence",          pa.float64())
+])
+
+# Catalog of each worker process, see `_init_scoring_worker`
+_worker_catalog = None
+
+def _init_scoring_worker(mkp_skus: list, mkp_names: list,
+                         unit_prefilter: bool = False) -> None:
+    '''Builds the catalog features (and unit buckets) once per worker process'''
+    global _worker_catalog
+    mkp_features = build_features(mkp_names)
+    buckets = UnitBuckets(mkp_skus, mkp_features) if unit_prefilter else None
+    _worker_catalog = (mkp_skus, mkp_features, buckets)
+
+def _score_chunk(comp_names: list) -> tuple:
+    mkp_skus, mkp_features, buckets = _worker_catalog
+    pairs = len(mkp_skus) * len(comp_names)
+    if buckets is not None:
+        matches = buckets.best_matches(comp_names, workers = 1)
+        return matches, {'pairs': pairs, 'scored': buckets.n_pairs,
+                         'pruned': pairs - buckets.n_pairs}
+    matches = best_matches(mkp_skus, mkp_features, comp_names, workers = 1)
+    return matches, {'pairs': pairs, 'scored': pairs, 'pruned': 0}
+
+def _score_chunk_pruned(conf_thr: float, comp_names: list) -> tuple:
+    mkp_skus, mkp_features, _ = _worker_catalog
+    return best_matches_pruned(mkp_skus, mkp_features, comp_names, conf_thr = conf_thr)
+
+def _chunks(values: list, chunk_size: int) -> list:
+    return [values[i:i + chunk_size] for i in range(0, len(values), chunk_size)]
+
+
+def normalize_names(names: pd.Series, max_workers: int = None,
+                    chunk_size: int = 2000,
+                    cache: NormalizationCache = None) -> pd.Series:
+    """
+        Normalizes the distinct names across a process pool and maps
+        the results back to `names`. With a `cache`, only the names
+        missing from it are normalized, and then added to it.
+    """
+    uniques = names.drop_duplicates().tolist()
+    mapping = {}
+    if cache is not None:
+        found   = cache.lookup(name for name in uniques if isinstance(name, str))
+        mapping = {name: found[name] for name in uniques
+                   if isinstance(name, str) and name in found}
+        uniques = [name for name in uniques if not (isinstance(name, str) and name in found)]
+    if uniques:
+        with ProcessPoolExecutor(max_workers = max_workers) as executor:
+            norm_chunks = executor.map(normalize_text_batch, _chunks(uniques, chunk_size))
+            normalized  = pd.concat(list(norm_chunks), ignore_index = True)
+        computed = dict(zip(uniques, normalized))
+        if cache is not None:
+            cache.insert({name: norm for name, norm in computed.items()
+                          if isinstance(name, str)})
+        mapping.update(computed)
+    return names.map(mapping)
+
+
+def match_names(mkp_skus: list, mkp_names: list, comp_names: list,
+                max_workers: int = None, chunk_size: int = 512,
+                prune: bool = False, conf_thr: float = None,
+                unit_prefilter: bool = False,
+                metrics: PipelineMetrics = None) -> pd.DataFrame:
+    """
+        Keeps the best catalog sku for each competitor name, scoring
+        chunks of names across a process pool. With `prune`, the pairs
+        that cannot be the best match (or reach `conf_thr`) are skipped,
+        see `best_matches_pruned`, and the names without any match
+        >= `conf_thr` are left out. With `unit_prefilter`, names are only
+        scored against catalog names of a compatible package size, see
+        `UnitBuckets` (not exact: check its `recall_report`).
+        The pairs scored and skipped are added to the `matching` stage
+        of `metrics`.
+    """
+    if prune and unit_prefilter:
+        print('The `prune` and `unit_prefilter` modes cannot be combined.')
+        return None
+    if not comp_names:
+        return best_matches(mkp_skus, mkp_names, [])
+    score_chunk = functools.partial(_score_chunk_pruned, conf_thr) if prune else _score_chunk
+    with ProcessPoolExecutor(max_workers = max_workers,
+                             initializer = _init_scoring_worker,
+                             initargs = (mkp_skus, mkp_names, unit_prefilter)) as executor:
+        matches = list(executor.map(score_chunk, _chunks(comp_names, chunk_size)))
+    matches, stats = zip(*matches)
+    pairs  = sum(s['pairs'] for s in stats)
+    pruned = sum(s['pruned'] for s in stats)
+    if prune:
+        print(f'Pruned {pruned:,} of {pairs:,} pairs '
+              f'({pruned / pairs if pairs else 0:.1%}) without computing Levenshtein.')
+    if metrics is not None:
+        metrics.add('matching', names = len(comp_names), pairs = pairs,
+                    scored = pairs - pruned, pruned = pruned)
+    return pd.concat(matches, ignore_index = True)
+
+
+def run_local_matching(mktp_path: Path, scraping_dir: Path,
+                       country: str = None, conf_thr: float = 0.4,
+                       max_workers: int = None, prune: bool = False,
+                       unit_prefilter: bool = False,
+                       match_store: Path = None,
+                       window_days: int = None,
+                       norm_cache: Path = None,
+                       metrics: PipelineMetrics = None) -> pd.DataFrame:
+    """
+        Matches the web scraping files of `scraping_dir` against the
+        marketplace catalog in `mktp_path`. Keeps the matches with a
+        `confidence` >= `conf_thr`, as the cluster notebook does.
+        `prune` gives the same result skipping the hopeless pairs, and
+        `unit_prefilter` skips the pairs of incompatible package sizes.
+        With a `match_store` (SQLite file), the names already matched
+        against the same catalog are not scored again.
+        With `window_days`, the catalog are the skus priced in the
+        `window_days` days up to the date of `mktp_path` (the files of
+        its directory), named as in their latest file.
+        With a `norm_cache` (SQLite file), the names normalized by
+        previous runs are not normalized again.
+        The counters and wall time of each stage are added to `metrics`.
+    """
+    metrics = PipelineMetrics() if metrics is None else metrics
+    with metrics.stage('read_catalog') as stage:
+        reader = MktpPricesFileReader(mktp_path, country = country, memory_map = True)
+        if window_days is None:
+            df_mkpt_prices = reader.read_file()
+        else:
+            df_mkpt_prices = reader.read_window(window_days)
+        if df_mkpt_prices is None:
+            return None
+        country = df_mkpt_prices['country'].iloc[0] if country is None else country
+        df_mktp_cat = df_mkpt_prices[['country', 'date', 'sku', 'sku_name']]\
+                        .sort_values('date', ascending = False, kind = 'stable')\
+                        .drop_duplicates(subset = ['country', 'sku'])\
+                        .drop(columns = 'date')
+        metrics.country = country
+        stage.update(rows_out = len(df_mkpt_prices), skus = len(df_mktp_cat))
+
+    with metrics.stage('read_scraping') as stage:
+        df_scrap, read_report = read_directory(scraping_dir, max_workers = max_workers)
+        metrics.add_read_report('read_scraping', read_report)
+        if read_report is not None:
+            for row in read_report[read_report['status'] != 'ok'].itertuples():
+                print(f'Skipped {row.file} ({row.status}): {row.message}')
+        if df_scrap is None:
+            print(f'There are no webscraping files to process in {scraping_dir}.')
+            return None
+        df_scrap = df_scrap[df_scrap['country'] == country]
+        metrics.date = df_scrap['date'].max().date().isoformat() if len(df_scrap) else None
+        stage['rows_country'] = len(df_scrap)
+
+    # Text cleaning phase
+    with metrics.stage('normalize') as stage:
+        cache = None if norm_cache is None else NormalizationCache(norm_cache)
+        try:
+            mkp_names  = normalize_names(df_mktp_cat['sku_name'], max_workers = max_workers,
+                                         cache = cache)
+            comp_names = normalize_names(df_scrap['competitor_sku_name'].astype(object),
+                                         max_workers = max_workers, cache = cache)
+        finally:
+            if cache is not None:
+                cache.close()
+                stage.update(cache_hits = cache.hits, cache_misses = cache.misses)
+        df_scrap = df_scrap.assign(comp_sku_name_clean = comp_names)
+        stage.update(rows_in = len(mkp_names) + len(comp_names),
+                     distinct_names = int(comp_names.nunique()),
+                     distinct_catalog_names = int(mkp_names.nunique()))
+
+    # Matching phase
+    with metrics.stage('matching'):
+        mkp_skus = df_mktp_cat['sku'].tolist()
+        match_kwargs = dict(max_workers = max_workers, prune = prune, conf_thr = conf_thr,
+                            unit_prefilter = unit_prefilter, metrics = metrics)
+        if match_store is None:
+            match_df = match_names(mkp_skus, mkp_names.tolist(),
+                                   comp_names.drop_duplicates().tolist(), **match_kwargs)
+        else:
+            # The (inexact) unit prefilter results are stored apart
+            catalog_version = catalog_fingerprint(mkp_skus, mkp_names) + \
+                                (':unit_prefilter' if unit_prefilter else '')
+            with MatchStore(match_store, country, catalog_version) as store:
+                match_df = incremental_best_matches(store, mkp_skus, mkp_names.tolist(),
+                                                    comp_names.drop_duplicates().tolist(),
+                                                    match_fn = match_names, **match_kwargs)
+        if match_df is None:
+            return None
+        metrics.add_confidences(match_df['confidence'])
+
+    with metrics.stage('output') as stage:
+        df_matched = df_scrap.merge(match_df, on = 'comp_sku_name_clean', how = 'left')
+        df_matched = df_matched[df_matched['confidence'] >= conf_thr]\
+                        .drop(columns = 'comp_sku_name_clean')\
+                        .sort_values('confidence', ascending = False, kind = 'stable')\
+                        .reset_index(drop = True)
+        stage.update(rows_in = len(df_scrap), rows_out = len(df_matched))
+    return df_matched
+
+
+def to_arrow_table(df_matched: pd.DataFrame) -> pa.Table:
+    '''Casts the matched DataFrame to the `MATCHED_SCHEMA` schema'''
+    return dataframe_to_table(df_matched, MATCHED_SCHEMA)
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog = 'python -m modules.local_matcher',
+        description = 'Matches web scraping files against the marketplace catalog.')
+    parser.add_argument('mktp_path', type = Path,
+                        help = 'marketplace prices `.parquet` file')
+    parser.add_argument('scraping_dir', type = Path,
+                        help = 'directory with the web scraping `.txt` files')
+    parser.add_argument('-o', '--output', type = Path, default = Path('matched.parquet'),
+                        help = 'output `.parquet` file (default: matched.parquet)')
+    parser.add_argument('--country', default = None,
+                        help = 'country code (default: taken from the file name)')
+    parser.add_argument('--conf-thr', type = float, default = 0.4,
+                        help = 'minimum confidence of the matches (default: 0.4)')
+    parser.add_argument('--max-workers', type = int, default = None,
+                        help = 'number of worker processes (default: all cores)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--prune', action = 'store_true',
+                      help = 'skip the pairs that cannot reach the best match')
+    mode.add_argument('--unit-prefilter', action = 'store_true',
+                      help = 'only score names with compatible package sizes')
+    parser.add_argument('--match-store', type = Path, default = None,
+                        help = 'SQLite file to reuse the matches of previous runs')
+    parser.add_argument('--norm-cache', type = Path, default = None,
+                        help = 'SQLite file to reuse the names normalized by previous runs')
+    parser.add_argument('--metrics', type = Path, default = None,
+                        help = 'JSON Lines file to append the metrics of the run')
+    parser.add_argument('--window-days', type = int, default = None,
+                        help = 'catalog of the skus priced in the previous days '
+                               '(default: only the `mktp_path` file)')
+    args = parser.parse_args(argv)
+
+    metrics = PipelineMetrics()
+    df_matched = run_local_matching(args.mktp_path, args.scraping_dir,
+                                    country = args.country,
+                                    conf_thr = args.conf_thr,
+                                    max_workers = args.max_workers,
+                                    prune = args.prune,
+                                    unit_prefilter = args.unit_prefilter,
+                                    match_store = args.match_store,
+                                    window_days = args.window_days,
+                                    norm_cache = args.norm_cache,
+                                    metrics = metrics)
+    if args.metrics is not None:
+        metrics.emit(args.metrics)
+    if df_matched is None:
+        return 1
+    pq.write_table(to_arrow_table(df_matched), args.output)
+    print(f'{len(df_matched):,} matches saved to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
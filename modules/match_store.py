@@ -0,0 +1,301 @@
+import time
+import hashlib
+import sqlite3
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from collections.abc import Iterable
+from modules.sku_matcher import SkuFeatures, best_matches
+
+def catalog_fingerprint(mkp_skus: Iterable, mkp_names: Iterable) -> str:
+    '''Hash of the (sku, cleaned name) pairs of a catalog, regardless
+    of their order'''
+    sha = hashlib.sha256()
+    names = (name.name if isinstance(name, SkuFeatures) else name for name in mkp_names)
+    for sku, name in sorted(zip(map(str, mkp_skus), names)):
+        sha.update(f'{sku}\x1f{name}\x1e'.encode('utf-8'))
+    return sha.hexdigest()
+
+
+class BloomFilter:
+    """
+        Bit array Bloom filter over strings: `might_contain` never
+        misses an added key, and has a small rate of false positives.
+    """
+    def __init__(self, n_bits: int = 2**23, n_hashes: int = 7,
+                 bits: bytes = None) -> None:
+        self.n_hashes = n_hashes
+        self.bits = np.zeros((n_bits + 7) // 8, dtype = np.uint8) if bits is None \
+                        else np.frombuffer(bits, dtype = np.uint8).copy()
+        self.n_bits = 8 * len(self.bits)
+
+    def _positions(self, keys: list) -> np.ndarray:
+        # Double hashing: h1 + i * h2
+        digests = b''.join(hashlib.blake2b(key.encode('utf-8'), digest_size = 16).digest()
+                           for key in keys)
+        h = np.frombuffer(digests, dtype = np.uint64).reshape(-1, 2)
+        i = np.arange(self.n_hashes, dtype = np.uint64)
+        return (h[:, :1] + i * (h[:, 1:] | np.uint64(1))) % np.uint64(self.n_bits)
+
+    def add(self, keys: Iterable) -> None:
+        keys = list(keys)
+        if keys:
+            pos = self._positions(keys).ravel()
+            np.bitwise_or.at(self.bits, pos // 8, (1 << (pos % 8)).astype(np.uint8))
+
+    def might_contain(self, keys: Iterable) -> np.ndarray:
+        keys = list(keys)
+        if not keys:
+            return np.zeros(0, dtype = bool)
+        pos = self._positions(keys)
+        return ((self.bits[pos // 8] >> (pos % 8)) & 1).astype(bool).all(axis = 1)
+
+    def to_bytes(self) -> bytes:
+        return self.bits.tobytes()
+
+
+class MatchStore:
+    """
+        An on-disk (SQLite) store of the best match of each cleaned
+        competitor name, keyed by (country, name, catalog fingerprint).
+        A Bloom filter of the stored names, saved with them, skips the
+        lookup of the names that were never matched. The catalog of each
+        version is saved too, to rescore only its delta when it changes.
+    """
+    # Max. number of query parameters per statement
+    chunk_size = 500
+
+    def __init__(self, db_path: Path, country: str, catalog_version: str,
+                 n_bits: int = 2**23) -> None:
+        if not isinstance(db_path, Path):
+            db_path = Path(db_path)
+        self.db_path = db_path
+        self.country = country
+        self.catalog_version = catalog_version
+        self.conn    = sqlite3.connect(self.db_path, timeout = 60)
+        with self.conn:
+            self.conn.execute("""
+                create table if not exists best_matches (
+                    country         text not null,
+                    comp_name       text not null,
+                    catalog_version text not null,
+                    sku             text,
+                    confidence      real,
+                    primary key (country, comp_name, catalog_version)
+                ) without rowid""")
+            self.conn.execute("""
+                create table if not exists bloom_filters (
+                    country         text not null,
+                    catalog_version text not null,
+                    bits            blob not null,
+                    primary key (country, catalog_version)
+                )""")
+            self.conn.execute("""
+                create table if not exists catalog_versions (
+                    country         text not null,
+                    catalog_version text not null,
+                    created         real not null,
+                    primary key (country, catalog_version)
+                )""")
+            self.conn.execute("""
+                create table if not exists catalog_snapshots (
+                    country         text not null,
+                    catalog_version text not null,
+                    sku             text not null,
+                    name            text not null,
+                    primary key (country, catalog_version, sku, name)
+                ) without rowid""")
+        row = self.conn.execute(
+                "select bits from bloom_filters where country = ? and catalog_version = ?",
+                (self.country, self.catalog_version)).fetchone()
+        self.bloom = BloomFilter(n_bits = n_bits, bits = None if row is None else row[0])
+
+    def lookup(self, comp_names: Iterable) -> pd.DataFrame:
+        """
+            Returns the stored matches of the given names (those that
+            pass the Bloom filter and are found in the store).
+        """
+        comp_names = list(dict.fromkeys(comp_names))
+        comp_names = [name for name, maybe in
+                      zip(comp_names, self.bloom.might_contain(comp_names)) if maybe]
+        found = []
+        for i in range(0, len(comp_names), self.chunk_size):
+            chunk = comp_names[i:i + self.chunk_size]
+            query = f"""
+                select comp_name, sku, confidence from best_matches
+                where country = ? and catalog_version = ?
+                  and comp_name in ({','.join('?' * len(chunk))})"""
+            found += self.conn.execute(query, [self.country, self.catalog_version] + chunk)
+        matches = pd.DataFrame(found, columns = ['comp_sku_name_clean', 'sku', 'confidence'])
+        return matches.astype({'comp_sku_name_clean': object, 'sku': object,
+                               'confidence': np.float64})
+
+    def insert(self, matches: pd.DataFrame) -> None:
+        """
+            Inserts the best matches (`comp_sku_name_clean`, `sku`,
+            `confidence`) into the store.
+        """
+        rows = [(self.country, name, self.catalog_version, sku,
+                 None if pd.isna(conf) else float(conf))
+                for name, sku, conf in zip(matches['comp_sku_name_clean'],
+                                           matches['sku'], matches['confidence'])]
+        self.bloom.add(matches['comp_sku_name_clean'])
+        with self.conn:
+            self.conn.executemany(
+                "insert or replace into best_matches values (?, ?, ?, ?, ?)", rows)
+            self.conn.execute(
+                "insert or replace into bloom_filters values (?, ?, ?)",
+                (self.country, self.catalog_version, self.bloom.to_bytes()))
+
+    def stored_matches(self, catalog_version: str = None) -> pd.DataFrame:
+        """
+            Returns every stored match of a catalog version (default:
+            the current one).
+        """
+        query = """
+            select comp_name, sku, confidence from best_matches
+            where country = ? and catalog_version = ?"""
+        matches = pd.DataFrame(
+                self.conn.execute(query, (self.country,
+                                          catalog_version or self.catalog_version)),
+                columns = ['comp_sku_name_clean', 'sku', 'confidence'])
+        return matches.astype({'comp_sku_name_clean': object, 'sku': object,
+                               'confidence': np.float64})
+
+    def save_catalog(self, mkp_skus: Iterable, mkp_names: Iterable) -> None:
+        """
+            Saves the (sku, cleaned name) pairs of the current catalog
+            version, unless they are already saved.
+        """
+        query = "select 1 from catalog_versions where country = ? and catalog_version = ?"
+        if self.conn.execute(query, (self.country, self.catalog_version)).fetchone():
+            return
+        names = (name.name if isinstance(name, SkuFeatures) else name for name in mkp_names)
+        with self.conn:
+            self.conn.executemany(
+                "insert or ignore into catalog_snapshots values (?, ?, ?, ?)",
+                ((self.country, self.catalog_version, str(sku), name)
+                 for sku, name in zip(mkp_skus, names)))
+            self.conn.execute("insert into catalog_versions values (?, ?, ?)",
+                              (self.country, self.catalog_version, time.time()))
+
+    def load_catalog(self, catalog_version: str) -> tuple:
+        '''Returns the skus and cleaned names of a saved catalog version'''
+        rows = self.conn.execute(
+                "select sku, name from catalog_snapshots where country = ? and catalog_version = ?",
+                (self.country, catalog_version)).fetchall()
+        return [sku for sku, _ in rows], [name for _, name in rows]
+
+    def previous_version(self) -> str:
+        """
+            Returns the latest saved catalog version other than the
+            current one (and of the same matching mode, i.e., the same
+            suffix after the fingerprint), or None.
+        """
+        mode = self.catalog_version.partition(':')[2]
+        query = """
+            select catalog_version from catalog_versions
+            where country = ? and catalog_version != ?
+            order by created desc"""
+        for (version, ) in self.conn.execute(query, (self.country, self.catalog_version)):
+            if version.partition(':')[2] == mode:
+                return version
+        return None
+
+    def __len__(self) -> int:
+        query = "select count(*) from best_matches where country = ? and catalog_version = ?"
+        return self.conn.execute(query, (self.country, self.catalog_version)).fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def delta_best_matches(store: MatchStore, previous_version: str, mkp_skus: Iterable,
+                       mkp_names: Iterable, match_fn = best_matches,
+                       **kwargs) -> pd.DataFrame:
+    """
+        Updates the stored matches of `previous_version` to the current
+        catalog (`mkp_skus`, `mkp_names`) of the store, with the same
+        result as a full rematch of the stored names:
+        - names whose best sku is still in the catalog are only scored
+          against the added (or renamed) skus, and keep the best of both
+          (ties: lowest `sku`);
+        - names whose best sku was removed are scored again in full.
+        Skus are compared as strings. The matches are added to the store.
+    """
+    mkp_skus  = [str(sku) for sku in mkp_skus]
+    mkp_names = list(mkp_names)
+    new_pairs = list(zip(mkp_skus, (name.name if isinstance(name, SkuFeatures) else name
+                                    for name in mkp_names)))
+    old_pairs = set(zip(*store.load_catalog(previous_version)))
+    added     = [i for i, pair in enumerate(new_pairs) if pair not in old_pairs]
+    removed   = {sku for sku, _ in old_pairs - set(new_pairs)}
+
+    stored = store.stored_matches(previous_version)
+    lost   = stored['sku'].isna() | stored['sku'].isin(removed)
+    kept   = stored[~lost].reset_index(drop = True)
+    matches = [kept]
+    if lost.any():
+        matches.append(match_fn(mkp_skus, mkp_names,
+                                stored.loc[lost, 'comp_sku_name_clean'].tolist(), **kwargs))
+    if added and len(kept) > 0:
+        challengers = match_fn([mkp_skus[i] for i in added], [mkp_names[i] for i in added],
+                               kept['comp_sku_name_clean'].tolist(), **kwargs)
+        merged = kept.merge(challengers, on = 'comp_sku_name_clean', how = 'left',
+                            suffixes = ('', '_added'))
+        found  = merged['confidence_added'].notna()
+        better = found & ((merged['confidence_added'] > merged['confidence']) |
+                          ((merged['confidence_added'] == merged['confidence']) &
+                           (merged['sku_added'].where(found, merged['sku']) < merged['sku'])))
+        kept.loc[better, ['sku', 'confidence']] = \
+            merged.loc[better, ['sku_added', 'confidence_added']].to_numpy()
+    print(f'Catalog delta: {len(added):,} skus added, {len(removed):,} removed; '
+          f'{len(kept):,} names merged, {int(lost.sum()):,} rescored in full.')
+    if any(m is None for m in matches):
+        return None
+    matches = pd.concat(matches, ignore_index = True)\
+                .astype({'confidence': np.float64})
+    store.insert(matches)
+    return matches
+
+
+def incremental_best_matches(store: MatchStore, mkp_skus: Iterable, mkp_names: Iterable,
+                             comp_names: Iterable, match_fn = best_matches,
+                             delta: bool = True, **kwargs) -> pd.DataFrame:
+    """
+        Reuses the stored best matches of the names already seen with
+        this catalog and only scores the new ones with `match_fn`
+        (`best_matches` or a function with its signature and output).
+        With `delta`, the matches of the previous catalog version are
+        first carried over with `delta_best_matches`.
+        The new matches and the catalog are added to the store.
+    """
+    mkp_skus   = list(mkp_skus)
+    mkp_names  = list(mkp_names)
+    previous_version = store.previous_version() if delta and len(store) == 0 else None
+    if previous_version is not None:
+        if delta_best_matches(store, previous_version, mkp_skus, mkp_names,
+                              match_fn = match_fn, **kwargs) is None:
+            return None
+    store.save_catalog(mkp_skus, mkp_names)
+    comp_names = list(dict.fromkeys(comp_names))
+    stored = store.lookup(comp_names)
+    seen   = set(stored['comp_sku_name_clean'])
+    new_names = [name for name in comp_names if name not in seen]
+    print(f'{len(seen):,} names reused from the match store, {len(new_names):,} new.')
+    new_matches = match_fn(mkp_skus, mkp_names, new_names, **kwargs) if new_names \
+                    else stored.iloc[:0]
+    if new_matches is None:
+        return None
+    if new_names:
+        store.insert(new_matches)
+    matches = pd.concat([stored, new_matches], ignore_index = True)
+    order = {name: i for i, name in enumerate(comp_names)}
+    return matches.sort_values('comp_sku_name_clean', key = lambda s: s.map(order),
+                               ignore_index = True)
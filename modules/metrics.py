@@ -0,0 +1,114 @@
+"""
+    Stage level metrics of a matching run (rows in/out, files skipped,
+    distinct names, pairs scored and pruned, wall time, confidence
+    histogram), emitted as one JSON record per (country, date).
+
+    Usage:
+        metrics = PipelineMetrics(country = 'MX', date = '2023-11-10')
+        with metrics.stage('normalize') as stage:
+            ...
+            stage['distinct_names'] = len(uniques)
+        metrics.emit('metrics.jsonl')
+"""
+import json
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+from contextlib import contextmanager
+from collections.abc import Iterable
+
+# Edges of the confidence histogram
+CONFIDENCE_BINS = np.linspace(0, 1, 11)
+
+def confidence_histogram(confidences: Iterable, bins: np.ndarray = CONFIDENCE_BINS) -> np.ndarray:
+    '''Counts of the (not null) confidences in each bin'''
+    confidences = np.asarray(confidences, dtype = np.float64)
+    return np.histogram(confidences[~np.isnan(confidences)], bins = bins)[0]
+
+
+class PipelineMetrics:
+    """
+        Collects the counters of each stage of a run. Numeric counters
+        added more than once are summed, so a stage can be reported
+        chunk by chunk.
+    """
+    def __init__(self, country: str = None, date: str = None) -> None:
+        self.country = country
+        self.date    = date
+        self.stages  = {}
+        self.histogram = np.zeros(len(CONFIDENCE_BINS) - 1, dtype = np.int64)
+
+    @contextmanager
+    def stage(self, name: str):
+        '''Times the block as the `seconds` of the stage `name` and
+        yields its counters'''
+        counters = self.stages.setdefault(name, {})
+        start = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            counters['seconds'] = counters.get('seconds', 0.0) + time.perf_counter() - start
+
+    def add(self, name: str, **counters) -> None:
+        stage = self.stages.setdefault(name, {})
+        for key, value in counters.items():
+            if isinstance(value, (int, float, np.number)) and not isinstance(value, bool) \
+                    and isinstance(stage.get(key), (int, float, np.number)):
+                stage[key] += value
+            else:
+                stage[key] = value
+
+    def add_read_report(self, name: str, report: pd.DataFrame) -> None:
+        '''Counters of a `file_reader.read_files` report'''
+        if report is None:
+            return
+        skipped = report[report['status'] != 'ok']
+        self.add(name,
+                 files         = len(report),
+                 files_skipped = len(skipped),
+                 skipped       = skipped.groupby('status').size().to_dict(),
+                 rows_out      = int(report['rows'].sum()),
+                 rows_by_file  = dict(zip(report['file'], report['rows'].astype(int))),
+                 slowest_file_seconds = float(report['elapsed'].max()) if len(report) else 0.0)
+
+    def add_confidences(self, confidences: Iterable) -> None:
+        self.histogram += confidence_histogram(confidences)
+
+    def add_accumulators(self, name: str, accumulators: dict) -> None:
+        '''Reads Spark accumulators (see `spark_udfs.scoring_accumulators`),
+        after the action that computed the stage'''
+        for key, accumulator in accumulators.items():
+            if key == 'confidence_histogram':
+                self.histogram += np.asarray(accumulator.value, dtype = np.int64)
+            else:
+                self.add(name, **{key: accumulator.value})
+
+    def to_dict(self) -> dict:
+        def to_python(value):
+            if isinstance(value, dict):
+                return {str(k): to_python(v) for k, v in value.items()}
+            return value.item() if isinstance(value, np.generic) else value
+        return {'country': self.country,
+                'date':    None if self.date is None else str(self.date),
+                'run_at':  datetime.now().isoformat(timespec = 'seconds'),
+                'stages':  to_python(self.stages),
+                'confidence_histogram': {'bins':   CONFIDENCE_BINS.round(2).tolist(),
+                                         'counts': self.histogram.tolist()}}
+
+    def emit(self, path: Path) -> dict:
+        '''Appends the record of the run to a JSON Lines file'''
+        record = self.to_dict()
+        Path(path).parent.mkdir(parents = True, exist_ok = True)
+        with open(path, 'a', encoding = 'utf-8') as file:
+            file.write(json.dumps(record) + '\n')
+        return record
+
+
+def read_metrics(path: Path) -> pd.DataFrame:
+    '''Loads the emitted records, one row per run, with the stage
+    counters flattened as `stage.counter` columns'''
+    with open(path, 'r', encoding = 'utf-8') as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    return pd.json_normalize(records, max_level = 2)
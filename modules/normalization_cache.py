@@ -0,0 +1,95 @@
+import hashlib
+import sqlite3
+from pathlib import Path
+from collections.abc import Iterable
+
+MODULES_PATH = Path(__file__).parent
+RULES_FILES  = [MODULES_PATH / 'normalize_text.py', MODULES_PATH / 'dictionary']
+
+def rules_version(paths: Iterable = RULES_FILES) -> str:
+    '''Computes a hash of the normalization rules, i.e., the
+    `normalize_text` module and every file inside `dictionary/`'''
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files += sorted(f for f in path.rglob('*') if f.is_file())
+        else:
+            files.append(path)
+    sha = hashlib.sha256()
+    for f in files:
+        sha.update(f.name.encode('utf-8'))
+        sha.update(f.read_bytes())
+    return sha.hexdigest()
+
+
+class NormalizationCache:
+    """
+        An on-disk (SQLite) cache mapping raw sku names to their
+        `normalize_text` output. Entries are keyed by the version of
+        the normalization rules, so any change to the rules or the
+        stopwords file invalidates the previous entries.
+    """
+    # Max. number of query parameters per statement
+    chunk_size = 500
+
+    def __init__(self, db_path: Path, version: str = None) -> None:
+        if not isinstance(db_path, Path):
+            db_path = Path(db_path)
+        if version is None:
+            version = rules_version()
+        self.db_path = db_path
+        self.version = version
+        # Distinct texts found (or not) by `lookup`
+        self.hits    = 0
+        self.misses  = 0
+        self.conn    = sqlite3.connect(self.db_path, timeout = 60)
+        self.conn.execute("""
+            create table if not exists normalized_text (
+                raw        text not null,
+                version    text not null,
+                normalized text not null,
+                primary key (raw, version)
+            ) without rowid""")
+        # Drop the entries of previous rule-set versions
+        with self.conn:
+            self.conn.execute("delete from normalized_text where version != ?",
+                              (self.version, ))
+
+    def lookup(self, texts: Iterable) -> dict:
+        """
+            Returns a `{raw: normalized}` dictionary with the
+            given texts that are already in the cache.
+        """
+        texts = list(dict.fromkeys(texts))
+        found = {}
+        for i in range(0, len(texts), self.chunk_size):
+            chunk = texts[i:i + self.chunk_size]
+            query = f"""
+                select raw, normalized from normalized_text
+                where version = ? and raw in ({','.join('?' * len(chunk))})"""
+            found.update(self.conn.execute(query, [self.version] + chunk))
+        self.hits   += len(found)
+        self.misses += len(texts) - len(found)
+        return found
+
+    def insert(self, normalized: dict) -> None:
+        """
+            Inserts a `{raw: normalized}` dictionary into the cache.
+        """
+        with self.conn:
+            self.conn.executemany(
+                "insert or replace into normalized_text values (?, ?, ?)",
+                ((raw, self.version, norm) for raw, norm in normalized.items()))
+
+    def __len__(self) -> int:
+        query = "select count(*) from normalized_text where version = ?"
+        return self.conn.execute(query, (self.version, )).fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,198 @@
+"""
+    Opt-in profiling of the `normalize_text` pipeline: cumulative time
+    and hits (calls that changed the string) of each stage and of each
+    substitution rule.
+
+    Usage:
+        with profile_rules() as profiler:
+            normalize_text_batch(names)
+        profiler.report()          # sorted by time
+        profiler.export('rules.csv')
+
+    or, for a whole process, `NORMALIZE_TEXT_PROFILE=rules.csv` (or
+    `=1` to print the report) before importing `normalize_text`.
+
+    While disabled nothing is patched, so it costs nothing: enabling it
+    swaps the `apply_rules` and stage functions of the `normalize_text`
+    module for timed versions, and disabling it restores them.
+    `normalize_text` itself is not swapped (callers that imported it
+    would be missed): its row is measured from its first to its last
+    stage.
+"""
+import os
+import time
+import atexit
+import threading
+import functools
+import multiprocessing.util
+import pandas as pd
+from pathlib import Path
+from contextlib import contextmanager
+import modules.normalize_text as nt
+
+ENV_VAR = 'NORMALIZE_TEXT_PROFILE'
+# Stages chained by `normalize_text` (and itself)
+STAGES = ['normalize_text', 'remove_special_characters', 'remove_accents',
+          'homogenize_units', 'mil_units_simplification', 'remove_es_stopwords',
+          'abbreviations_correction', 'remove_duplicated_tokens',
+          'homogenize_color_weight', 'homogenize_adjectives']
+# The patched ones, in the order `normalize_text` runs them
+PIPELINE = STAGES[1:]
+REPORT_COLUMNS = ['kind', 'name', 'pattern', 'calls', 'skipped', 'hits', 'time']
+
+
+class RuleProfiler:
+    """
+        Counters of the `normalize_text` stages and rules. A rule is
+        `skipped` when its required literal is absent (it cannot match),
+        `calls` counts the substitutions actually run.
+    """
+    def __init__(self) -> None:
+        # Name of each rule table (`*_RULES` lists of the module)
+        self.tables = {id(value): name for name, value in vars(nt).items()
+                       if name.endswith('_RULES') and isinstance(value, list)}
+        self.stages = {}
+        self.rules  = {}
+        self._originals = None
+        # (start, input) of the `normalize_text` call running in each thread
+        self._local = threading.local()
+
+    @property
+    def enabled(self) -> bool:
+        return self._originals is not None
+
+    def _apply_rules(self, text: str, rules) -> str:
+        '''Timed version of `normalize_text.apply_rules`'''
+        table = self.tables.get(id(rules), 'rules')
+        for i, (pattern, repl, count, literal) in enumerate(rules):
+            stats = self.rules.get((table, i))
+            if stats is None:
+                stats = self.rules[(table, i)] = {'pattern': pattern.pattern, 'calls': 0,
+                                                  'skipped': 0, 'hits': 0, 'time': 0.0}
+            if literal not in text:
+                stats['skipped'] += 1
+                continue
+            start = time.perf_counter()
+            new_text = pattern.sub(repl, text, count)
+            stats['time']  += time.perf_counter() - start
+            stats['calls'] += 1
+            stats['hits']  += new_text != text
+            text = new_text
+        return text
+
+    def _timed_stage(self, name: str, func):
+        stats = self.stages.setdefault(name, {'calls': 0, 'hits': 0, 'time': 0.0})
+        total = self.stages['normalize_text']
+        first, last = name == PIPELINE[0], name == PIPELINE[-1]
+        local = self._local
+        def stage(text, *args, **kwargs):
+            start = time.perf_counter()
+            if first:
+                local.entry = (start, text)
+            result = func(text, *args, **kwargs)
+            end = time.perf_counter()
+            stats['time']  += end - start
+            stats['calls'] += 1
+            stats['hits']  += result != text
+            entry = getattr(local, 'entry', None) if last else None
+            if entry is not None:
+                # A whole `normalize_text` run (hits: after lower casing)
+                local.entry = None
+                total['time']  += end - entry[0]
+                total['calls'] += 1
+                total['hits']  += result != entry[1]
+            return result
+        return stage
+
+    def enable(self) -> None:
+        if self.enabled:
+            return
+        self._originals = {name: getattr(nt, name) for name in ['apply_rules'] + PIPELINE}
+        nt.apply_rules = self._apply_rules
+        self.stages.setdefault('normalize_text', {'calls': 0, 'hits': 0, 'time': 0.0})
+        for name in PIPELINE:
+            setattr(nt, name, self._timed_stage(name, self._originals[name]))
+
+    def disable(self) -> None:
+        if not self.enabled:
+            return
+        for name, func in self._originals.items():
+            setattr(nt, name, func)
+        self._originals = None
+
+    def reset(self) -> None:
+        # The stage counters are shared with the enabled stage functions
+        for stats in self.stages.values():
+            stats.update(calls = 0, hits = 0, time = 0.0)
+        self.rules.clear()
+
+    def report(self, sort_by: str = 'time') -> pd.DataFrame:
+        """
+            One row per stage and per rule (`TABLE[i]`), sorted by
+            `sort_by` (descending). Rules with 0 `hits` never changed
+            a string.
+        """
+        rows  = [{'kind': 'stage', 'name': name, 'pattern': '', 'skipped': 0, **stats}
+                 for name, stats in self.stages.items()]
+        rows += [{'kind': 'rule', 'name': f'{table}[{i}]', **stats}
+                 for (table, i), stats in self.rules.items()]
+        return pd.DataFrame(rows, columns = REPORT_COLUMNS)\
+                 .sort_values(sort_by, ascending = False, kind = 'stable')\
+                 .reset_index(drop = True)
+
+    def export(self, path: Path, sort_by: str = 'time') -> Path:
+        '''Writes the report as `.json` (records) or `.csv`'''
+        path   = Path(path)
+        report = self.report(sort_by = sort_by)
+        if path.suffix == '.json':
+            report.to_json(path, orient = 'records', indent = 2)
+        else:
+            report.to_csv(path, index = False)
+        return path
+
+
+@contextmanager
+def profile_rules(profiler: RuleProfiler = None):
+    '''Profiles the `normalize_text` calls made inside the block'''
+    profiler = RuleProfiler() if profiler is None else profiler
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+
+
+def _report_at_exit(profiler: RuleProfiler, target: str) -> None:
+    profiler.disable()
+    # e.g. the parent of the processes that normalized the names
+    if not any(stats['calls'] for stats in profiler.stages.values()):
+        return
+    if target.lower() in ('1', 'true', 'yes'):
+        print(profiler.report().to_string(index = False))
+    else:
+        profiler.export(target.replace('{pid}', str(os.getpid())))
+
+
+def _report_in_child(target: str, profiler: RuleProfiler) -> None:
+    '''Forked workers (e.g. of a process pool) skip `atexit`: their own
+    counters are reported by a multiprocessing finalizer'''
+    profiler.reset()
+    multiprocessing.util.Finalize(profiler, _report_at_exit, args = (profiler, target),
+                                  exitpriority = 10)
+
+
+def enable_from_env() -> RuleProfiler:
+    """
+        Profiles the whole process when `NORMALIZE_TEXT_PROFILE` is set:
+        the report is printed at exit (`1`) or written to the given
+        `.csv`/`.json` path. Worker processes report their own calls, so
+        use `{pid}` in the path (replaced by the process id).
+    """
+    target = os.environ.get(ENV_VAR, '')
+    if not target:
+        return None
+    profiler = RuleProfiler()
+    profiler.enable()
+    atexit.register(_report_at_exit, profiler, target)
+    multiprocessing.util.register_after_fork(profiler, functools.partial(_report_in_child, target))
+    return profiler
@@ -1,11 +1,18 @@
-
 import math
 import numpy as np
-from modules.distance_metrics import levenshtein_and_dice_ratio, jaccard_distance_units
+import pandas as pd
+from collections.abc import Iterable
+from fuzzywuzzy import fuzz, utils
+from rapidfuzz import process, fuzz as rf_fuzz
+from modules.normalize_text import extract_units, extract_brand, UNKNOWN_BRAND
+from modules.distance_metrics import levenshtein_and_dice_ratio, jaccard_distance_units, \
+    remove_units, dice_sorensen_dist_sets, lev_dice_mean, jaccard_distance_unit_sets, \
+    unit_sets, dice_sorensen_dist_matrix, jaccard_distance_units_matrix, lev_dice_mean_array, \
+    levenshtein_ratio_upper_bound
 
 # TEST: Combine Jaccard with Lev-Dice distances
 def sku_name_conf(a, b) -> float:
-    '''Ponderates Levenshtein-Dice distance with 
+    '''Ponderates Levenshtein-Dice distance with
     Jaccard distances for unit matching'''
     lvd_conf = 1 - levenshtein_and_dice_ratio(a, b)
     jac_dist_units = jaccard_distance_units(a, b)
@@ -32,3 +39,284 @@ def get_confidence(a: str, b: str) -> float:
     conf = exp_matching_value(conf, decay = 1.01)
     return round(conf, 4)
 
+
+def sku_name_conf_array(lvd_dist: np.ndarray,
+                        jac_dist_units: np.ndarray) -> np.ndarray:
+    '''Vectorized `sku_name_conf` from arrays of Levenshtein-Dice
+    distances and Jaccard distances of the units'''
+    lvd_conf = 1 - np.asarray(lvd_dist, dtype = np.float64)
+    # Apply a ReLU
+    pond_conf = np.maximum(0, (lvd_conf) - (np.asarray(jac_dist_units) * 0.17))
+    return pond_conf
+
+
+def exp_matching_value_array(x: np.ndarray, decay: float = 1.02) -> np.ndarray:
+    """
+    Vectorized `exp_matching_value`. NumPy's exp/pow may differ from
+    `math` in the last bit of the result.
+    """
+    x = np.asarray(x, dtype = np.float64)
+    with np.errstate(divide = 'ignore'):
+        return np.where(x == 0, x, np.exp(1 - (1 / x**decay)))
+
+
+def round_array(x: np.ndarray, ndigits: int = 4) -> np.ndarray:
+    """
+    Vectorized `round(x, ndigits)`. Values next to a rounding boundary
+    are rounded with the built-in `round` to keep its exact behavior.
+    """
+    x = np.asarray(x, dtype = np.float64)
+    scale   = 10.0 ** ndigits
+    scaled  = x * scale
+    rounded = np.rint(scaled) / scale
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for idx in zip(*np.nonzero(near_half)):
+        rounded[idx] = round(float(x[idx]), ndigits)
+    return rounded
+
+
+def get_confidence_array(lvd_dist: np.ndarray,
+                         jac_dist_units: np.ndarray) -> np.ndarray:
+    """
+    Vectorized `get_confidence` from arrays of Levenshtein-Dice distances
+    and Jaccard distances of the units. The result equals the scalar
+    function: values whose last bit could change their rounding are
+    recomputed with `exp_matching_value`.
+    """
+    pond_conf = sku_name_conf_array(lvd_dist, jac_dist_units)
+    conf = exp_matching_value_array(pond_conf, decay = 1.01)
+    scaled = conf * 1e4
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for idx in zip(*np.nonzero(near_half)):
+        conf[idx] = exp_matching_value(float(pond_conf[idx]), decay = 1.01)
+    return round_array(conf, 4)
+
+
+class SkuFeatures:
+    """
+        Precomputed features of a cleaned sku name, i.e., everything
+        `get_confidence` derives from a single side of the pair.
+    """
+    __slots__ = ('name', 'text', 'sorted_text', 'char_set',
+                 'units', 'unit_set', 'split_unit_set')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        # Name without units (Levenshtein and Sorensen-Dice terms)
+        self.text = remove_units(name)
+        # Tokens sorted as `fuzz.token_sort_ratio` does
+        tokens = utils.full_process(self.text, force_ascii = True).split()
+        self.sorted_text = ' '.join(sorted(tokens)).strip()
+        # Sorensen-Dice is computed over characters (qval = 1)
+        self.char_set = frozenset(self.text)
+        # Units and, when there is a single one, its digit split
+        self.units = tuple(extract_units(name))
+        self.unit_set, self.split_unit_set = unit_sets(name)
+
+    def __repr__(self) -> str:
+        return f'SkuFeatures({self.name!r})'
+
+
+def build_features(names: Iterable) -> list:
+    """
+    Computes the `SkuFeatures` of each cleaned sku name.
+    """
+    return [SkuFeatures(name) for name in names]
+
+
+def get_confidence_features(fa: SkuFeatures, fb: SkuFeatures) -> float:
+    """
+    Calculate the confidence score between two precomputed SKU features.
+    Returns the same value as `get_confidence(fa.name, fb.name)`.
+    """
+    # Levenshtein-Dice distance
+    dist_lev  = (100 - fuzz.ratio(fa.sorted_text, fb.sorted_text)) * 0.01
+    dist_dice = dice_sorensen_dist_sets(fa.text, fb.text,
+                                        fa.char_set, fb.char_set)
+    lvd_conf  = 1 - lev_dice_mean(dist_lev, dist_dice)
+    # Jaccard distance of the units
+    if fa.split_unit_set is not None and fb.split_unit_set is not None:
+        jac_dist_units = jaccard_distance_unit_sets(fa.split_unit_set,
+                                                    fb.split_unit_set)
+    else:
+        jac_dist_units = jaccard_distance_unit_sets(fa.unit_set, fb.unit_set)
+    # Apply a ReLU
+    pond_conf = max(0, (lvd_conf) - (jac_dist_units * 0.17))
+    conf = exp_matching_value(pond_conf, decay = 1.01)
+    return round(conf, 4)
+
+
+def _as_features(names: Iterable) -> list:
+    '''Builds the `SkuFeatures` of the names that are not already built'''
+    return [name if isinstance(name, SkuFeatures) else SkuFeatures(name)
+            for name in names]
+
+def _levenshtein_dist_matrix(sorted_a: list, sorted_b: list,
+                             workers: int = -1) -> np.ndarray:
+    '''(a x b) matrix of `fuzz.token_sort_ratio` distances between
+    names whose tokens are already sorted'''
+    ratio = process.cdist(sorted_a, sorted_b, scorer = rf_fuzz.ratio,
+                          processor = None, dtype = np.float64,
+                          workers = workers)
+    ratio = np.rint(ratio)
+    # fuzzywuzzy: equal strings -> 100, a single empty string -> 0
+    empty_a = np.array([not s for s in sorted_a], dtype = bool)[:, None]
+    empty_b = np.array([not s for s in sorted_b], dtype = bool)[None, :]
+    ratio[empty_a & empty_b] = 100
+    ratio[empty_a ^ empty_b] = 0
+    return (100 - ratio) * 0.01
+
+def score_matrix(mkp_names: Iterable, comp_names: Iterable,
+                 workers: int = -1) -> np.ndarray:
+    """
+    Calculate the (mkp x comp) matrix of confidence scores. Reproduces
+    `get_confidence` for every pair. The Levenshtein ratios are computed by
+    `rapidfuzz.process.cdist`, which releases the GIL and uses `workers`
+    threads (-1: all cores). Names may be given as `SkuFeatures`.
+    """
+    fa = _as_features(mkp_names)
+    fb = _as_features(comp_names)
+    # Levenshtein distance over the sorted tokens (`fuzz.token_sort_ratio`)
+    dist_lev = _levenshtein_dist_matrix([f.sorted_text for f in fa],
+                                        [f.sorted_text for f in fb],
+                                        workers = workers)
+    # Sorensen-Dice distance over the characters
+    dist_dice = dice_sorensen_dist_matrix([f.char_set for f in fa],
+                                          [f.char_set for f in fb])
+    # Weighted Levenshtein-Dice distance (`lev_dice_mean`)
+    lvd_dist = lev_dice_mean_array(dist_lev, dist_dice)
+    # Jaccard distance of the units, split by digits for single units
+    jac_dist_units = jaccard_distance_units_matrix(
+                            [(f.unit_set, f.split_unit_set) for f in fa],
+                            [(f.unit_set, f.split_unit_set) for f in fb])
+    return get_confidence_array(lvd_dist, jac_dist_units)
+
+
+def best_matches(mkp_skus: Iterable, mkp_names: Iterable, comp_names: Iterable,
+                 chunk_size: int = 512, workers: int = -1) -> pd.DataFrame:
+    """
+    Keeps the best marketplace sku for each competitor name. Ties are
+    broken deterministically by the lowest `sku`. Competitor names are
+    scored in chunks of `chunk_size` to bound the size of each matrix.
+    Marketplace names may be given as `SkuFeatures`.
+    Returns the columns `comp_sku_name_clean`, `sku` and `confidence`.
+    """
+    catalog = pd.DataFrame({'sku': list(mkp_skus), 'name': list(mkp_names)})
+    catalog = catalog.sort_values('sku', kind = 'stable', ignore_index = True)
+    comp_names = list(comp_names) if len(catalog) > 0 else []
+    mkp_features = _as_features(catalog['name'])
+    best_idx  = np.zeros(len(comp_names), dtype = np.int64)
+    best_conf = np.zeros(len(comp_names), dtype = np.float64)
+    for start in range(0, len(comp_names), chunk_size):
+        chunk = comp_names[start:start + chunk_size]
+        conf  = score_matrix(mkp_features, chunk, workers = workers)
+        # `argmax` returns the first (lowest sku) of the tied maxima
+        idx = conf.argmax(axis = 0)
+        best_idx[start:start + len(chunk)]  = idx
+        best_conf[start:start + len(chunk)] = conf[idx, np.arange(len(chunk))]
+    return pd.DataFrame({
+        'comp_sku_name_clean': pd.Series(comp_names, dtype = object),
+        'sku':        pd.Series(catalog['sku'].to_numpy()[best_idx], dtype = object),
+        'confidence': best_conf})
+
+
+def best_matches_pruned(mkp_skus: Iterable, mkp_names: Iterable,
+                        comp_names: Iterable, conf_thr: float = None,
+                        chunk_size: int = 512, block_size: int = 16) -> tuple:
+    """
+    Branch-and-bound version of `best_matches`. The Sorensen-Dice and
+    Jaccard terms are cheap and computed for every pair; the Levenshtein
+    term is replaced by an upper bound of its ratio, which gives an upper
+    bound of the confidence. The candidates of each name are evaluated
+    in blocks of `block_size`, highest bound first, and the Levenshtein
+    ratio is skipped for the pairs whose bound can neither beat (nor tie
+    with a lower `sku`) the current best match, nor reach `conf_thr`.
+
+    With `conf_thr = None` the result equals `best_matches`. Otherwise the
+    names whose best confidence is below `conf_thr` are left out, and the
+    result equals `best_matches(...)` filtered by `confidence >= conf_thr`.
+    Returns the matches and a dictionary with the number of `pairs`,
+    `scored` pairs and `pruned` pairs.
+    """
+    catalog = pd.DataFrame({'sku': list(mkp_skus), 'name': list(mkp_names)})
+    catalog = catalog.sort_values('sku', kind = 'stable', ignore_index = True)
+    comp_names = list(comp_names) if len(catalog) > 0 else []
+    mkp_features = _as_features(catalog['name'])
+    mkp_sorted   = [f.sorted_text for f in mkp_features]
+    mkp_chars    = [f.char_set for f in mkp_features]
+    mkp_units    = [(f.unit_set, f.split_unit_set) for f in mkp_features]
+    min_conf = -np.inf if conf_thr is None else conf_thr
+
+    best_idx  = np.full(len(comp_names), -1, dtype = np.int64)
+    best_conf = np.full(len(comp_names), np.nan, dtype = np.float64)
+    stats = {'pairs': len(catalog) * len(comp_names), 'scored': 0, 'pruned': 0}
+    for start in range(0, len(comp_names), chunk_size):
+        fb = _as_features(comp_names[start:start + chunk_size])
+        comp_sorted = [f.sorted_text for f in fb]
+        dist_dice = dice_sorensen_dist_matrix(mkp_chars, [f.char_set for f in fb])
+        jac_dist_units = jaccard_distance_units_matrix(
+                                mkp_units, [(f.unit_set, f.split_unit_set) for f in fb])
+        # Lower bound of the Levenshtein distance -> upper bound of the confidence
+        dist_lev_lb = (100 - levenshtein_ratio_upper_bound(mkp_sorted, comp_sorted)) * 0.01
+        conf_ub = get_confidence_array(lev_dice_mean_array(dist_lev_lb, dist_dice),
+                                       jac_dist_units)
+        for j, f in enumerate(fb):
+            # Candidates by decreasing bound, ties by the lowest sku
+            cand = np.flatnonzero(conf_ub[:, j] >= min_conf)
+            cand = cand[np.argsort(-conf_ub[cand, j], kind = 'stable')]
+            conf_j, idx_j = -np.inf, -1
+            while len(cand) > 0:
+                block, cand = cand[:block_size], cand[block_size:]
+                dist_lev = _levenshtein_dist_matrix([mkp_sorted[i] for i in block],
+                                                    [comp_sorted[j]], workers = 1)[:, 0]
+                conf = get_confidence_array(
+                            lev_dice_mean_array(dist_lev, dist_dice[block, j]),
+                            jac_dist_units[block, j])
+                stats['scored'] += len(block)
+                for i, c in zip(block, conf):
+                    if c >= min_conf and (c > conf_j or (c == conf_j and i < idx_j)):
+                        conf_j, idx_j = c, i
+                # Only the pairs that may still beat the current best remain
+                bound = conf_ub[cand, j]
+                cand  = cand[(bound > conf_j) | ((bound == conf_j) & (cand < idx_j))]
+            if idx_j >= 0:
+                best_idx[start + j], best_conf[start + j] = idx_j, conf_j
+    stats['pruned'] = stats['pairs'] - stats['scored']
+
+    found = best_idx >= 0
+    matches = pd.DataFrame({
+        'comp_sku_name_clean': pd.Series(comp_names, dtype = object)[found].tolist(),
+        'sku':        pd.Series(catalog['sku'].to_numpy()[best_idx[found]], dtype = object),
+        'confidence': best_conf[found]})
+    return matches, stats
+
+
+def best_matches_by_brand(mkp_skus: Iterable, mkp_names: Iterable, comp_names: Iterable,
+                          chunk_size: int = 512, workers: int = -1) -> pd.DataFrame:
+    """
+    Brand partitioned version of `best_matches`. Each competitor name is
+    only scored against the catalog names of its brand (`extract_brand`).
+    Names of an unknown brand, or of a brand missing in the catalog, are
+    scored against the full catalog.
+    Returns the columns `comp_sku_name_clean`, `sku` and `confidence`.
+    """
+    mkp_skus     = list(mkp_skus)
+    mkp_features = _as_features(mkp_names)
+    comp_names   = list(comp_names)
+    if not mkp_features or not comp_names:
+        return best_matches(mkp_skus, mkp_features, [])
+    mkp_brands   = pd.Series([extract_brand(f.name) for f in mkp_features])
+    comp_brands  = pd.Series([extract_brand(name) for name in comp_names], dtype = object)
+    known = comp_brands.isin(set(mkp_brands) - {UNKNOWN_BRAND})
+    comp_brands[~known] = UNKNOWN_BRAND
+
+    matches = []
+    for brand, comp_idx in comp_brands.groupby(comp_brands, sort = False).groups.items():
+        mkp_idx = range(len(mkp_features)) if brand == UNKNOWN_BRAND \
+                    else np.flatnonzero(mkp_brands == brand)
+        brand_matches = best_matches([mkp_skus[i] for i in mkp_idx],
+                                     [mkp_features[i] for i in mkp_idx],
+                                     [comp_names[i] for i in comp_idx],
+                                     chunk_size = chunk_size, workers = workers)
+        matches.append(brand_matches.set_axis(comp_idx))
+    return pd.concat(matches).sort_index().reset_index(drop = True)
@@ -0,0 +1,284 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyspark
+import pyspark.sql.functions as F
+from pyspark.accumulators import AccumulatorParam
+from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql.types import StructField, StringType, DoubleType, StructType
+from pyspark.sql.pandas.types import from_arrow_schema, to_arrow_type
+from pyspark.sql.pandas.serializers import ArrowStreamSerializer
+from py4j.protocol import Py4JError
+from modules.normalize_text import normalize_text, normalize_text_batch, extract_brand, UNKNOWN_BRAND
+from modules.normalization_cache import NormalizationCache, rules_version
+from modules.sku_matcher import best_matches, build_features
+from modules.metrics import CONFIDENCE_BINS, confidence_histogram
+
+# Schema of the best match per competitor name
+MATCH_SCHEMA = StructType([
+    StructField("comp_sku_name_clean", StringType(), False),
+    StructField("sku",                 StringType(), True),
+    StructField("confidence",          DoubleType(), True)
+])
+
+# Arrow switch of `createDataFrame` from pandas
+ARROW_ENABLED_CONF = 'spark.sql.execution.arrow.pyspark.enabled'
+
+def _has_jvm_arrow_stream(spark: SparkSession) -> bool:
+    '''Whether the session exposes the private pyspark 3.x internals
+    of `_create_from_pandas_with_arrow` (not e.g. Spark Connect)'''
+    try:
+        sc = spark.sparkContext
+        return sc._jvm is not None and hasattr(sc, '_serialize_to_jvm') \
+               and hasattr(spark, '_jconf') and hasattr(spark, '_jsparkSession')
+    except Exception:
+        return False
+
+
+def _arrow_to_spark_jvm(spark: SparkSession, table: pa.Table, schema: StructType) -> DataFrame:
+    '''Streams the record batches to the JVM, one batch per partition'''
+    jvm = spark.sparkContext._jvm
+    batches = table.to_batches(max_chunksize = spark._jconf.arrowMaxRecordsPerBatch())
+    jiter = spark.sparkContext._serialize_to_jvm(
+                batches, ArrowStreamSerializer(),
+                lambda path: jvm.PythonSQLUtils.readArrowStreamFromFile(path),
+                lambda: jvm.ArrowIteratorServer())
+    jdf = jvm.PythonSQLUtils.toDataFrame(jiter, schema.json(), spark._jsparkSession)
+    return DataFrame(jdf, spark)
+
+
+def _arrow_to_spark_pandas(spark: SparkSession, table: pa.Table, schema: StructType) -> DataFrame:
+    '''Public API fallback: `createDataFrame` from pandas with Arrow enabled'''
+    enabled = spark.conf.get(ARROW_ENABLED_CONF, 'false')
+    spark.conf.set(ARROW_ENABLED_CONF, 'true')
+    try:
+        return spark.createDataFrame(table.to_pandas(), schema = schema)
+    finally:
+        spark.conf.set(ARROW_ENABLED_CONF, enabled)
+
+
+def arrow_to_spark(spark: SparkSession, table: pa.Table,
+                   schema: StructType = None) -> DataFrame:
+    """
+        Creates a Spark DataFrame from an Arrow table (e.g. the
+        `read_table` of the file readers). The record batches are
+        streamed to the JVM as `createDataFrame` does with Arrow enabled,
+        without the pandas round trip: no per-row Python conversion and
+        no copies of the strings on the driver.
+        That path relies on private pyspark 3.x internals: when they are
+        missing (or fail), the table goes through `createDataFrame` from
+        pandas with Arrow enabled. `schema` defaults to the table schema.
+    """
+    schema = from_arrow_schema(table.schema) if schema is None else schema
+    table  = table.select(schema.fieldNames())\
+                  .cast(pa.schema([pa.field(f.name, to_arrow_type(f.dataType), f.nullable)
+                                   for f in schema.fields]))
+    if int(pyspark.__version__.split('.')[0]) >= 4:
+        # Arrow tables are supported natively since Spark 4.0
+        return spark.createDataFrame(table, schema = schema)
+    if table.num_rows == 0:
+        return spark.createDataFrame([], schema = schema)
+    if _has_jvm_arrow_stream(spark):
+        try:
+            return _arrow_to_spark_jvm(spark, table, schema)
+        except (AttributeError, TypeError, Py4JError) as e:
+            print(f'Arrow stream to the JVM failed ({e}), using createDataFrame.')
+    return _arrow_to_spark_pandas(spark, table, schema)
+
+
+class HistogramAccumulatorParam(AccumulatorParam):
+    '''Element-wise sum of histogram counts'''
+    def zero(self, value: np.ndarray) -> np.ndarray:
+        return np.zeros_like(value)
+
+    def addInPlace(self, value_1: np.ndarray, value_2: np.ndarray) -> np.ndarray:
+        value_1 += value_2
+        return value_1
+
+
+def scoring_accumulators(spark: SparkSession) -> dict:
+    """
+        Counters of the scoring stages (`names`, `pairs` and the
+        `confidence_histogram`), updated by the tasks themselves, so no
+        extra `count()` action is needed. Read them with
+        `PipelineMetrics.add_accumulators` after the action that
+        computes the matches (a retried task may count twice).
+    """
+    sc = spark.sparkContext
+    return {'names': sc.accumulator(0),
+            'pairs': sc.accumulator(0),
+            'confidence_histogram': sc.accumulator(
+                    np.zeros(len(CONFIDENCE_BINS) - 1, dtype = np.int64),
+                    HistogramAccumulatorParam())}
+
+
+def _count_matches(accumulators: dict, n_catalog: int, matches: pd.DataFrame) -> None:
+    if accumulators is None:
+        return
+    accumulators['names'].add(len(matches))
+    accumulators['pairs'].add(n_catalog * len(matches))
+    accumulators['confidence_histogram'].add(confidence_histogram(matches['confidence']))
+
+
+@F.pandas_udf(StringType())
+def normalize_text_pandas_udf(texts: pd.Series) -> pd.Series:
+    '''Vectorized (Arrow) version of `normalize_text` for Spark columns.
+    Each Arrow batch is deduplicated before being normalized'''
+    return normalize_text_batch(texts, encode = 'ascii')
+
+
+def spark_normalization_cache(db_path) -> NormalizationCache:
+    '''`NormalizationCache` of the Spark UDFs, that normalize with
+    `encode = 'ascii'` (a version of its own)'''
+    return NormalizationCache(db_path, version = f'{rules_version()}:ascii')
+
+
+def normalization_accumulators(spark: SparkSession) -> dict:
+    '''Counters of `normalize_column`: the `rows` normalized (by the
+    tasks) and the `distinct_names` (on the driver, with a cache)'''
+    sc = spark.sparkContext
+    return {'rows': sc.accumulator(0), 'distinct_names': sc.accumulator(0)}
+
+
+def count_rows(df: DataFrame, accumulator, col: str) -> DataFrame:
+    """
+        Counts the rows of `df` in `accumulator` while the next action
+        computes them (no extra `count()`), through a pass-through
+        pandas UDF on `col`. A retried task may count twice.
+    """
+    @F.pandas_udf(df.schema[col].dataType)
+    def passthrough(values: pd.Series) -> pd.Series:
+        accumulator.add(len(values))
+        return values
+    return df.withColumn(col, passthrough(df[col]))
+
+
+def normalize_column(df: DataFrame, raw_col: str, clean_col: str,
+                     cache: NormalizationCache = None,
+                     accumulators: dict = None) -> DataFrame:
+    """
+        Adds `clean_col`, the normalized `raw_col`. Without a `cache`,
+        it is `normalize_text_pandas_udf`. With it, the distinct names
+        are looked up on the driver: only the missing ones go through
+        the UDF (and are added to the cache), the rest are joined from
+        a broadcast (raw, clean) table.
+        The `normalization_accumulators`, if given, are updated.
+    """
+    if cache is None:
+        if accumulators is None:
+            return df.withColumn(clean_col, normalize_text_pandas_udf(df[raw_col]))
+        rows = accumulators['rows']
+        @F.pandas_udf(StringType())
+        def normalize(texts: pd.Series) -> pd.Series:
+            rows.add(len(texts))
+            return normalize_text_batch(texts, encode = 'ascii')
+        return df.withColumn(clean_col, normalize(df[raw_col]))
+    spark = df.sparkSession
+    raw_names = [row[0] for row in df.select(raw_col).distinct().collect()
+                 if row[0] is not None]
+    if accumulators is not None:
+        accumulators['distinct_names'].add(len(raw_names))
+    normalized = cache.lookup(raw_names)
+    missing = [name for name in raw_names if name not in normalized]
+    if missing:
+        schema  = StructType([StructField(raw_col, StringType(), False)])
+        df_miss = spark.createDataFrame([(name, ) for name in missing], schema = schema)
+        computed = df_miss.withColumn(clean_col, normalize_text_pandas_udf(df_miss[raw_col]))\
+                          .toPandas()
+        computed = dict(zip(computed[raw_col], computed[clean_col]))
+        cache.insert(computed)
+        normalized.update(computed)
+    schema  = StructType([StructField(raw_col, StringType(), False),
+                          StructField(clean_col, StringType(), False)])
+    mapping = spark.createDataFrame(list(normalized.items()), schema = schema)
+    # Null names are not joined: `normalize_text(None)`, as the UDF
+    df_clean = df.join(F.broadcast(mapping), on = raw_col, how = 'left')\
+                 .withColumn(clean_col, F.when(F.col(raw_col).isNull(),
+                                               F.lit(normalize_text(None, encode = 'ascii')))
+                                         .otherwise(F.col(clean_col)))\
+                 .select(*df.columns, clean_col)
+    if accumulators is not None:
+        df_clean = count_rows(df_clean, accumulators['rows'], clean_col)
+    return df_clean
+
+
+@F.pandas_udf(StringType())
+def extract_brand_pandas_udf(texts: pd.Series) -> pd.Series:
+    '''Vectorized `extract_brand` for columns of normalized names'''
+    return texts.map(extract_brand)
+
+
+def best_matches_stage(df_comp_names: DataFrame, df_mktp_cat: DataFrame,
+                       comp_col: str = 'comp_sku_name_clean',
+                       mkp_col: str = 'mkp_sku_name_clean',
+                       chunk_size: int = 512,
+                       accumulators: dict = None) -> DataFrame:
+    """
+        Scores the competitor names against the marketplace catalog
+        and keeps only the best sku per name (ties: lowest `sku`).
+        The catalog is collected and broadcast once; each task scores
+        its partition of names with `mapInPandas`, so neither the
+        (mkp x comp) cross join nor a Window shuffle is materialized.
+        The tasks update the `scoring_accumulators`, if given.
+    """
+    spark   = df_comp_names.sparkSession
+    catalog = df_mktp_cat.select(F.col('sku').cast(StringType()), mkp_col)\
+                         .toPandas()
+    bc_catalog = spark.sparkContext.broadcast(
+            (catalog['sku'].tolist(), catalog[mkp_col].tolist()))
+
+    def score_partition(batches):
+        # Catalog features are built once per partition
+        mkp_skus, mkp_names = bc_catalog.value
+        mkp_features = build_features(mkp_names)
+        for pdf in batches:
+            # Spark already runs one task per core
+            matches = best_matches(mkp_skus, mkp_features, pdf[comp_col],
+                                   chunk_size = chunk_size, workers = 1)
+            _count_matches(accumulators, len(mkp_skus), matches)
+            yield matches.rename(columns = {'comp_sku_name_clean': comp_col})
+
+    schema = StructType([StructField(comp_col, StringType(), False)] +
+                        MATCH_SCHEMA.fields[1:])
+    return df_comp_names.select(comp_col)\
+                        .mapInPandas(score_partition, schema = schema)
+
+
+def best_matches_by_brand_stage(df_comp_names: DataFrame, df_mktp_cat: DataFrame,
+                                comp_col: str = 'comp_sku_name_clean',
+                                mkp_col: str = 'mkp_sku_name_clean',
+                                chunk_size: int = 512,
+                                accumulators: dict = None) -> DataFrame:
+    """
+        Brand partitioned version of `best_matches_stage`. Both sides are
+        tagged with `extract_brand` and co-grouped by brand, so each task
+        only scores a brand against its own catalog names. Names of an
+        unknown brand, or of a brand missing in the catalog, are scored
+        against the full (broadcast) catalog by `best_matches_stage`.
+    """
+    comp_names = df_comp_names.select(comp_col)\
+                    .withColumn('brand', extract_brand_pandas_udf(comp_col))
+    catalog = df_mktp_cat.select(F.col('sku').cast(StringType()), mkp_col)\
+                    .withColumn('brand', extract_brand_pandas_udf(mkp_col))\
+                    .where(F.col('brand') != UNKNOWN_BRAND)
+    catalog_brands = F.broadcast(catalog.select('brand').distinct())
+
+    schema = StructType([StructField(comp_col, StringType(), False)] +
+                        MATCH_SCHEMA.fields[1:])
+
+    def score_brand(comp_pdf, catalog_pdf):
+        matches = best_matches(catalog_pdf['sku'], catalog_pdf[mkp_col], comp_pdf[comp_col],
+                               chunk_size = chunk_size, workers = 1)
+        _count_matches(accumulators, len(catalog_pdf), matches)
+        return matches.rename(columns = {'comp_sku_name_clean': comp_col})
+
+    by_brand = comp_names.join(catalog_brands, on = 'brand', how = 'left_semi')\
+                    .groupBy('brand')\
+                    .cogroup(catalog.groupBy('brand'))\
+                    .applyInPandas(score_brand, schema = schema)
+    fallback = comp_names.join(catalog_brands, on = 'brand', how = 'left_anti')\
+                    .select(comp_col)
+    return by_brand.unionByName(
+            best_matches_stage(fallback, df_mktp_cat, comp_col = comp_col,
+                               mkp_col = mkp_col, chunk_size = chunk_size,
+                               accumulators = accumulators))
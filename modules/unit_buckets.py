@@ -0,0 +1,170 @@
+"""
+    Optional prefilter that only scores a competitor name against the
+    catalog names with a compatible package size.
+
+    Usage (recall against brute force):
+        python -m modules.unit_buckets [tests/expected_matches.json]
+"""
+import re
+import sys
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from collections.abc import Iterable
+from modules.normalize_text import extract_units, normalize_text
+from modules.sku_matcher import SkuFeatures, best_matches
+
+EXPECTED_MATCHES_PATH = Path('./tests/expected_matches.json')
+
+UNIT_QUANTITY_PATTERN = re.compile(r'^(\d*\.?\d+)(ml|lt|kg|g|oz)$')
+# Dimension and scale of each size unit. Pack counts (pz) are left to
+# the Jaccard distance of the units
+UNIT_SCALES = {'ml': ('volume', 1), 'lt': ('volume', 1000),
+               'g':  ('mass', 1),   'kg': ('mass', 1000),
+               'oz': ('oz', 1)}
+
+def unit_quantities(s_clean: str) -> frozenset:
+    '''Parses the size units of a cleaned string into normalized
+    `(dimension, quantity)` pairs, e.g. '1.5lt 12pz' -> {('volume', 1500)}'''
+    quantities = set()
+    for unit in extract_units(s_clean):
+        match = UNIT_QUANTITY_PATTERN.match(unit)
+        if match is None:
+            continue
+        dimension, scale = UNIT_SCALES[match.group(2)]
+        quantities.add((dimension, round(float(match.group(1)) * scale, 6)))
+    return frozenset(quantities)
+
+
+class UnitBuckets:
+    """
+        Catalog bucketed by normalized package size. A competitor name is
+        compatible with the catalog names that have no size of its
+        dimensions, or at least one size of each of them within `rel_tol`.
+        Names without sizes are compatible with the whole catalog.
+    """
+    def __init__(self, mkp_skus: Iterable, mkp_names: Iterable,
+                 rel_tol: float = 0.1) -> None:
+        self.skus     = list(mkp_skus)
+        self.features = [name if isinstance(name, SkuFeatures) else SkuFeatures(name)
+                         for name in mkp_names]
+        self.rel_tol  = rel_tol
+        # Pairs scored by the last `best_matches` call
+        self.n_pairs  = 0
+        # Sorted (quantity, row) arrays of each dimension
+        buckets = {}
+        for row, f in enumerate(self.features):
+            for dimension, quantity in unit_quantities(f.name):
+                buckets.setdefault(dimension, []).append((quantity, row))
+        self.buckets = {}
+        for dimension, values in buckets.items():
+            values = np.array(sorted(values))
+            self.buckets[dimension] = (values[:, 0], values[:, 1].astype(np.int64))
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def compatible(self, quantities: frozenset) -> np.ndarray:
+        """
+            Returns the (sorted) catalog rows compatible with the
+            `(dimension, quantity)` pairs of a competitor name.
+        """
+        keep = np.ones(len(self), dtype = bool)
+        for dimension in {d for d, _ in quantities} & self.buckets.keys():
+            values, rows = self.buckets[dimension]
+            matched = np.zeros(len(self), dtype = bool)
+            for d, quantity in quantities:
+                if d != dimension:
+                    continue
+                lo = np.searchsorted(values, quantity / (1 + self.rel_tol), side = 'left')
+                hi = np.searchsorted(values, quantity * (1 + self.rel_tol), side = 'right')
+                matched[rows[lo:hi]] = True
+            keep[rows] &= matched[rows]
+        return np.flatnonzero(keep)
+
+    def best_matches(self, comp_names: Iterable, chunk_size: int = 512,
+                     workers: int = -1) -> pd.DataFrame:
+        """
+            Keeps the best compatible sku for each competitor name (ties:
+            lowest `sku`). Names with the same compatible catalog rows
+            are scored together.
+            Returns the same columns as `sku_matcher.best_matches`.
+        """
+        comp_names = pd.Series(list(comp_names), dtype = object)
+        if len(self) == 0 or comp_names.empty:
+            return best_matches(self.skus, self.features, [])
+        compatible = {}
+        for quantities in set(comp_names.map(unit_quantities)):
+            compatible[quantities] = self.compatible(quantities)
+        groups = comp_names.map(lambda name: compatible[unit_quantities(name)].tobytes())
+        self.n_pairs = 0
+        matches = []
+        for group, comp_idx in groups.groupby(groups, sort = False).groups.items():
+            rows = np.frombuffer(group, dtype = np.int64)
+            self.n_pairs += len(rows) * len(comp_idx)
+            group_matches = best_matches([self.skus[r] for r in rows],
+                                         [self.features[r] for r in rows],
+                                         comp_names[comp_idx],
+                                         chunk_size = chunk_size, workers = workers)
+            if len(rows) == 0:
+                group_matches = pd.DataFrame({
+                    'comp_sku_name_clean': comp_names[comp_idx].tolist(),
+                    'sku': None, 'confidence': np.nan})
+            matches.append(group_matches.set_axis(comp_idx))
+        return pd.concat(matches).sort_index().reset_index(drop = True)
+
+
+def recall_report(json_path: Path = EXPECTED_MATCHES_PATH, rel_tol: float = 0.1,
+                  conf_thr: float = 0.4) -> dict:
+    """
+        Recall of the unit prefilter against brute force on the labeled
+        pairs of `expected_matches.json`. The catalog are the marketplace
+        names and the competitor names are matched against all of them:
+        - `pair_recall`: share of the expected matches (`==` and `>=`
+          entries with an expected confidence >= `conf_thr`, the `<=`
+          ones are bounds of non matches) whose catalog name is still
+          compatible.
+        - `best_match_recall`: share of the brute force best matches
+          (confidence >= `conf_thr`) also found with the prefilter.
+    """
+    json_path = Path(json_path)
+    if not json_path.exists():
+        print(f'The file {json_path} does not exist, the recall cannot be computed.')
+        return None
+    with open(json_path, 'r') as file:
+        dict_matches = json.load(file)
+
+    mkp_names = list(dict_matches)
+    mkp_clean = [normalize_text(name) for name in mkp_names]
+    pairs = [(i, normalize_text(values[0]))
+             for i, product_dict in enumerate(dict_matches.values())
+             for values in product_dict.values()
+             if values[2] in ('==', '>=') and values[1] >= conf_thr]
+    comp_clean = list(dict.fromkeys(normalize_text(values[0])
+                                    for product_dict in dict_matches.values()
+                                    for values in product_dict.values()))
+
+    skus = [f'{i:06d}' for i in range(len(mkp_names))]
+    buckets  = UnitBuckets(skus, mkp_clean, rel_tol = rel_tol)
+    kept     = sum(i in buckets.compatible(unit_quantities(comp)) for i, comp in pairs)
+    expected = best_matches(skus, buckets.features, comp_clean)
+    matches  = buckets.best_matches(comp_clean)
+    relevant = expected['confidence'] >= conf_thr
+    found    = relevant & (matches['sku'] == expected['sku'])
+    return {
+        'pairs':             len(pairs),
+        'pair_recall':       kept / len(pairs) if pairs else 1.0,
+        'names':             int(relevant.sum()),
+        'best_match_recall': found.sum() / relevant.sum() if relevant.any() else 1.0,
+        'scored_pairs':      buckets.n_pairs,
+        'full_pairs':        len(mkp_clean) * len(comp_clean)}
+
+
+if __name__ == '__main__':
+    report = recall_report(*sys.argv[1:2])
+    if report is None:
+        raise SystemExit(1)
+    for key, value in report.items():
+        print(f'{key:>18}: {value:,.4f}' if isinstance(value, float) else
+              f'{key:>18}: {value:,}')
@@ -0,0 +1,67 @@
+# Raw marketplace / competitor sku names taken from the EDA notebooks.
+mkp_sku_names = [
+    'Agua Natural Nestle Pureza Vital botella 1 L 12 PIEZAS',
+    'boing fresa 500ml 24pz',
+    'pedigree re 100g 40 pz pouche',
+    'Brandy Domecq Don Pedro 200 ml Presentación',
+    'Frijol Negro Queretaro Verde Valle QUERETANO 900 g Presentación: Paquete - 20 artículo(s).',
+    'Caja bebida energetica Vive 100 300M/24P 355 ml en 24 piezas',
+    'Destilado de agave Rancho Escondido 750ml 1 pieza',
+    'Bebida Energizante Red Bull Sugar Free 250 Ml',
+    'Paquete agua Santa Maria 1L/12P 1 litro con 12 piezas',
+    'Bebida Caribe Cooler Tinto 300 ml Presentación: Caja 12 Artículo(s)',
+    'suero electrolit mora azul 625ml presentacion 12 ártículos',
+    'VELADORA ROSITA 12  - PZS',
+    'LALA LECHE LIGHT 1L - 12 PZS',
+    'CHIVAS REGAL WHISKY 12 ANOS 750ML-1PZ',
+    'NEW MIX VAMPIRO LATON 473ML - 24 PZS',
+    'CARIBE COOLER FRESA 300ML - 12 PZS',
+    'VODKA ABSOLUT 750 ML - 1 PZ',
+    'SMIRNOFF VODKA 750 ML - 1PZ',
+    'SKYY BLUE 275 ML - 24 PZS',
+    'SMIRNOFF VODKA ETIQUETA ROJA 1L - 1PZ',
+    'SKYY APPLETINI 275 ML - 24 PZS',
+    'TEQUILA JOSE CUERVO ESPECIAL 695ML - 1PZ',
+    'JOSE CUERVO TEQ 1800 CRISTAL 700ML-1PZ',
+    'SAUZA HACIENDA TEQUILA REPOSADO 1Lt-1PZ',
+    'ELECTROLIT pina 625ML - 12PZS',
+    'SALSA LOLTUN HABANERO ROJO 150G - 24 PZS',
+    'JUGO JUMEX MANGO 40 PZS 250ml',
+    'Galletas de animalits',
+]
+
+comp_sku_names = [
+    'NESTLE PV 1L 4 pzs Modelo',
+    'NESTLE PV 12x1000 ML Modelo',
+    'jugo boing surtidos 500ml - 24pz',
+    'pedigree rp pouche res 100 gr 12 pz',
+    'Brandy DON PEDRO 200ml',
+    'FRIJOL NEGRO VERDE VALLE 900G - 20 PZS',
+    'VIVE 100 botella original 300ML 24 PIEZAS PACK',
+    'LICOR RANCHO ESCONDIDO anejado 750ml',
+    'RED BULL SUGAR FREE 250 ML - 4 PACK',
+    'SANTA MARIA 1.5L - 12PZS',
+    'CARIBE COOLER TINTO 300 ML - 12 PZ',
+    'electrolit fresa azul 625ml 12pz',
+    'Electrolit Fresa Kiwi 625 ml Caja con 12',
+    'Vel Rosita con 12 botellas de 1',
+    'leche Lala deslactosada Light 12/1L',
+    'Caja Whisky Chivas Regal 12 Anos 12P/750M',
+    'Walker Etiqueta Roja Litro 1000ml',
+    'Caja bebida Red Mix Vampiro 24P/473M',
+    'Caja bebida Caribe Cooler tinto 300M/12P',
+    'Vodka Absolut Raspberri 750M - ZK',
+    'Caja Vodka Smirnoff 12P/750M',
+    'Caja bebida Vodka skyy blue 275M/24P',
+    'Caja Vodka Smirnoff 12P/1L',
+    'Vodka Absolut Azul 750ml',
+    'Tequila Cuervo Tradicional Reposado 695 ml',
+    'Whisky Johnnie Walker Double Black Label 750 ml',
+    'Tequila 1800 Anejo Cristalino 100% 700ml',
+    'Skyy Appletini 275ml (6pz)',
+    'Tequila Sauza Hacienda Rep 700ml-1pz',
+    'Electrolit Pina 625 ml Caja con 12 Electrolit',
+    'SALSA LOL-TUN HABANERA 24/150 G *PROMO',
+    'Jumex Mango 24/250 ml Jumex',
+    'Caja Vodka Smirnoff 12P/750M',
+]
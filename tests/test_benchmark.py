@@ -0,0 +1,46 @@
+import json
+import pytest
+from modules.benchmark import synthetic_names, write_scrape_file, compare_results, main
+from modules.file_reader import OnlineFileReader
+from modules.normalize_text import normalize_text, extract_brand, UNKNOWN_BRAND
+
+
+@pytest.mark.parametrize("seed", [0, 7])
+def test_synthetic_names(seed):
+    """Same names for the same seed, with brands, units and combos."""
+    mkp_skus, mkp_names, comp_names = synthetic_names(200, 500, seed = seed)
+    assert (mkp_skus, mkp_names, comp_names) == synthetic_names(200, 500, seed = seed)
+    assert len(set(mkp_skus)) == len(set(mkp_names)) == 200 and len(comp_names) == 500
+    assert any(' + ' in name for name in comp_names)
+    assert any(c in ''.join(comp_names) for c in 'áéíóúñ')
+    comp_clean = [normalize_text(name) for name in comp_names]
+    assert sum(extract_brand(name) != UNKNOWN_BRAND for name in comp_clean) > 400
+    assert sum(any(u in name for u in ('ml', 'lt', 'g', 'oz')) for name in comp_clean) > 400
+
+
+def test_write_scrape_file(tmp_path):
+    _, _, comp_names = synthetic_names(10, 300)
+    path = write_scrape_file(tmp_path / '10-11-23-compA.txt', comp_names)
+    df = OnlineFileReader(path).read_file()
+    assert 200 < len(df) < 300 and df['gift_or_extra_prod'].notna().any()
+
+
+@pytest.mark.parametrize("value, regressions", [
+    (100.0, []),
+    (85.0,  []),
+    (70.0,  [('metric', 100.0, 70.0)]),
+])
+def test_compare_results(value, regressions):
+    baseline = {'metrics': {'metric': 100.0, 'removed': 1.0}}
+    results  = {'metrics': {'metric': value, 'added': 1.0}}
+    assert compare_results(results, baseline, tolerance = 0.2) == regressions
+
+
+def test_main_quick(tmp_path):
+    output = tmp_path / 'benchmark.json'
+    assert main(['--quick', '-o', str(output)]) == 0
+    results = json.loads(output.read_text())
+    assert results['machine']['quick'] and all(v > 0 for v in results['metrics'].values())
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({'metrics': {k: 10 * v for k, v in results['metrics'].items()}}))
+    assert main(['--quick', '-o', str(output), '--baseline', str(baseline)]) == 1
@@ -0,0 +1,165 @@
+import numpy as np
+import pytest
+from modules.normalize_text import normalize_text
+from modules.sku_matcher import get_confidence
+from modules.catalog_index import CatalogIndex, NgramIndex, MinHashIndex
+from tests.sample_names import mkp_sku_names, comp_sku_names
+
+mkp_names  = [normalize_text(name) for name in mkp_sku_names]
+comp_names = [normalize_text(name) for name in comp_sku_names]
+mkp_skus   = [f'{i:03d}' for i in range(len(mkp_names))]
+
+
+def test_candidates():
+    index = CatalogIndex(mkp_skus[:4], ['agua 1lt', 'agua 600ml', 'vino 750ml', 'x'],
+                         max_df = 0.4, max_candidates = 1)
+    assert index.stop_tokens == {'agua'}
+    assert index.candidates('agua 600ml').tolist() == [1]
+    assert index.candidates('agua').tolist() == []
+    assert len(CatalogIndex(mkp_skus[:4], ['agua 1lt', 'agua 600ml', 'x', 'y'],
+                            max_df = 1).candidates('agua')) == 2
+
+
+@pytest.mark.parametrize("max_candidates", [5, 100])
+def test_best_matches(max_candidates):
+    """Best match among the candidates, ties by the lowest sku."""
+    index   = CatalogIndex(mkp_skus, mkp_names, max_candidates = max_candidates)
+    matches = index.best_matches(comp_names)
+    assert matches['comp_sku_name_clean'].tolist() == comp_names
+    assert index.n_pairs <= max_candidates * len(comp_names)
+    for comp_name, (_, row) in zip(comp_names, matches.iterrows()):
+        rows = index.candidates(comp_name)
+        if len(rows) == 0:
+            assert row['sku'] is None and np.isnan(row['confidence'])
+            continue
+        confs = [get_confidence(mkp_names[r], comp_name) for r in rows]
+        assert row['confidence'] == max(confs)
+        assert row['sku'] == mkp_skus[rows[confs.index(max(confs))]]
+
+
+def test_weighted_brand_tokens():
+    """The weighted brand and the token glued to it are indexed apart."""
+    names = [normalize_text(name) for name in ['Tequila Jose Cuervo Especial 750 ml',
+                                               'Tequila Cuervo Tradicional 1 L',
+                                               'Vino Tinto 750 ml']]
+    assert '\x03' in names[0]
+    index = CatalogIndex(mkp_skus[:3], names, max_df = 1)
+    assert index.candidates(normalize_text('Jose Cuervo Especial')).tolist() == [0, 1]
+    assert index.candidates('especial').tolist() == [0]
+
+
+def test_recall_audit():
+    audit = CatalogIndex(mkp_skus, mkp_names).recall_audit(comp_names, sample_size = 20)
+    assert audit['sample'] == 20
+    assert audit['recall'] >= 0.9
+    assert audit['found'] + len(audit['missed']) == audit['relevant']
+    assert audit['pairs'] <= audit['full_pairs']
+
+
+def test_ngram_candidates():
+    """Typos and merged tokens still share most of their n-grams."""
+    names = ['coca cola 600ml', 'agua 1lt', 'vino tinto 750ml', 'x']
+    index = NgramIndex(mkp_skus[:4], names, max_candidates = 1)
+    assert index.candidates('cocacola').tolist() == [0]
+    assert index.candidates('vnio tinto 750ml').tolist() == [2]
+    assert index.candidates('').tolist() == []
+    assert index.candidates('zzz').tolist() == []
+    assert CatalogIndex(mkp_skus[:4], names, max_df = 1).candidates('cocacola').tolist() == []
+
+
+@pytest.mark.parametrize("max_candidates, chunk_size, workers", [(1, 1024, 1), (5, 7, 2), (100, 3, -1)])
+def test_ngram_top_k(max_candidates, chunk_size, workers):
+    """Same neighbours as the dense product, whatever the chunks."""
+    index = NgramIndex(mkp_skus, mkp_names, max_candidates = max_candidates,
+                       chunk_size = chunk_size, workers = workers)
+    sim   = index.top_k(comp_names)
+    dense = (index._tfidf(index._ngram_counts(comp_names)) @ index.matrix_t).toarray()
+    assert sim.shape == dense.shape
+    for i, row in enumerate(dense):
+        top = np.lexsort((np.arange(len(row)), -row))[:max_candidates]
+        assert sim.indices[sim.indptr[i]:sim.indptr[i + 1]].tolist() == sorted(top[row[top] > 0])
+        np.testing.assert_allclose(sim[i].toarray().ravel()[top], row[top])
+    assert index.top_k([]).shape == (0, len(mkp_names))
+
+
+def test_ngram_memory_bounds():
+    """Stop n-grams are not indexed and the chunks have a bounded size."""
+    index = NgramIndex(mkp_skus, mkp_names, max_df = 0.2, max_chunk_pairs = 100)
+    assert {'ml ', '00m'} <= index.stop_ngrams
+    assert not index.stop_ngrams & set(index.vocabulary)
+    assert index.chunk_size == 100 // len(mkp_names)
+    assert len(index.vocabulary) == index.matrix_t.shape[0]
+    # Whatever the chunks, the same neighbours
+    sim = index.top_k(comp_names)
+    assert (sim != NgramIndex(mkp_skus, mkp_names, max_df = 0.2).top_k(comp_names)).nnz == 0
+
+
+def test_ngram_best_matches():
+    index   = NgramIndex(mkp_skus, mkp_names, max_candidates = 10, min_similarity = 0.2)
+    matches = index.best_matches(comp_names)
+    for comp_name, rows, (_, row) in zip(comp_names, index.candidates_batch(comp_names),
+                                         matches.iterrows()):
+        if len(rows) == 0:
+            assert row['sku'] is None
+            continue
+        assert row['confidence'] == max(get_confidence(mkp_names[r], comp_name) for r in rows)
+    assert index.recall_audit(comp_names, sample_size = 20)['pairs'] <= 10 * 20
+
+
+@pytest.mark.parametrize("bands, rows, shingle_size, max_candidates", [
+    (32, 4, 1, 100), (8, 2, 1, 3), (16, 1, 2, 100)])
+def test_minhash_candidates(bands, rows, shingle_size, max_candidates):
+    """Catalog names sharing the most bands of the signature."""
+    index = MinHashIndex(mkp_skus, mkp_names, bands = bands, rows = rows,
+                         shingle_size = shingle_size, max_candidates = max_candidates)
+    assert index.signatures.shape == (len(mkp_names), bands * rows)
+    signatures = index.signature(comp_names, chunk_size = 7)
+    for comp_name, sig, rows_found in zip(comp_names, signatures, index.candidates_batch(comp_names)):
+        shared = (index.signatures == sig).reshape(len(mkp_names), bands, rows).all(axis = 2).sum(axis = 1)
+        order  = np.lexsort((np.arange(len(shared)), -shared))[:max_candidates]
+        assert rows_found.tolist() == sorted(order[shared[order] > 0])
+        assert index.query(comp_name).tolist() == [mkp_skus[r] for r in rows_found]
+    assert index.candidates('').tolist() == []
+
+
+def test_minhash_identical_names():
+    index = MinHashIndex(mkp_skus[:3], ['agua 1lt', 'agua 600ml', 'vino 750ml'], bands = 4, rows = 2)
+    assert 1 in index.candidates('agua 600ml')
+    assert index.candidates('cerveza').tolist() == []
+    assert 0 < index.threshold < 1
+
+
+def test_minhash_weighted_brand_shingles():
+    name  = normalize_text('Tequila Jose Cuervo Especial 750 ml')
+    index = MinHashIndex(mkp_skus[:1], [name], shingle_size = 2)
+    assert index.shingles(name) == {'teq cuervocuervocuervo', 'cuervocuervocuervo especial',
+                                    'especial 750ml'}
+    index.shingle_size = 1
+    assert 'especial' in index.shingles(name)
+
+
+def test_minhash_save_load(tmp_path):
+    index  = MinHashIndex(mkp_skus, mkp_names, bands = 8, rows = 3, seed = 1)
+    path   = index.save(tmp_path / 'catalog.npz')
+    loaded = MinHashIndex.load(path, max_candidates = 100)
+    np.testing.assert_array_equal(loaded.signatures, index.signatures)
+    assert loaded.skus.tolist() == index.skus.tolist()
+    for a, b in zip(loaded.candidates_batch(comp_names), index.candidates_batch(comp_names)):
+        assert a.tolist() == b.tolist()
+    assert MinHashIndex.load(tmp_path / 'missing.npz') is None
+    # The suffix is appended, as `np.savez` does
+    assert index.save(tmp_path / 'catalog.v2') == tmp_path / 'catalog.v2.npz'
+    # `save` returns the file written, `.npz` suffix included
+    path = index.save(tmp_path / 'signatures')
+    assert path == tmp_path / 'signatures.npz' and path.is_file()
+    assert MinHashIndex.load(path).signatures.shape == index.signatures.shape
+
+
+def test_minhash_save_load_numeric_skus(tmp_path):
+    """Numeric skus keep their order (and type) through a round trip."""
+    names  = ['agua 1lt', 'vino tinto 750ml']
+    index  = MinHashIndex([10, 2], names, bands = 8, rows = 2)
+    loaded = MinHashIndex.load(index.save(tmp_path / 'catalog'))
+    assert loaded.skus.tolist() == [2, 10] and loaded.names == ['vino tinto 750ml', 'agua 1lt']
+    assert (loaded.signatures == loaded.signature(loaded.names)).all()
+    assert loaded.query('vino tinto 750ml').tolist() == [2]
@@ -0,0 +1,43 @@
+import numpy as np
+from scipy import sparse
+from fuzzywuzzy import fuzz
+from modules.normalize_text import normalize_text
+from modules.distance_metrics import dice_sorensen_dist_ratio, jaccard_distance_units, \
+    remove_units, incidence_matrices, dice_sorensen_dist_matrix, jaccard_distance_units_matrix, \
+    levenshtein_ratio_upper_bound
+from tests.sample_names import mkp_sku_names, comp_sku_names
+
+edge_names = ['', '500ml', 'agua 1lt', 'agua 1lt 12pz', '600ml 600ml', '.5lt']
+mkp_names  = [normalize_text(name) for name in mkp_sku_names] + edge_names
+comp_names = [normalize_text(name) for name in comp_sku_names] + edge_names
+
+
+def test_incidence_matrices():
+    A, B = incidence_matrices([{'a', 'b'}, set()], [{'b', 'c'}])
+    assert sparse.issparse(A) and A.shape == (2, 3) and B.shape == (1, 3)
+    assert (A @ B.T).toarray().tolist() == [[1], [0]]
+
+
+def test_dice_sorensen_dist_matrix():
+    """Equals `dice_sorensen_dist_ratio` on every pair of strings."""
+    a = [remove_units(name) for name in mkp_names]
+    b = [remove_units(name) for name in comp_names]
+    expected = np.array([[dice_sorensen_dist_ratio(x, y) for y in b] for x in a])
+    np.testing.assert_array_equal(dice_sorensen_dist_matrix(a, b), expected)
+
+
+def test_jaccard_distance_units_matrix():
+    """Equals `jaccard_distance_units` on every pair of strings."""
+    expected = np.array([[jaccard_distance_units(x, y) for y in comp_names]
+                         for x in mkp_names])
+    np.testing.assert_array_equal(
+        jaccard_distance_units_matrix(mkp_names, comp_names), expected)
+
+
+def test_levenshtein_ratio_upper_bound():
+    """Never below `fuzz.ratio`, and exact for equal or empty strings."""
+    expected = np.array([[fuzz.ratio(x, y) for y in comp_names] for x in mkp_names])
+    ratio_ub = levenshtein_ratio_upper_bound(mkp_names, comp_names)
+    assert (ratio_ub >= expected).all()
+    assert levenshtein_ratio_upper_bound(['', 'abc'], ['', 'cba']).tolist() == \
+        [[100, 0], [0, 100]]
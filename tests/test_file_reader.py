@@ -0,0 +1,249 @@
+import numpy as np
+import pandas as pd
+import pytest
+from modules.file_reader import OnlineFileReader, MktpPricesFileReader, read_directory, \
+                                round_series, SCRAP_SCHEMA, MKTP_PRICES_SCHEMA
+
+header = 'type<s>country<s>zone<s>date<s>company<s>name<s>price<s>url<s>quantity<s>specialPrice'
+rows = [
+    'online<s>MX<s>unique<s>10-11-23<s>compA<s>NESTLE PV 1L 4 pzs Modelo<s>"$1,00.50"<s>www.compa.com/p/0<s><s>90',
+    'online<s>MX<s>unique<s>10-11-23<s>compA<s>jugo boing 500ml + vaso gratis<s>$ 2.675<s>http://compa.com/p/1<s>12 pz<s>',
+    'online<s>MX<s>unique<s>10-11-23<s>compA<s>Café Ñandú orgánico 500 g<s>1_000<s>ñandú.com/página/1<s>6<s>c/u 7.5',
+    'online<s>MX<s>norte<s>10-11-23<s>compA<s>agua<s>10<s>short<s><s>NA',
+    'online<s>MX<s>unique<s>10-11-23<s>compA<s>Tequila  Cuervo  1L + combo + extra<s>Agotado<s>https://x.com<s><s>',
+    'online<s>MX<s>unique<s>10-11-23<s>compA<s>VINO "TINTO" casillero 750ml<s>"1.005"<s><s>NA<s>3.14159',
+]
+
+def write_file(path, lines, newline = '\n'):
+    path.write_text(newline.join(lines), encoding = 'utf-8')
+    return path
+
+
+@pytest.mark.parametrize("lines, newline", [
+    ([header] + rows * 3, '\n'),
+    ([header] + rows * 3, '\r\n'),
+    ([' ' + line + ' ' for line in [header] + rows * 3], '\n'),
+    # Ragged lines and blank lines fall back to the python engine
+    ([header] + rows * 3 + ['online<s>MX'], '\n'),
+    ([header, ''] + rows * 3 + ['   '], '\n'),
+])
+def test_fast_read_file(tmp_path, lines, newline):
+    """The vectorized path equals the per-row path, row for row."""
+    path = write_file(tmp_path / '10-11-23-compA.txt', lines, newline)
+    expected = OnlineFileReader(path, fast = False).read_file()
+    df = OnlineFileReader(path).read_file()
+    assert len(df) > 0
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_read_csv_fast_fallback(tmp_path):
+    reader = OnlineFileReader(write_file(tmp_path / 'a.txt', [header] + rows))
+    assert reader._read_csv_fast() is not None
+    reader = OnlineFileReader(write_file(tmp_path / 'b.txt', [header] + rows + ['a<s>b']))
+    assert reader._read_csv_fast() is None
+
+
+def test_vectorized_cleaning():
+    """Each vectorized step equals its scalar function."""
+    reader = OnlineFileReader('')
+    prices = pd.Series(['"$1,00.50"', '$ 2.675', '1_000', 'Agotado', '', 'c/u 7.5',
+                        '\xa0 3.14159', '1e400', np.nan, 12.345], dtype = object)
+    pd.testing.assert_series_equal(reader.parse_price_series(prices),
+                                   prices.map(reader.parse_price_col))
+    urls = pd.Series(['www.compa.com/p/0', 'http://compa.com/p/1', 'short', None,
+                      np.nan, 'ñandú.com/página/1', 'https://x.com'], dtype = object)
+    pd.testing.assert_series_equal(reader.validate_url_series(urls),
+                                   urls.map(reader.validate_url_col))
+    names = pd.Series([row.split('<s>')[5] for row in rows] + ['', 'ǆungla İstanbul straße'])
+    gifts = reader.extract_gift_from_sku_names(names)
+    assert gifts.values.tolist() == names.map(reader.extract_gift_from_sku_name).tolist()
+    pd.testing.assert_series_equal(reader.validate_sku_name_series(gifts[0]),
+                                   gifts[0].map(reader.validate_sku_name_col),
+                                   check_names = False)
+
+
+def test_round_series():
+    values = pd.Series([2.675, 0.125, 1.005, -0.001, 1e300, np.inf, np.nan, 123456789012.345])
+    pd.testing.assert_series_equal(round_series(values, 2),
+                                   values.map(lambda x: round(x, 2)))
+
+
+def test_read_directory(tmp_path):
+    write_file(tmp_path / '10-11-23-compA.txt', [header] + rows * 3)
+    write_file(tmp_path / '10-11-23-compB.txt', [header.replace('price', 'cost')] + rows * 3)
+    write_file(tmp_path / '10-11-23-compC.txt', [header])
+    write_file(tmp_path / '10-11-23-compD.txt', [header] + rows[:1] * 10)
+    df, report = read_directory(tmp_path, max_workers = 2)
+    expected = pd.concat([OnlineFileReader(tmp_path / f'10-11-23-comp{c}.txt').read_file()
+                          for c in 'AD'], ignore_index = True)
+    pd.testing.assert_frame_equal(df, expected)
+    assert report['file'].tolist() == [f'10-11-23-comp{c}.txt' for c in 'ABCD']
+    assert report['status'].tolist() == ['ok', 'missing_columns', 'empty', 'ok']
+    assert report['rows'].tolist() == [len(expected) - 10, 0, 0, 10]
+    assert report['missing_columns'].tolist() == ['', 'price', '', '']
+    assert (report['elapsed'] >= 0).all()
+
+
+def test_read_directory_without_files(tmp_path):
+    df, report = read_directory(tmp_path)
+    assert df is None and report.empty
+    assert read_directory(tmp_path / 'missing') == (None, None)
+
+
+def test_read_table(tmp_path):
+    path  = write_file(tmp_path / '10-11-23-compA.txt', [header] + rows * 3)
+    df    = OnlineFileReader(path).read_file()
+    table = OnlineFileReader(path).read_table()
+    assert table.schema == SCRAP_SCHEMA
+    assert table.column('date').to_pylist() == df['date'].dt.date.tolist()
+    for col in ['competitor_name', 'competitor_url', 'gift_or_extra_prod']:
+        assert table.column(col).to_pylist() == \
+                df[col].astype(object).where(df[col].notna(), None).tolist()
+    for col in ['competitor_price', 'special_price']:
+        assert table.column(col).to_pylist() == \
+                df[col].astype(object).where(df[col].notna(), None).tolist()
+    tables, report = read_directory(tmp_path, as_table = True)
+    assert tables.equals(table) and report['rows'].tolist() == [table.num_rows]
+
+
+def test_read_table_null_dates(tmp_path, capsys):
+    """Rows with nulls in the non-nullable fields are dropped."""
+    lines = [header] + rows * 3 + [rows[0].replace('10-11-23', '2023/11/10')]
+    path  = write_file(tmp_path / '10-11-23-compA.txt', lines)
+    df    = OnlineFileReader(path).read_file()
+    assert df['date'].isnull().sum() == 1
+    table = OnlineFileReader(path).read_table()
+    assert table.num_rows == len(df) - 1 and table.column('date').null_count == 0
+    assert "{'date': 1}" in capsys.readouterr().out
+
+
+def test_mktp_read_table(tmp_path):
+    path = tmp_path / 'MX-2023-10-11.parquet'
+    pd.DataFrame({'date':        ['2023-11-10'] * 3,
+                  'region_name': ['CDMX', 'CDMX', 'GDL'],
+                  'sku':         ['000123', '45 ', '000123'],
+                  'sku_name':    ['agua 1 L', 'boing fresa 500ml', 'agua 1 L'],
+                  'price':       ['10.5', '7.125', '11']}).to_parquet(path)
+    table = MktpPricesFileReader(path).read_table()
+    assert table.schema == MKTP_PRICES_SCHEMA
+    assert table.to_pydict() == {'country':     ['MX'] * 3,
+                                 'date':        [pd.Timestamp('2023-11-10').date()] * 3,
+                                 'region_name': ['CDMX', 'CDMX', 'GDL'],
+                                 'sku':         ['123', '45', '123'],
+                                 'sku_name':    ['agua 1 L', 'boing fresa 500ml', 'agua 1 L'],
+                                 'price':       [10.5, 7.12, 11.0]}
+
+
+def write_prices(path, date, skus, regions = ('CDMX', 'GDL')):
+    pd.DataFrame({'date':        [date] * len(skus) * len(regions),
+                  'region_name': [r for r in regions for _ in skus],
+                  'sku':         list(skus) * len(regions),
+                  'sku_name':    [f'producto {sku}' for sku in skus] * len(regions),
+                  'price':       [10.0] * len(skus) * len(regions),
+                  'extra':       [0] * len(skus) * len(regions)}).to_parquet(path)
+    return path
+
+
+@pytest.mark.parametrize("regions, memory_map, n_rows", [
+    (None, False, 4),
+    (['GDL'], True, 2),
+    (['MTY'], False, 0),
+])
+def test_mktp_pushdown(tmp_path, regions, memory_map, n_rows):
+    path = write_prices(tmp_path / 'MX-2023-10-11.parquet', '2023-11-10', ['01', '02'])
+    df   = MktpPricesFileReader(path, regions = regions, memory_map = memory_map).read_file()
+    assert len(df) == n_rows and df.columns.tolist() == MKTP_PRICES_SCHEMA.names
+    if regions is not None:
+        assert set(df['region_name']) <= set(regions)
+
+
+def test_mktp_missing_columns(tmp_path):
+    path = tmp_path / 'MX-2023-10-11.parquet'
+    pd.DataFrame({'date': ['2023-11-10'], 'sku': ['01']}).to_parquet(path)
+    assert MktpPricesFileReader(path).read_file() is None
+
+
+def test_mktp_read_window(tmp_path):
+    # Names use the `YYYY-dd-mm` date of the notebook
+    write_prices(tmp_path / 'MX-2023-25-10.parquet', '2023-10-25', ['01'])
+    write_prices(tmp_path / 'MX-2023-01-11.parquet', '2023-11-01', ['02'])
+    write_prices(tmp_path / 'MX-2023-10-11.parquet', '2023-11-10', ['03'])
+    write_prices(tmp_path / 'CO-2023-10-11.parquet', '2023-11-10', ['04'])
+    write_prices(tmp_path / 'MX-2023-11-11.parquet', '2023-11-11', ['05'])
+    reader = MktpPricesFileReader(tmp_path / 'MX-2023-10-11.parquet', regions = ['CDMX'])
+    df = reader.read_window(days = 15)
+    assert df['sku'].tolist() == ['2', '3']
+    assert df['date'].dt.strftime('%Y-%m-%d').tolist() == ['2023-11-01', '2023-11-10']
+    assert reader.read_window(days = 20)['sku'].tolist() == ['1', '2', '3']
+    # The file of the last date is not required
+    reader = MktpPricesFileReader(tmp_path / 'MX-2023-09-11.parquet')
+    assert reader.read_window(days = 14)['sku'].tolist() == ['2', '2']
+    assert MktpPricesFileReader(tmp_path / 'MX-2023-01-10.parquet').read_window() is None
+
+
+@pytest.mark.parametrize("dates, pushed_down", [
+    (['2023-10-20', '2023-11-01', '2023-11-10', '2023-11-11'], True),
+    (pd.to_datetime(['2023-10-20', '2023-11-01', '2023-11-10 23:00', '2023-11-11'],
+                    format = 'ISO8601'), True),
+    (pd.to_datetime(['2023-10-20', '2023-11-01', '2023-11-10', '2023-11-11']).date, True),
+    (['20/10/2023', '01/11/2023', '10/11/2023', '11/11/2023'], False),
+])
+def test_mktp_date_window_scan(tmp_path, dates, pushed_down):
+    """The window is a scan filter, for ISO string, timestamp and date columns."""
+    path = tmp_path / 'MX-2023-10-11.parquet'
+    pd.DataFrame({'date': dates, 'region_name': 'CDMX', 'sku': ['1', '2', '3', '4'],
+                  'sku_name': 'producto', 'price': 10.0}).to_parquet(path)
+    reader  = MktpPricesFileReader(path)
+    window  = (pd.Timestamp('2023-10-27').date(), pd.Timestamp('2023-11-10').date())
+    scanned = reader._scan([path], window)
+    # Dates Arrow cannot parse are left to the window of `read_window`
+    assert scanned['sku'].tolist() == (['2', '3'] if pushed_down else ['1', '2', '3', '4'])
+    if pushed_down:
+        assert reader.read_window(days = 14)['sku'].tolist() == ['2', '3']
+
+
+@pytest.mark.parametrize("lines, chunksize", [
+    ([header] + rows * 5, 4),
+    ([header] + rows * 5, 1000),
+    # Python engine fallback
+    ([header] + rows * 5 + ['online<s>MX'], 7),
+])
+def test_iter_chunks(tmp_path, lines, chunksize):
+    path   = write_file(tmp_path / '10-11-23-compA.txt', lines)
+    chunks = list(OnlineFileReader(path).iter_chunks(chunksize))
+    assert all(0 < len(chunk) <= chunksize for chunk in chunks)
+    df = pd.concat(chunks, ignore_index = True)
+    expected = OnlineFileReader(path).read_file().reset_index(drop = True)
+    pd.testing.assert_frame_equal(df.astype({'competitor_name': object}),
+                                  expected.astype({'competitor_name': object}))
+    tables = list(OnlineFileReader(path).iter_chunks(chunksize, as_table = True))
+    assert all(table.schema == SCRAP_SCHEMA for table in tables)
+    assert sum(table.num_rows for table in tables) == len(expected)
+
+
+@pytest.mark.parametrize("price, special_price", [
+    ('$10', '90'),
+    ('10.5', '9.5'),
+    ('10.5', ''),
+])
+def test_iter_chunks_dtypes(tmp_path, price, special_price):
+    """Float prices, whatever dtype `read_csv` infers for the file."""
+    row   = f'online<s>MX<s>unique<s>10-11-23<s>compA<s>agua natural 1 L<s>{price}<s>www.a.com<s>3<s>{special_price}'
+    path  = write_file(tmp_path / 'a.txt', [header] + [row] * 8)
+    df    = pd.concat(OnlineFileReader(path).iter_chunks(3))
+    expected = OnlineFileReader(path).read_file()
+    pd.testing.assert_series_equal(df.dtypes, expected.dtypes)
+    assert expected[['competitor_price', 'special_price']].dtypes.eq(np.float64).all()
+
+
+@pytest.mark.parametrize("price, status", [
+    ('Agotado', 'invalid_prices'),
+    ('10.5', 'ok'),
+])
+def test_iter_chunks_file_checks(tmp_path, price, status):
+    row   = 'online<s>MX<s>unique<s>10-11-23<s>compA<s>agua natural 1 L<s>Agotado<s>www.a.com<s><s>'
+    lines = [header] + [row] * 20 + [row.replace('Agotado', price)]
+    reader = OnlineFileReader(write_file(tmp_path / 'a.txt', lines))
+    chunks = list(reader.iter_chunks(5))
+    assert reader.status == status and sum(map(len, chunks)) == (status == 'ok')
+    assert reader.read_file() is None if status != 'ok' else reader.status == 'ok'
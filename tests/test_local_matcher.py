@@ -0,0 +1,75 @@
+import pandas as pd
+import pyarrow.parquet as pq
+from modules.normalize_text import normalize_text
+from modules.sku_matcher import get_confidence
+from modules.local_matcher import run_local_matching, main, MATCHED_SCHEMA
+from modules.metrics import PipelineMetrics
+from tests.sample_names import mkp_sku_names, comp_sku_names
+
+
+def write_input_files(tmp_path):
+    """Writes a marketplace `.parquet` and a scraping directory."""
+    mktp_path = tmp_path / 'MX-2023-10-11.parquet'
+    pd.DataFrame({
+        'date':        '2023-11-10',
+        'region_name': 'CDMX',
+        'sku':         [f'00{100 + i}' for i in range(len(mkp_sku_names))],
+        'sku_name':    mkp_sku_names,
+        'price':       10.5}).to_parquet(mktp_path)
+    scraping_dir = tmp_path / '10-11-23'
+    scraping_dir.mkdir()
+    lines = ['type<s>country<s>zone<s>date<s>company<s>name<s>price<s>url']
+    lines += [f'online<s>MX<s>unique<s>10-11-23<s>comp_a<s>{name}<s>"${i},50"<s>www.comp-a.com/p/{i}'
+              for i, name in enumerate(comp_sku_names, start = 1)]
+    (scraping_dir / '10-11-23-comp_a.txt').write_text('\n'.join(lines))
+    return mktp_path, scraping_dir
+
+
+def test_run_local_matching(tmp_path):
+    """Best matches above `conf_thr`, as the cluster notebook."""
+    mktp_path, scraping_dir = write_input_files(tmp_path)
+    df_matched = run_local_matching(mktp_path, scraping_dir, max_workers = 2)
+    assert len(df_matched) > 0
+    assert (df_matched['confidence'] >= 0.4).all()
+    assert df_matched['confidence'].is_monotonic_decreasing
+    mkp_names = [normalize_text(name) for name in mkp_sku_names]
+    for _, row in df_matched.iterrows():
+        comp_name = normalize_text(row['competitor_sku_name'])
+        best_conf = max(get_confidence(name, comp_name) for name in mkp_names)
+        assert row['confidence'] == best_conf
+    # Pruning keeps the same matches
+    pd.testing.assert_frame_equal(
+        run_local_matching(mktp_path, scraping_dir, max_workers = 2, prune = True),
+        df_matched)
+    # So does reusing the matches of a previous run
+    for _ in range(2):
+        pd.testing.assert_frame_equal(
+            run_local_matching(mktp_path, scraping_dir, max_workers = 2,
+                               match_store = tmp_path / 'matches.db'),
+            df_matched)
+
+
+def test_norm_cache(tmp_path):
+    """A second run takes every name from the normalization cache."""
+    mktp_path, scraping_dir = write_input_files(tmp_path)
+    expected = run_local_matching(mktp_path, scraping_dir, max_workers = 2)
+    runs = []
+    for _ in range(2):
+        metrics = PipelineMetrics()
+        pd.testing.assert_frame_equal(
+            run_local_matching(mktp_path, scraping_dir, max_workers = 2,
+                               norm_cache = tmp_path / 'norm_cache.db', metrics = metrics),
+            expected)
+        runs.append(metrics.stages['normalize'])
+    assert runs[0]['cache_hits'] < runs[0]['cache_misses']
+    assert runs[1]['cache_misses'] == 0
+    assert runs[1]['cache_hits'] == runs[0]['cache_hits'] + runs[0]['cache_misses']
+
+
+def test_main(tmp_path):
+    mktp_path, scraping_dir = write_input_files(tmp_path)
+    output = tmp_path / 'matched.parquet'
+    assert main([str(mktp_path), str(scraping_dir), '-o', str(output),
+                 '--max-workers', '2', '--norm-cache', str(tmp_path / 'norm_cache.db')]) == 0
+    assert (tmp_path / 'norm_cache.db').is_file()
+    assert pq.read_schema(output).remove_metadata().equals(MATCHED_SCHEMA)
@@ -0,0 +1,80 @@
+import pandas as pd
+from modules.normalize_text import normalize_text
+from modules.sku_matcher import best_matches
+from modules.match_store import BloomFilter, MatchStore, catalog_fingerprint, \
+    incremental_best_matches
+from tests.sample_names import mkp_sku_names, comp_sku_names
+
+mkp_names  = [normalize_text(name) for name in mkp_sku_names]
+comp_names = [normalize_text(name) for name in comp_sku_names]
+mkp_skus   = [f'{i:03d}' for i in range(len(mkp_names))]
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(n_bits = 2**12)
+    bloom.add(comp_names)
+    assert bloom.might_contain(comp_names).all()
+    assert BloomFilter(bits = bloom.to_bytes()).might_contain(comp_names).all()
+    assert not BloomFilter(n_bits = 2**12).might_contain(comp_names).any()
+
+
+def test_catalog_fingerprint():
+    fingerprint = catalog_fingerprint(mkp_skus, mkp_names)
+    assert catalog_fingerprint(mkp_skus[::-1], mkp_names[::-1]) == fingerprint
+    assert catalog_fingerprint(mkp_skus[1:], mkp_names[1:]) != fingerprint
+
+
+def test_incremental_best_matches(tmp_path):
+    """Stored names are not scored again and give the same matches."""
+    db_path = tmp_path / 'matches.db'
+    scored  = []
+    def match_fn(skus, names, new_names):
+        scored.extend(new_names)
+        return best_matches(skus, names, new_names)
+
+    version  = catalog_fingerprint(mkp_skus, mkp_names)
+    expected = best_matches(mkp_skus, mkp_names, comp_names)
+    with MatchStore(db_path, 'MX', version) as store:
+        half = len(comp_names) // 2
+        incremental_best_matches(store, mkp_skus, mkp_names, comp_names[:half],
+                                 match_fn = match_fn)
+        assert len(store) == len(set(comp_names[:half]))
+    with MatchStore(db_path, 'MX', version) as store:
+        matches = incremental_best_matches(store, mkp_skus, mkp_names, comp_names,
+                                           match_fn = match_fn)
+    assert sorted(scored) == sorted(set(comp_names))
+    pd.testing.assert_frame_equal(matches, expected.drop_duplicates('comp_sku_name_clean',
+                                                                    ignore_index = True))
+    # Other countries or catalogs do not share the matches
+    with MatchStore(db_path, 'CO', version) as store:
+        assert store.lookup(comp_names).empty
+    with MatchStore(db_path, 'MX', 'other') as store:
+        assert store.lookup(comp_names).empty
+
+
+def test_delta_best_matches(tmp_path):
+    """Carrying the matches over a catalog change equals a full rematch."""
+    db_path = tmp_path / 'matches.db'
+    with MatchStore(db_path, 'MX', catalog_fingerprint(mkp_skus, mkp_names)) as store:
+        incremental_best_matches(store, mkp_skus, mkp_names, comp_names)
+    # Removed, renamed and added skus; '000' ties with the name of '001'
+    catalog = list(zip(mkp_skus, mkp_names))[1::2]
+    catalog[0] = (catalog[0][0], catalog[0][1] + ' 12pz')
+    catalog += [('000', mkp_names[1])] + \
+               [(f'9{i:02d}', name) for i, name in enumerate(comp_names[:5])]
+    new_skus, new_names = map(list, zip(*catalog))
+    with MatchStore(db_path, 'MX', catalog_fingerprint(new_skus, new_names)) as store:
+        assert store.previous_version() == catalog_fingerprint(mkp_skus, mkp_names)
+        scored = []
+        def match_fn(skus, names, comp):
+            scored.append((len(skus), len(comp)))
+            return best_matches(skus, names, comp)
+        matches = incremental_best_matches(store, new_skus, new_names, comp_names,
+                                           match_fn = match_fn)
+    expected = best_matches(new_skus, new_names, list(dict.fromkeys(comp_names)))
+    pd.testing.assert_frame_equal(matches, expected)
+    # Names that lost their best sku are rescored in full, the rest
+    # only against the added (or renamed) skus
+    rescored, merged = scored
+    assert rescored[0] == len(new_skus)
+    assert merged == (7, len(set(comp_names)) - rescored[1])
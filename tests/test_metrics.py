@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from modules.metrics import PipelineMetrics, confidence_histogram, read_metrics
+from modules.local_matcher import run_local_matching
+from tests.test_local_matcher import write_input_files
+
+
+@pytest.mark.parametrize('confidences, expected', [
+    ([], [0] * 10),
+    ([0.0, 0.05, 0.95, 1.0], [2] + [0] * 8 + [2]),
+    ([0.4, np.nan, 0.45], [0] * 4 + [2] + [0] * 5),
+])
+def test_confidence_histogram(confidences, expected):
+    assert confidence_histogram(confidences).tolist() == expected
+
+
+def test_add_sums_counters():
+    metrics = PipelineMetrics()
+    metrics.add('matching', pairs = 10, mode = 'bulk')
+    metrics.add('matching', pairs = 5, mode = 'prune')
+    with metrics.stage('matching') as stage:
+        stage['names'] = 3
+    assert metrics.stages['matching']['pairs'] == 15
+    assert metrics.stages['matching']['mode'] == 'prune'
+    assert metrics.stages['matching']['names'] == 3
+    assert metrics.stages['matching']['seconds'] >= 0
+
+
+def test_add_read_report():
+    report = pd.DataFrame({'file':    ['a.txt', 'b.txt', 'c.txt'],
+                           'status':  ['ok', 'empty', 'missing_columns'],
+                           'rows':    [7, 0, 0],
+                           'elapsed': [0.1, 0.2, 0.0]})
+    metrics = PipelineMetrics()
+    metrics.add_read_report('read_scraping', report)
+    stage = metrics.stages['read_scraping']
+    assert stage['files'] == 3 and stage['files_skipped'] == 2 and stage['rows_out'] == 7
+    assert stage['skipped'] == {'empty': 1, 'missing_columns': 1}
+
+
+def test_emit(tmp_path):
+    path = tmp_path / 'metrics' / 'runs.jsonl'
+    for date in ['2023-11-10', '2023-11-11']:
+        metrics = PipelineMetrics(country = 'MX', date = date)
+        metrics.add('matching', pairs = np.int64(4))
+        metrics.add_confidences([0.5, 0.9])
+        metrics.emit(path)
+    df = read_metrics(path)
+    assert df['date'].tolist() == ['2023-11-10', '2023-11-11']
+    assert df['stages.matching.pairs'].tolist() == [4, 4]
+    assert sum(df.loc[0, 'confidence_histogram.counts']) == 2
+
+
+def test_run_local_matching_metrics(tmp_path):
+    mktp_path, scraping_dir = write_input_files(tmp_path)
+    metrics = PipelineMetrics(country = 'MX', date = '2023-11-10')
+    df_matched = run_local_matching(mktp_path, scraping_dir, max_workers = 2,
+                                    prune = True, metrics = metrics)
+    stages = metrics.stages
+    assert {'read_catalog', 'read_scraping', 'normalize', 'matching', 'output'} <= set(stages)
+    assert stages['read_scraping']['rows_out'] > 0
+    assert stages['matching']['scored'] + stages['matching']['pruned'] == stages['matching']['pairs']
+    assert stages['output']['rows_out'] == len(df_matched)
+    # At most one best confidence per distinct scraped name
+    assert 0 < metrics.histogram.sum() <= stages['matching']['names']
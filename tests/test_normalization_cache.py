@@ -0,0 +1,42 @@
+import pandas as pd
+from modules.normalize_text import normalize_text, normalize_text_batch
+from modules.normalization_cache import NormalizationCache, rules_version
+
+sku_names = ['Brandy Domecq Don Pedro 200 ml Presentación',
+             'Caja Vodka Smirnoff 12P/1L',
+             'SKYY APPLETINI 275 ML - 24 PZS']
+
+
+def test_normalization_cache(tmp_path):
+    """Cached values are reused and match `normalize_text`."""
+    db_path = tmp_path / 'norm_cache.db'
+    texts = pd.Series(sku_names + sku_names[:1])
+    with NormalizationCache(db_path) as cache:
+        norm_texts = normalize_text_batch(texts, cache = cache)
+        assert len(cache) == len(sku_names)
+    assert norm_texts.tolist() == [normalize_text(text) for text in texts]
+    # Reopen the cache: every name is a hit
+    with NormalizationCache(db_path) as cache:
+        assert cache.lookup(sku_names) == {text: normalize_text(text)
+                                           for text in sku_names}
+        assert normalize_text_batch(texts, cache = cache).equals(norm_texts)
+
+
+def test_normalization_cache_invalidation(tmp_path):
+    """A different rule-set version drops the stored entries."""
+    db_path = tmp_path / 'norm_cache.db'
+    with NormalizationCache(db_path, version = 'old') as cache:
+        cache.insert({'raw name': 'stale value'})
+        assert len(cache) == 1
+    with NormalizationCache(db_path) as cache:
+        assert cache.version == rules_version()
+        assert len(cache) == 0
+        assert cache.lookup(['raw name']) == {}
+
+
+def test_rules_version(tmp_path):
+    rules_file = tmp_path / 'rules.py'
+    rules_file.write_text('a')
+    version = rules_version([rules_file])
+    rules_file.write_text('b')
+    assert rules_version([rules_file]) != version
@@ -0,0 +1,71 @@
+import os
+import sys
+import subprocess
+import pandas as pd
+import pytest
+import modules.normalize_text as nt
+from modules.normalize_text import normalize_text, normalize_text_batch
+from modules.normalize_profiler import profile_rules, STAGES, REPORT_COLUMNS
+from tests.sample_names import mkp_sku_names, comp_sku_names
+
+names = mkp_sku_names + comp_sku_names
+
+
+def test_profile_rules():
+    """Same outputs, counters of every stage and rule, nothing left patched."""
+    originals = {name: getattr(nt, name) for name in ['apply_rules'] + STAGES}
+    expected  = [normalize_text(name) for name in names]
+    with profile_rules() as profiler:
+        assert normalize_text_batch(names).tolist() == expected
+    assert all(getattr(nt, name) is func for name, func in originals.items())
+
+    report = profiler.report()
+    assert report.columns.tolist() == REPORT_COLUMNS
+    assert report['time'].is_monotonic_decreasing
+    stages = report[report['kind'] == 'stage'].set_index('name')
+    n_uniques = len(set(names))
+    assert stages.loc['normalize_text', 'calls'] == n_uniques
+    assert stages.loc['homogenize_units', 'calls'] == n_uniques
+    rules = report[report['kind'] == 'rule']
+    assert (rules['hits'] <= rules['calls']).all()
+    assert rules['name'].str.startswith('UNITS_RULES[').any()
+    # Every rule is either run or skipped on each call of its table
+    units = rules[rules['name'].str.startswith('UNITS_RULES[')]
+    assert ((units['calls'] + units['skipped']) == n_uniques).all()
+    # Rules that never fire on the sample names
+    assert (rules['hits'] == 0).any() and (rules['hits'] > 0).any()
+
+
+def test_profile_direct_imports():
+    """Calls of a `normalize_text` imported before profiling count too."""
+    with profile_rules() as profiler:
+        for name in names:
+            normalize_text(name)
+        normalize_text_batch(names)
+    stages = profiler.report().set_index('name')
+    n_calls = len(names) + len(set(names))
+    assert stages.loc['normalize_text', 'calls'] == n_calls
+    assert stages.loc['homogenize_adjectives', 'calls'] == n_calls
+    assert 0 < stages.loc['normalize_text', 'hits'] <= n_calls
+    assert stages.loc['normalize_text', 'time'] >= stages.loc['homogenize_units', 'time']
+
+
+@pytest.mark.parametrize("suffix", ['.csv', '.json'])
+def test_export(tmp_path, suffix):
+    with profile_rules() as profiler:
+        normalize_text(names[0])
+    path = profiler.export(tmp_path / f'rules{suffix}', sort_by = 'hits')
+    report = pd.read_csv(path) if suffix == '.csv' else pd.read_json(path)
+    assert len(report) == len(profiler.report())
+    assert report['hits'].is_monotonic_decreasing
+
+
+def test_profile_from_env(tmp_path):
+    path = tmp_path / 'rules.csv'
+    env  = {**os.environ, 'NORMALIZE_TEXT_PROFILE': str(path)}
+    subprocess.run([sys.executable, '-c',
+                    'from modules.normalize_text import normalize_text\n'
+                    'normalize_text("Agua Natural Nestle Pureza Vital botella 1 L 12 PIEZAS")'],
+                   env = env, check = True, cwd = os.getcwd())
+    report = pd.read_csv(path)
+    assert report.loc[report['name'] == 'normalize_text', 'calls'].tolist() == [1]
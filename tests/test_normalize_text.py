@@ -0,0 +1,68 @@
+import pytest
+import numpy as np
+import pandas as pd
+from modules.normalize_text import normalize_text, normalize_text_batch, \
+    required_literal, remove_es_stopwords, STOPWORDS, extract_brand
+
+# Outputs of the original (uncompiled) implementation. The brand weighting
+# rule appends a literal '\x03' character, which is kept on purpose.
+expected_outputs = [
+    ('Agua Natural Nestle Pureza Vital botella 1 L 12 PIEZAS',
+     'npvnpvnpvnpvnpv\x031lt 12pz'),
+    ('NESTLE PV 12x1000 ML Modelo',
+     'npvnpvnpvnpvnpv\x0312pz 1lt'),
+    ('Brandy Domecq Don Pedro 200 ml Presentación',
+     'brdy donpedro 200ml'),
+    ('Caja bebida energetica Vive 100 300M/24P 355 ml en 24 piezas',
+     'vive100 300ml 24pz 350ml'),
+    ('Paquete agua Santa Maria 1L/12P 1 litro con 12 piezas',
+     'santamariasantamariasantamaria\x031lt 12pz'),
+    ('SKYY APPLETINI 275 ML - 24 PZS',
+     'vodkaskyybluevodkaskyyblue\x03ap 270ml 24pz'),
+    ('Vino Tinto Casillero del Diablo Cabernet Sauvignon 750 ml',
+     'vino tinto casillero diablo cbrnet 750ml'),
+]
+
+@pytest.mark.parametrize("text, expected", expected_outputs)
+def test_normalize_text(text, expected):
+    """The compiled rule engine keeps the original outputs."""
+    assert normalize_text(text) == expected
+    assert normalize_text(text, encode = 'ascii') == expected
+
+
+@pytest.mark.parametrize("pattern, literal", [
+    (r'(\s|^)whiskey(\s|$)', 'whiskey'),
+    (r'(\s|^)(agua )*(natural )*(santa maria)(\s|$)', 'santa maria'),
+    (r'(\s|^)golden|dorado(\s|$)', ''),
+    (r'([\d]+)\s(ml|pz|g|kg|lt|oz)', ''),
+    (r'(\d)\d{1}(ml)', 'ml'),
+])
+def test_required_literal(pattern, literal):
+    """Only literals that every match must contain are used as guards."""
+    assert required_literal(pattern) == literal
+
+
+@pytest.mark.parametrize("text, brand", [
+    ('Agua Natural Nestle Pureza Vital botella 1 L 12 PIEZAS', 'npv'),
+    ('SKYY APPLETINI 275 ML - 24 PZS', 'vodkaskyyblue'),
+    ('Tequila Jose Cuervo Especial 1 L', 'cuervo'),
+    ('Brandy Domecq Don Pedro 200 ml Presentación', 'unknown'),
+])
+def test_extract_brand(text, brand):
+    """Brands are found in their weighted (repeated) form too."""
+    assert extract_brand(normalize_text(text)) == brand
+
+
+def test_remove_es_stopwords():
+    assert isinstance(STOPWORDS, frozenset)
+    assert remove_es_stopwords('agua de la sabor fresa') == 'agua fresa'
+
+
+def test_normalize_text_batch():
+    """The batch API matches `normalize_text` row by row."""
+    texts = pd.Series([text for text, _ in expected_outputs] * 2 + [None, np.nan],
+                      index = range(10, 26), name = 'sku_name')
+    norm_texts = normalize_text_batch(texts)
+    assert norm_texts.index.equals(texts.index)
+    assert norm_texts.name == 'sku_name'
+    assert norm_texts.tolist() == [normalize_text(text) for text in texts]
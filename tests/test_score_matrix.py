@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pytest
+from modules.normalize_text import normalize_text
+from modules.sku_matcher import get_confidence, build_features, score_matrix, \
+    exp_matching_value, sku_name_conf_array, exp_matching_value_array, \
+    get_confidence_array, round_array, best_matches, best_matches_pruned, \
+    best_matches_by_brand
+from modules.normalize_text import extract_brand
+from tests.sample_names import mkp_sku_names, comp_sku_names
+
+edge_names = ['', '500ml', 'agua 1lt', 'agua 1lt 12pz', '600ml 600ml', '.5lt']
+mkp_names  = [normalize_text(name) for name in mkp_sku_names] + edge_names
+comp_names = [normalize_text(name) for name in comp_sku_names] + edge_names
+
+
+def test_score_matrix():
+    """Every entry equals the pairwise `get_confidence` value."""
+    expected = np.array([[get_confidence(a, b) for b in comp_names]
+                         for a in mkp_names])
+    conf = score_matrix(mkp_names, comp_names, workers = 1)
+    assert conf.shape == (len(mkp_names), len(comp_names))
+    np.testing.assert_array_equal(conf, expected)
+    # Precomputed features give the same matrix
+    conf = score_matrix(build_features(mkp_names), build_features(comp_names))
+    np.testing.assert_array_equal(conf, expected)
+
+
+def test_score_matrix_empty():
+    assert score_matrix([], comp_names).shape == (0, len(comp_names))
+
+
+def test_get_confidence_array():
+    """Array versions equal the scalar post-processing, x == 0 included."""
+    rng = np.random.default_rng(0)
+    lvd_dist = np.concatenate([rng.random(20000), [0, 1, 0.5, 1]])
+    jac_dist = np.concatenate([rng.choice([0, 0.25, 0.5, 2/3, 1], 20000),
+                               [0, 1, 1, 0]])
+    pond_conf = sku_name_conf_array(lvd_dist, jac_dist)
+    expected_pond = [max(0, (1 - lvd) - (jac * 0.17))
+                     for lvd, jac in zip(lvd_dist.tolist(), jac_dist.tolist())]
+    np.testing.assert_array_equal(pond_conf, expected_pond)
+    assert (pond_conf == 0).any()
+    np.testing.assert_allclose(
+        exp_matching_value_array(pond_conf, decay = 1.01),
+        [exp_matching_value(x, decay = 1.01) for x in expected_pond],
+        rtol = 1e-9)
+    np.testing.assert_array_equal(
+        get_confidence_array(lvd_dist, jac_dist),
+        [round(exp_matching_value(x, decay = 1.01), 4) for x in expected_pond])
+
+
+def test_round_array():
+    values = np.array([0.28645, 0.00005, 0.12344999, 1.0, 0.0])
+    np.testing.assert_array_equal(round_array(values, 4),
+                                  [round(float(x), 4) for x in values])
+
+
+def test_best_matches():
+    """Best sku per competitor name; ties go to the lowest sku."""
+    # Duplicated catalog names force ties between skus
+    mkp_skus  = [f'{i:03d}' for i in range(len(mkp_names))][::-1] + ['999']
+    catalog   = mkp_names + mkp_names[:1]
+    matches = best_matches(mkp_skus, catalog, comp_names, chunk_size = 7)
+    assert matches['comp_sku_name_clean'].tolist() == comp_names
+    for _, row in matches.iterrows():
+        confs = [(get_confidence(name, row['comp_sku_name_clean']), sku)
+                 for sku, name in zip(mkp_skus, catalog)]
+        best_conf = max(conf for conf, _ in confs)
+        assert row['confidence'] == best_conf
+        assert row['sku'] == min(sku for conf, sku in confs if conf == best_conf)
+    assert best_matches([], [], comp_names).empty
+
+
+@pytest.mark.parametrize("conf_thr", [None, 0.4, 0.8])
+def test_best_matches_pruned(conf_thr):
+    """Same matches as the brute force `best_matches`, ties included."""
+    mkp_skus = [f'{i:03d}' for i in range(len(mkp_names))][::-1] + ['999']
+    catalog  = mkp_names + mkp_names[:1]
+    expected = best_matches(mkp_skus, catalog, comp_names)
+    if conf_thr is not None:
+        expected = expected[expected['confidence'] >= conf_thr].reset_index(drop = True)
+    matches, stats = best_matches_pruned(mkp_skus, catalog, comp_names,
+                                         conf_thr = conf_thr, chunk_size = 7,
+                                         block_size = 2)
+    pd.testing.assert_frame_equal(matches, expected)
+    assert stats['pairs'] == len(catalog) * len(comp_names)
+    assert stats['pruned'] > 0
+    assert stats['pruned'] + stats['scored'] == stats['pairs']
+
+
+def test_best_matches_by_brand():
+    """Branded names only match their brand, the rest the full catalog."""
+    mkp_skus = [f'{i:03d}' for i in range(len(mkp_names))]
+    catalog  = mkp_names + ['cuervocuervocuervo\x031lt', 'teq cuervo 750ml']
+    mkp_skus = mkp_skus + ['990', '991']
+    comps    = comp_names + ['tequila cuervocuervocuervo\x03750ml', 'boing 500ml']
+    matches = best_matches_by_brand(mkp_skus, catalog, comps, chunk_size = 7)
+    assert matches['comp_sku_name_clean'].tolist() == comps
+    brands = [extract_brand(name) for name in catalog]
+    for comp_name, (_, row) in zip(comps, matches.iterrows()):
+        brand = extract_brand(comp_name)
+        in_brand = [i for i, b in enumerate(brands) if b == brand != 'unknown'] \
+                        or range(len(catalog))
+        expected = best_matches([mkp_skus[i] for i in in_brand],
+                                [catalog[i] for i in in_brand], [comp_name])
+        assert row['sku'] == expected['sku'][0]
+        assert row['confidence'] == expected['confidence'][0]
+    assert brands[mkp_skus.index(matches['sku'].iloc[-2])] == 'cuervo'
+    assert best_matches_by_brand([], [], comps).empty
@@ -0,0 +1,26 @@
+import pytest
+from modules.normalize_text import normalize_text
+from modules.sku_matcher import get_confidence, SkuFeatures, \
+    build_features, get_confidence_features
+from tests.sample_names import mkp_sku_names, comp_sku_names
+
+mkp_names  = [normalize_text(name) for name in mkp_sku_names]
+comp_names = [normalize_text(name) for name in comp_sku_names]
+# Edge cases: empty names, names made only of units, repeated units
+edge_names = ['', '500ml', 'agua 1lt', 'agua 1lt 12pz', '600ml 600ml', '.5lt']
+
+
+@pytest.mark.parametrize("a", mkp_names + edge_names)
+def test_get_confidence_features(a):
+    """Scoring precomputed features equals `get_confidence`."""
+    fa = SkuFeatures(a)
+    for fb in build_features(comp_names + edge_names):
+        assert get_confidence_features(fa, fb) == get_confidence(a, fb.name)
+
+
+def test_sku_features_slots():
+    features = SkuFeatures('vodka smirnoff 750ml')
+    assert not hasattr(features, '__dict__')
+    assert features.text == 'vodka smirnoff'
+    assert features.units == ('750ml', )
+    assert features.split_unit_set == frozenset(['', '750', 'ml'])
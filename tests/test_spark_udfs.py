@@ -0,0 +1,109 @@
+import os
+import shutil
+import datetime
+import pyarrow as pa
+import pytest
+
+pytest.importorskip('pyspark')
+from modules import spark_udfs
+from modules.file_reader import SCRAP_SCHEMA
+
+requires_java = pytest.mark.skipif(not (shutil.which('java') or os.environ.get('JAVA_HOME')),
+                                   reason = 'Spark local mode needs Java')
+
+TABLE = pa.table({'name':  ['agua 1lt', None, 'vino 750ml'],
+                  'price': [10.5, 3.0, None],
+                  'date':  [datetime.date(2023, 11, 10)] * 3})
+
+
+@pytest.fixture(scope = 'module')
+def spark():
+    from pyspark.sql import SparkSession
+    session = SparkSession.builder.master('local[1]')\
+                          .config('spark.ui.enabled', 'false').getOrCreate()
+    yield session
+    session.stop()
+
+
+@requires_java
+@pytest.mark.parametrize('jvm_stream', [True, False])
+def test_arrow_to_spark(spark, monkeypatch, jvm_stream):
+    """Same rows through the JVM stream and the createDataFrame fallback."""
+    if not jvm_stream:
+        monkeypatch.setattr(spark_udfs, '_has_jvm_arrow_stream', lambda spark: False)
+    df = spark_udfs.arrow_to_spark(spark, TABLE)
+    assert df.columns == ['name', 'price', 'date']
+    assert [tuple(row) for row in df.collect()] == [tuple(row.values()) for row in TABLE.to_pylist()]
+    assert spark_udfs.arrow_to_spark(spark, TABLE.slice(0, 0)).count() == 0
+    assert spark.conf.get(spark_udfs.ARROW_ENABLED_CONF, 'false') == 'false'
+
+
+@requires_java
+def test_arrow_to_spark_schema(spark):
+    df = spark_udfs.arrow_to_spark(spark, SCRAP_SCHEMA.empty_table())
+    assert df.columns == SCRAP_SCHEMA.names
+
+
+@requires_java
+def test_normalize_column_cache(spark, tmp_path):
+    """Same names as the UDF, the second run from the cache."""
+    names = ['Agua Ciel 600 ml', 'AGUA CIEL 600ML', None, 'Agua Ciel 600 ml']
+    df = spark.createDataFrame([(i, name) for i, name in enumerate(names)], 'id int, name string')
+    expected = spark_udfs.normalize_column(df, 'name', 'clean').orderBy('id').collect()
+    for run in range(2):
+        with spark_udfs.spark_normalization_cache(tmp_path / 'cache.db') as cache:
+            df_clean = spark_udfs.normalize_column(df, 'name', 'clean', cache = cache)
+            assert df_clean.columns == ['id', 'name', 'clean']
+            assert df_clean.orderBy('id').collect() == expected
+            assert (cache.hits, cache.misses) == ((0, 2) if run == 0 else (2, 0))
+
+
+@requires_java
+def test_normalization_accumulators(spark, tmp_path):
+    """Rows counted by the action that computes them, not a `count()`."""
+    names = ['Agua Ciel 600 ml', 'AGUA CIEL 600ML', None, 'Agua Ciel 600 ml']
+    df = spark.createDataFrame([(i, name) for i, name in enumerate(names)], 'id int, name string')
+    accumulators = spark_udfs.normalization_accumulators(spark)
+    df_clean = spark_udfs.normalize_column(df, 'name', 'clean', accumulators = accumulators)
+    assert accumulators['rows'].value == 0
+    df_clean.collect()
+    assert accumulators['rows'].value == 4
+    accumulators = spark_udfs.normalization_accumulators(spark)
+    with spark_udfs.spark_normalization_cache(tmp_path / 'cache.db') as cache:
+        df_clean = spark_udfs.normalize_column(df, 'name', 'clean', cache = cache,
+                                               accumulators = accumulators)
+        output = spark.sparkContext.accumulator(0)
+        spark_udfs.count_rows(df_clean, output, 'clean').collect()
+    assert accumulators['distinct_names'].value == 2
+    assert (accumulators['rows'].value, output.value) == (4, 4)
+
+
+class SessionWithoutContext:
+    """Public API only, as a Spark Connect session."""
+    def __init__(self):
+        self.conf    = ConfWithoutContext({spark_udfs.ARROW_ENABLED_CONF: 'false'})
+        self.created = []
+
+    @property
+    def sparkContext(self):
+        raise NotImplementedError('sparkContext')
+
+    def createDataFrame(self, data, schema = None):
+        self.created.append((self.conf.get(spark_udfs.ARROW_ENABLED_CONF), data, schema))
+        return data
+
+
+class ConfWithoutContext(dict):
+    def set(self, key, value):
+        self[key] = value
+
+
+def test_arrow_to_spark_fallback():
+    """`createDataFrame` from pandas, Arrow enabled only meanwhile."""
+    session = SessionWithoutContext()
+    pdf = spark_udfs.arrow_to_spark(session, TABLE)
+    (arrow_enabled, data, schema), = session.created
+    assert arrow_enabled == 'true'
+    assert session.conf[spark_udfs.ARROW_ENABLED_CONF] == 'false'
+    assert data is pdf and data['name'].tolist() == ['agua 1lt', None, 'vino 750ml']
+    assert schema.fieldNames() == ['name', 'price', 'date']
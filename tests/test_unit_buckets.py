@@ -0,0 +1,68 @@
+import json
+import pytest
+from modules.normalize_text import normalize_text
+from modules.sku_matcher import best_matches
+from modules.unit_buckets import UnitBuckets, unit_quantities, recall_report
+from tests.sample_names import mkp_sku_names, comp_sku_names
+
+mkp_names  = [normalize_text(name) for name in mkp_sku_names]
+comp_names = [normalize_text(name) for name in comp_sku_names]
+mkp_skus   = [f'{i:03d}' for i in range(len(mkp_names))]
+
+
+@pytest.mark.parametrize("s_clean, quantities", [
+    ('agua 1.5lt 12pz', {('volume', 1500)}),
+    ('cafe 250g .5kg', {('mass', 250), ('mass', 500)}),
+    ('vino 750ml 6oz', {('volume', 750), ('oz', 6)}),
+    ('agua 12pz', set()),
+])
+def test_unit_quantities(s_clean, quantities):
+    assert unit_quantities(s_clean) == quantities
+
+
+def test_compatible():
+    buckets = UnitBuckets(['a', 'b', 'c', 'd'],
+                          ['agua 600ml', 'agua 1lt', 'cafe 250g', 'agua'])
+    assert buckets.compatible(unit_quantities('agua 590ml 12pz')).tolist() == [0, 2, 3]
+    assert buckets.compatible(unit_quantities('cafe 1kg')).tolist() == [0, 1, 3]
+    assert buckets.compatible(frozenset()).tolist() == [0, 1, 2, 3]
+
+
+def test_best_matches():
+    """Best match among the compatible catalog names."""
+    buckets = UnitBuckets(mkp_skus, mkp_names)
+    matches = buckets.best_matches(comp_names)
+    assert matches['comp_sku_name_clean'].tolist() == comp_names
+    assert buckets.n_pairs <= len(mkp_names) * len(comp_names)
+    for comp_name, (_, row) in zip(comp_names, matches.iterrows()):
+        rows = buckets.compatible(unit_quantities(comp_name))
+        expected = best_matches([mkp_skus[r] for r in rows],
+                                [mkp_names[r] for r in rows], [comp_name])
+        assert row['sku'] == expected['sku'][0]
+        assert row['confidence'] == expected['confidence'][0]
+
+
+def test_recall_report_missing_file(tmp_path):
+    assert recall_report(tmp_path / 'expected_matches.json') is None
+
+
+def test_recall_report(tmp_path):
+    json_path = tmp_path / 'expected_matches.json'
+    json_path.write_text(json.dumps({
+        'Agua Ciel 600 ml': {'1': ['AGUA CIEL 600ML', 0.9, '>='],
+                             '2': ['Agua Ciel 1 L', 0.3, '<=']},
+        'Agua Ciel 1 L':    {'1': ['agua ciel 1lt', 1.0, '==']}}))
+    report = recall_report(json_path)
+    assert report['pairs'] == 2
+    assert report['pair_recall'] == 1.0
+    assert report['full_pairs'] == 2 * 2
+
+
+def test_recall_report_non_matches(tmp_path):
+    """`<=` entries are upper bounds of non matches, never positives."""
+    json_path = tmp_path / 'expected_matches.json'
+    json_path.write_text(json.dumps({
+        'Agua Ciel 600 ml': {'1': ['AGUA CIEL 600ML', 0.9, '>='],
+                             '2': ['Agua Ciel 1 L', 0.6, '<=']},
+        'Agua Ciel 1 L':    {'1': ['agua ciel 1lt', 1.0, '==']}}))
+    assert recall_report(json_path)['pairs'] == 2